@@ -0,0 +1,352 @@
+"""Benchmarks for the main HTTP endpoints.
+
+Seeds a database with the bundled csv data plus synthetic users and
+votes, then sends requests to the endpoints through the flask test
+client and through a real local server. The latency percentiles and
+throughput of each endpoint are printed, and can be saved as a baseline
+to compare later runs against.
+
+Run from the repository root, for example:
+    python benchmarks/bench.py --users 100000 --votes 1000000
+    python benchmarks/bench.py --save benchmarks/baseline.json
+    python benchmarks/bench.py --compare benchmarks/baseline.json
+
+Authors: Thomas,
+"""
+import json
+import logging
+import platform
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from os import path
+from random import Random
+from threading import Thread, local
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.parse import quote, urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+import click
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                             "src", "travel_app"))
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from database.database import get_database
+from database.models.country import all_country_names
+from database.models.user import User
+from database.models.uservotes import UserVote, rebuild_vote_counts
+from database.seed import seed_database
+
+# Module variables.
+PASSWORD = "Benchmark1!"
+BATCH_SIZE = 10000
+PERCENTILES = (50, 95, 99)
+
+
+def seed_synthetic(users: int, votes: int, rounds: int, seed: int = 0):
+    """Fills the database with the bundled data, users and votes.
+
+    Must be ran within app context.
+    Every user shares one password hash, so seeding does not spend its
+    time in bcrypt. Each user votes on different countries.
+
+    Parameters:
+        users - number of users to add
+        votes - number of votes to add, at most users times the number
+            of countries
+        rounds - bcrypt work factor of the shared password hash
+        seed - seed for the random vote types
+    """
+    db = get_database()
+    seed_database(report=None)
+    country_ids = [row.id for row in db.session.execute(
+        db.text("SELECT id FROM countries ORDER BY id"))]
+    assert votes <= users * len(country_ids), "Too many votes for the users"
+
+    from bcrypt import gensalt, hashpw
+    hashed = hashpw(PASSWORD.encode("utf-8"), gensalt(rounds))
+    statement = db.insert(User.__table__)
+    for start in range(0, users, BATCH_SIZE):
+        db.session.execute(statement, [
+            {"username": f"bench{i}", "password": hashed, "role": "guest"}
+            for i in range(start + 1, min(start + BATCH_SIZE, users) + 1)])
+
+    user_ids = [row.id for row in db.session.execute(
+        db.text("SELECT id FROM users ORDER BY id"))]
+    random = Random(seed)
+    statement = db.insert(UserVote.__table__)
+    batch = []
+    for i in range(votes):
+        user_id = user_ids[i % len(user_ids)]
+        # Spread each user's votes over different countries.
+        country = (i // len(user_ids) + user_id * 7) % len(country_ids)
+        batch.append({"user_id": user_id, "country_id": country_ids[country],
+                      "vote_id": random.choice((1, 2))})
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(statement, batch)
+            batch = []
+    if batch:
+        db.session.execute(statement, batch)
+    db.session.commit()
+    rebuild_vote_counts()
+
+
+def _scenarios(countries: list[str], users: int) -> dict:
+    """Get the requests sent to each endpoint.
+
+    Returns:
+        A dictionary of scenario names to (needs login, function) pairs.
+        The function takes a random generator and returns the method,
+        url and form data of a request.
+    """
+    def country(random):
+        return "GET", f"/country/{random.choice(countries)}", None
+
+    def search(random):
+        return "POST", "/search", {"search": random.choice(countries)}
+
+    def suggest(random):
+        return "GET", f"/search/suggest?q={random.choice(countries)[:3]}", None
+
+    def api(random):
+        return "GET", "/api/v1/countries?limit=50", None
+
+    def leaderboard(random):
+        return "GET", "/api/v1/leaderboard", None
+
+    def login(random):
+        return "POST", "/login", {"username": f"bench{random.randint(1, users)}",
+                                  "password": PASSWORD}
+
+    def vote(random):
+        return ("POST", random.choice(("/upvote", "/downvote")),
+                {"country_name": random.choice(countries)})
+
+    return {
+        "country": (False, country),
+        "search": (False, search),
+        "suggest": (False, suggest),
+        "api": (False, api),
+        "leaderboard": (False, leaderboard),
+        "login": (False, login),
+        "vote": (True, vote),
+    }
+
+
+def _summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Computes the latency percentiles and throughput of a scenario."""
+    latencies = sorted(latencies)
+    summary = {"requests": len(latencies), "errors": errors,
+               "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+               "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3)}
+    for percentile in PERCENTILES:
+        index = min(len(latencies) - 1,
+                    round(percentile / 100 * (len(latencies) - 1)))
+        summary[f"p{percentile}_ms"] = round(latencies[index] * 1000, 3)
+    return summary
+
+
+def run_test_client(app, scenarios: dict, requests: int, seed: int) -> dict:
+    """Sends the requests of each scenario one at a time through the
+    flask test client.
+
+    Redirects are followed, so the time of a form post includes the
+    page it leads to.
+    """
+    results = {}
+    for name, (needs_login, make_request) in scenarios.items():
+        random = Random(seed)
+        client = app.test_client()
+        if needs_login:
+            client.post("/login", data={"username": "bench1",
+                                        "password": PASSWORD})
+        latencies = []
+        errors = 0
+        start = perf_counter()
+        for _ in range(requests):
+            method, url, data = make_request(random)
+            begin = perf_counter()
+            response = client.open(url, method=method, data=data,
+                                   follow_redirects=True)
+            latencies.append(perf_counter() - begin)
+            errors += response.status_code >= 400
+        results[name] = _summarize(latencies, errors, perf_counter() - start)
+    return results
+
+
+def run_server(app, scenarios: dict, requests: int, concurrency: int,
+               seed: int) -> dict:
+    """Sends the requests of each scenario from concurrency threads to
+    a threaded local server.
+
+    Each thread has its own cookies, and logs in first for scenarios
+    that need it.
+    """
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    results = {}
+    try:
+        for name, (needs_login, make_request) in scenarios.items():
+            clients = local()
+
+            def send(index):
+                if not hasattr(clients, "opener"):
+                    clients.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+                    if needs_login:
+                        clients.opener.open(base + "/login", urlencode(
+                            {"username": "bench1", "password": PASSWORD}).encode()).read()
+                method, url, data = make_request(Random(seed + index))
+                body = urlencode(data).encode() if data is not None else None
+                begin = perf_counter()
+                try:
+                    clients.opener.open(base + quote(url, safe="/?=&"), body).read()
+                    failed = False
+                except HTTPError as error:
+                    error.read()
+                    failed = True
+                return perf_counter() - begin, failed
+
+            start = perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                outcomes = list(executor.map(send, range(requests)))
+            elapsed = perf_counter() - start
+            results[name] = _summarize([latency for latency, _ in outcomes],
+                                       sum(failed for _, failed in outcomes),
+                                       elapsed)
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Compares the results with a baseline.
+
+    Parameters:
+        results - the results of this run
+        baseline - the results of an earlier run
+        threshold - the fraction a p95 latency may rise, or a throughput
+            may fall, before it counts as a regression
+
+    Returns:
+        A list of messages describing each regression.
+    """
+    regressions = []
+    for mode, scenarios in results["results"].items():
+        for name, current in scenarios.items():
+            previous = baseline["results"].get(mode, {}).get(name)
+            if previous is None:
+                continue
+            latency = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0
+            throughput = 1 - current["rps"] / previous["rps"] if previous["rps"] else 0
+            click.echo(f"{mode:<8} {name:<11} p95 {previous['p95_ms']:>9.2f} -> "
+                       f"{current['p95_ms']:>9.2f}ms ({latency:+.1%})  "
+                       f"rps {previous['rps']:>8.1f} -> {current['rps']:>8.1f}")
+            if latency > threshold:
+                regressions.append(f"{mode} {name}: p95 latency up {latency:.1%}")
+            if throughput > threshold:
+                regressions.append(f"{mode} {name}: throughput down {throughput:.1%}")
+    return regressions
+
+
+@click.command()
+@click.option("--database", default=None,
+              help="Database uri, defaults to a temporary sqlite file.")
+@click.option("--users", default=1000, show_default=True,
+              help="Number of synthetic users.")
+@click.option("--votes", default=10000, show_default=True,
+              help="Number of synthetic votes.")
+@click.option("--requests", default=500, show_default=True,
+              help="Requests sent to each endpoint in each mode.")
+@click.option("--concurrency", default=8, show_default=True,
+              help="Client threads used against the local server.")
+@click.option("--rounds", default=12, show_default=True,
+              help="bcrypt work factor of the synthetic users.")
+@click.option("--scenario", "only", multiple=True,
+              help="Only run this scenario, may be repeated.")
+@click.option("--mode", "modes", multiple=True,
+              type=click.Choice(["client", "server"]),
+              help="Only run in this mode, may be repeated.")
+@click.option("--seed", default=0, show_default=True,
+              help="Seed for the random data and requests.")
+@click.option("--save", default=None, help="Save the results as JSON.")
+@click.option("--compare", "baseline", default=None,
+              help="Compare the results with a saved JSON baseline.")
+@click.option("--threshold", default=0.1, show_default=True,
+              help="Allowed regression before --compare fails.")
+def main(database, users, votes, requests, concurrency, rounds, only, modes,
+         seed, save, baseline, threshold):
+    """Benchmarks the main HTTP endpoints."""
+    directory = tempfile.TemporaryDirectory()
+    uri = database or "sqlite:///" + path.join(directory.name, "bench.db")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": uri,
+        "SQLALCHEMY_ECHO": False,
+        "SECRET_KEY": "benchmark",
+        "WTF_CSRF_ENABLED": False,
+        "BCRYPT_ROUNDS": rounds,
+        "DB_SLOW_QUERY_MS": 0,
+    })
+
+    with app.app_context():
+        start = perf_counter()
+        seed_synthetic(users, votes, rounds, seed)
+        click.echo(f"Seeded {users} users and {votes} votes in "
+                   f"{perf_counter() - start:.1f}s")
+        countries = all_country_names()
+
+    scenarios = _scenarios(countries, users)
+    if only:
+        scenarios = {name: scenarios[name] for name in only}
+
+    results = {}
+    if not modes or "client" in modes:
+        results["client"] = run_test_client(app, scenarios, requests, seed)
+    if not modes or "server" in modes:
+        results["server"] = run_server(app, scenarios, requests, concurrency,
+                                       seed)
+
+    click.echo(f"{'mode':<8} {'scenario':<11} {'rps':>8} {'mean':>8} "
+               + " ".join(f"{'p' + str(p):>8}" for p in PERCENTILES)
+               + f" {'errors':>6}")
+    for mode, scenario_results in results.items():
+        for name, summary in scenario_results.items():
+            click.echo(f"{mode:<8} {name:<11} {summary['rps']:>8.1f} "
+                       f"{summary['mean_ms']:>8.2f} "
+                       + " ".join(f"{summary[f'p{p}_ms']:>8.2f}"
+                                  for p in PERCENTILES)
+                       + f" {summary['errors']:>6}")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "users": users,
+        "votes": votes,
+        "requests": requests,
+        "concurrency": concurrency,
+        "rounds": rounds,
+        "results": results,
+    }
+    if save:
+        with open(save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        click.echo(f"Saved results to {save}")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as file:
+            regressions = compare(report, json.load(file), threshold)
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Module for importing and exporting whole tables.
+
+Tables are read and written in the csv format of the bundled data files
+(countries.csv, advice.csv and country_advice.csv), or as JSON lines
+with the same fields. Both directions stream the rows in batches, so
+whole tables are never held in memory.
+
+Imports are compared with the rows already in the database by primary
+key. Only new rows are inserted and only changed rows are updated, and
+the whole import is saved in a single transaction. Rows that are not in
+the file are left alone.
+
+Authors: Thomas,
+"""
+import csv
+import json
+from io import StringIO
+
+from database.database import _db, on_commit, unit_of_work
+from database.models.advice import Advice
+from database.models.country import (Country, countries_changed,
+                                     invalidate_country_cache)
+from database.models.countryadvice import CountryAdvice, advice_changed
+from database.seed import coerce_row
+
+# Module variables.
+BATCH_SIZE = 500
+FORMATS = ("csv", "jsonl")
+
+# The columns of each table's file, in the order of the bundled files.
+TABLES = {
+    "countries": (Country, ("id", "name", "description", "travel_advice",
+                            "crime_index", "disaster_risk",
+                            "corruption_index", "health")),
+    "advice": (Advice, ("id", "topic", "description", "link")),
+    "country_advice": (CountryAdvice, ("country_id", "advice_id")),
+}
+
+
+def _get_table(table: str) -> tuple:
+    """Get the model and file columns of a table.
+
+    Errors:
+        ValueError - the table cannot be imported or exported
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table}, expected one of "
+                         + ", ".join(TABLES))
+    return TABLES[table]
+
+
+def _check_format(file_format: str):
+    """Raises ValueError if the format is not supported."""
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format}, expected one of "
+                         + ", ".join(FORMATS))
+
+
+def read_rows(file, file_format: str):
+    """Reads the rows of a csv or JSON lines file one at a time.
+
+    Parameters:
+        file - a text file
+        file_format - "csv" or "jsonl"
+
+    Returns:
+        An iterator of (line number, dictionary) pairs.
+
+    Errors:
+        ValueError - a line of a JSON lines file is not an object
+    """
+    _check_format(file_format)
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Line {number}: {error}")
+        if not isinstance(row, dict):
+            raise ValueError(f"Line {number}: expected a JSON object")
+        yield number, row
+
+
+def _apply_batch(model, columns: tuple, batch: list, counts: dict,
+                 dry_run: bool):
+    """Compares a batch of rows with the database and saves the
+    differences.
+
+    Must be ran within app context.
+    """
+    keys = [column.key for column in model.__table__.primary_key.columns]
+    key_columns = [getattr(model, key) for key in keys]
+    select_columns = key_columns + [getattr(model, column)
+                                    for column in columns if column not in keys]
+    version = model.__mapper__.version_id_col
+    if version is not None:
+        select_columns.append(getattr(model, version.key))
+
+    wanted = [tuple(row[key] for key in keys) for row in batch]
+    existing = {}
+    for result in _db.session.execute(
+            _db.select(*select_columns)
+            .where(_db.tuple_(*key_columns).in_(wanted))):
+        values = result._asdict()
+        existing[tuple(values[key] for key in keys)] = values
+
+    inserts = []
+    updates = []
+    for row, key in zip(batch, wanted):
+        current = existing.get(key)
+        if current is None:
+            inserts.append(row)
+        elif any(current[column] != row[column] for column in columns):
+            if version is not None:
+                # Versioned rows must say which version they update.
+                row = dict(row, **{version.key: current[version.key]})
+            updates.append(row)
+    counts["inserted"] += len(inserts)
+    counts["updated"] += len(updates)
+    counts["unchanged"] += len(batch) - len(inserts) - len(updates)
+
+    if dry_run:
+        return
+    if inserts:
+        _db.session.execute(_db.insert(model.__table__), inserts)
+    if updates:
+        _db.session.execute(_db.update(model), updates)
+
+
+def import_rows(table: str, rows, batch_size: int = BATCH_SIZE,
+                dry_run: bool = False) -> dict:
+    """Inserts or updates the rows of a table.
+
+    Must be ran within app context.
+    Every row must contain all the columns of the table's file. Rows
+    are compared with the database by primary key in batches of
+    batch_size, and only new or changed rows are written. Everything
+    is saved in one transaction, or as part of the current unit of
+    work.
+
+    Parameters:
+        table - "countries", "advice" or "country_advice"
+        rows - iterable of (line number, dictionary) pairs, as returned
+            by read_rows
+        batch_size - number of rows compared and written at once
+        dry_run - count the changes without saving them
+
+    Returns:
+        A dictionary with the number of rows "inserted", "updated" and
+        "unchanged".
+
+    Errors:
+        ValueError - the table is unknown or a row is invalid, nothing
+            is saved
+        sqlalchemy.exc.IntegrityError - a row breaks a constraint, such
+            as linking to a country that does not exist, nothing is
+            saved
+    """
+    model, columns = _get_table(table)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    seen = set()
+    keys = [column.key for column in model.__table__.primary_key.columns]
+
+    with unit_of_work():
+        batch = []
+        for number, row in rows:
+            missing = [column for column in columns if column not in row]
+            if missing:
+                raise ValueError(f"Line {number}: missing "
+                                 + ", ".join(missing))
+            try:
+                values = coerce_row(model, {column: row[column]
+                                            for column in columns})
+            except (TypeError, ValueError) as error:
+                raise ValueError(f"Line {number}: {error}")
+            key = tuple(values[column] for column in keys)
+            if None in key:
+                raise ValueError(f"Line {number}: missing "
+                                 + ", ".join(keys))
+            if key in seen:
+                raise ValueError(f"Line {number}: duplicate row {key}")
+            seen.add(key)
+
+            batch.append(values)
+            if len(batch) >= batch_size:
+                _apply_batch(model, columns, batch, counts, dry_run)
+                batch = []
+        if batch:
+            _apply_batch(model, columns, batch, counts, dry_run)
+
+        if not dry_run and (counts["inserted"] or counts["updated"]):
+            if model is Country:
+                countries_changed()
+            on_commit(invalidate_country_cache if model is Country
+                      else advice_changed)
+    return counts
+
+
+def export_rows(table: str, file_format: str, batch_size: int = BATCH_SIZE):
+    """Writes every row of a table, in primary key order.
+
+    Must be ran within app context.
+    Rows are fetched from the database batch_size at a time.
+
+    Parameters:
+        table - "countries", "advice" or "country_advice"
+        file_format - "csv" or "jsonl"
+        batch_size - number of rows fetched at once
+
+    Returns:
+        An iterator of strings, each holding one or more lines.
+
+    Errors:
+        ValueError - the table or format is unknown
+    """
+    model, columns = _get_table(table)
+    _check_format(file_format)
+    statement = (_db.select(*[getattr(model, column) for column in columns])
+                 .order_by(*model.__table__.primary_key.columns)
+                 .execution_options(yield_per=batch_size))
+
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if file_format == "csv":
+        writer.writerow(columns)
+
+    for partition in _db.session.execute(statement).partitions():
+        for row in partition:
+            if file_format == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
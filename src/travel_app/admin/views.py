@@ -0,0 +1,62 @@
+"""Views for importing and exporting whole tables.
+
+Authors: Thomas,
+"""
+from io import TextIOWrapper
+from os import path
+
+from flask import (Blueprint, Response, abort, flash, redirect,
+                   render_template, stream_with_context, url_for)
+from flask_login import login_required
+from sqlalchemy.exc import IntegrityError
+
+from admin.bulk import FORMATS, TABLES, export_rows, import_rows, read_rows
+from session import role_required
+from users.forms import BulkImportForm
+
+bulk_blueprint = Blueprint('bulk', __name__, template_folder='templates')
+
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+@bulk_blueprint.route('/admin/bulk', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def bulk():
+    """ Upload a csv or JSON lines file to update a whole table.
+        Only new and changed rows are saved, and nothing is saved if any row is invalid.
+    """
+    form = BulkImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        file_format = path.splitext(upload.filename)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            flash(f'Files must end in .{" or .".join(FORMATS)}.', 'error')
+        else:
+            file = TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            try:
+                counts = import_rows(form.table.data, read_rows(file, file_format),
+                                     dry_run=form.dry_run.data)
+            except (ValueError, IntegrityError) as error:
+                flash(f'Import failed, nothing was saved. {str(error).splitlines()[0]}', 'error')
+            else:
+                action = 'Would have inserted' if form.dry_run.data else 'Inserted'
+                flash(f'{action} {counts["inserted"]} and updated {counts["updated"]} rows, '
+                      f'{counts["unchanged"]} rows were unchanged.', 'success')
+        return redirect(url_for('bulk.bulk'))
+    return render_template('main/bulk.html', form=form, tables=TABLES, formats=FORMATS)
+
+
+@bulk_blueprint.route('/admin/bulk/<table>.<file_format>')
+@login_required
+@role_required('admin')
+def export(table, file_format):
+    """ Download a whole table as csv or JSON lines.
+        The rows are streamed from the database as they are sent.
+    """
+    if table not in TABLES or file_format not in FORMATS:
+        abort(404)
+    response = Response(stream_with_context(export_rows(table, file_format)),
+                        mimetype=MIMETYPES[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{file_format}'
+    return response
@@ -0,0 +1,243 @@
+"""Version 1 of the JSON API for country information.
+
+Endpoints:
+    GET /api/v1/countries -- list countries, see list_countries
+    GET /api/v1/countries/<name> -- fetch a single country
+    GET /api/v1/map -- risk bands of every country for the map
+    GET /api/v1/leaderboard -- countries ranked by their votes
+
+Authors: Thomas,
+"""
+import json
+from hashlib import sha1
+from threading import Lock
+
+from flask import Blueprint, abort, jsonify, make_response, request
+from werkzeug.exceptions import HTTPException
+
+from compression import choose_encoding, precompress
+from database.database import get_database
+from database.models.advice import Advice
+from database.models.country import (Country, get_catalogue, get_catalogue_version,
+                                     get_country_ids_by_name)
+from database.models.countryadvice import CountryAdvice
+from database.models.uservotes import get_leaderboard, get_vote_summaries
+
+api_blueprint = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Fields that can be requested with the fields parameter.
+COLUMN_FIELDS = tuple(column.key for column in Country.__table__.columns)
+EXTRA_FIELDS = ('advice', 'votes')
+DEFAULT_FIELDS = ('id', 'name', 'travel_advice', 'crime_index', 'disaster_risk',
+                  'corruption_index', 'health', 'total_index', 'total_band')
+RANGE_FIELDS = ('crime_index', 'disaster_risk', 'corruption_index', 'health',
+                'total_index')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+LEADERBOARD_ORDERS = ('trusted', 'distrusted')
+DEFAULT_LEADERBOARD_LIMIT = 20
+MAX_LEADERBOARD_LIMIT = 100
+MAP_FIELDS = ('id', 'name', 'total_index', 'total_band')
+
+# Module variables for the map payload.
+_map_lock = Lock()
+_map_payload = None
+
+
+def _split(value):
+    """Split a comma separated parameter into a list of its values."""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _requested_fields():
+    """Get the fields asked for by the fields parameter.
+
+    Aborts with 400 if an unknown field is requested.
+    """
+    fields = _split(request.args.get('fields', '')) or list(DEFAULT_FIELDS)
+    unknown = set(fields) - set(COLUMN_FIELDS) - set(EXTRA_FIELDS)
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _load_countries(fields, conditions, limit=None):
+    """Fetch the requested fields of the countries matching the
+    conditions, ordered by id.
+
+    Advice and votes are fetched with one extra query each for all the
+    countries at once.
+    """
+    db = get_database()
+    columns = [getattr(Country, field) for field in fields if field in COLUMN_FIELDS]
+    statement = db.select(*columns).where(*conditions).order_by(Country.id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    countries = [dict(row._mapping) for row in db.session.execute(statement)]
+    ids = [country['id'] for country in countries]
+
+    if 'advice' in fields:
+        advice = {country_id: [] for country_id in ids}
+        rows = db.session.execute(
+            db.select(CountryAdvice.country_id, Advice.topic, Advice.description, Advice.link)
+            .join(Advice, Advice.id == CountryAdvice.advice_id)
+            .where(CountryAdvice.country_id.in_(ids))
+            .order_by(CountryAdvice.country_id, Advice.id))
+        for country_id, topic, description, link in rows:
+            advice[country_id].append({'topic': topic, 'description': description, 'link': link})
+        for country in countries:
+            country['advice'] = advice[country['id']]
+
+    if 'votes' in fields:
+        votes = get_vote_summaries(ids)
+        for country in countries:
+            summary = votes[country['id']]
+            country['votes'] = {field: summary[field] for field in
+                                ('upvotes', 'downvotes', 'total', 'net', 'ratio')}
+    return countries
+
+
+@api_blueprint.errorhandler(HTTPException)
+def render_error(error):
+    return jsonify(error=error.name, message=error.description), error.code
+
+
+@api_blueprint.route('/countries')
+def list_countries():
+    """ List countries ordered by id.
+
+        Query parameters:
+        fields -- comma separated fields to include, id is always included. Any column
+                  of the country plus advice and votes.
+        names -- comma separated country names to fetch in one request
+        <index>_min, <index>_max -- only include countries with the index in range,
+                  for crime_index, disaster_risk, corruption_index, health and total_index
+        limit -- number of countries per page (default 50, at most 200)
+        after -- the next value of a previous page, to fetch the page after it
+    """
+    fields = _requested_fields()
+    conditions = []
+
+    names = _split(request.args.get('names', ''))
+    if names:
+        conditions.append(Country.id.in_(get_country_ids_by_name(names)))
+
+    for field in RANGE_FIELDS:
+        minimum = request.args.get(f'{field}_min', type=float)
+        maximum = request.args.get(f'{field}_max', type=float)
+        if minimum is not None:
+            conditions.append(getattr(Country, field) >= minimum)
+        if maximum is not None:
+            conditions.append(getattr(Country, field) <= maximum)
+
+    after = request.args.get('after', type=int)
+    if after is not None:
+        conditions.append(Country.id > after)
+
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        abort(400, f"limit must be between 1 and {MAX_LIMIT}")
+
+    # Fetch one extra country to find out if there is another page.
+    countries = _load_countries(fields, conditions, limit + 1)
+    next_page = None
+    if len(countries) > limit:
+        countries = countries[:limit]
+        next_page = countries[-1]['id']
+    return jsonify(data=countries, next=next_page)
+
+
+@api_blueprint.route('/countries/<country_name>')
+def show_country(country_name):
+    """ Fetch a single country by name. Supports the fields parameter. """
+    ids = get_country_ids_by_name([country_name])
+    countries = _load_countries(_requested_fields(), [Country.id.in_(ids)], 1)
+    if not countries:
+        abort(404, f"Country {country_name} not found")
+    return jsonify(data=countries[0])
+
+
+def _build_map_payload():
+    """Get the map payload for the current catalogue version.
+
+    The payload is built once per catalogue version from the catalogue
+    cache and compressed with every available encoding.
+    """
+    global _map_payload
+
+    version = get_catalogue_version()
+    payload = _map_payload
+    if payload is not None and payload['version'] == version:
+        return payload
+
+    with _map_lock:
+        if _map_payload is not None and _map_payload['version'] == version:
+            return _map_payload
+        body = json.dumps({
+            'fields': MAP_FIELDS,
+            'countries': [[country[field] for field in MAP_FIELDS]
+                          for country in get_catalogue()],
+        }, separators=(',', ':')).encode('utf-8')
+        _map_payload = {
+            'version': version,
+            'etag': sha1(body).hexdigest(),
+            'variants': precompress(body),
+        }
+        return _map_payload
+
+
+@api_blueprint.route('/map')
+def map_data():
+    """ Risk data for every country in one compact payload.
+
+        Returns {"fields": [...], "countries": [[...], ...]} where each country is a
+        list of the values of fields. The payload is rebuilt only when a country
+        changes and is served precompressed with gzip (and brotli if installed).
+    """
+    payload = _build_map_payload()
+    encoding = choose_encoding(request, payload['variants'])
+    # Each encoding has different bytes, so each needs its own strong ETag.
+    etag = payload['etag'] if encoding == 'identity' else f"{payload['etag']}-{encoding}"
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(payload['variants'][encoding])
+        response.mimetype = 'application/json'
+        if encoding != 'identity':
+            response.content_encoding = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@api_blueprint.route('/leaderboard')
+def leaderboard():
+    """ Countries ranked by their net votes, up votes minus down votes.
+
+        Query parameters:
+        order -- trusted for the most net up votes first (default), or distrusted
+                 for the most net down votes first
+        limit -- number of countries to include (default 20, at most 100)
+
+        Each country has its id, name, upvotes, downvotes, total and net votes, and
+        the ratio of up votes to all votes. Only countries with votes are ranked.
+    """
+    order = request.args.get('order', LEADERBOARD_ORDERS[0])
+    if order not in LEADERBOARD_ORDERS:
+        abort(400, f"order must be one of {', '.join(LEADERBOARD_ORDERS)}")
+    limit = request.args.get('limit', DEFAULT_LEADERBOARD_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LEADERBOARD_LIMIT:
+        abort(400, f"limit must be between 1 and {MAX_LEADERBOARD_LIMIT}")
+
+    ranking = get_leaderboard(order == 'trusted', limit)
+    etag = sha1(json.dumps(ranking).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(order=order, data=ranking)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,53 +1,209 @@
-from os import getenv
+"""Module for creating the flask app.
 
-from database.database import load_database, create_tables, get_database
+Use create_app to build an app, wsgi.py holds the app used in
+production.
+
+Authors: Thomas,
+"""
+from os import getenv, path
+
+import click
+from database.database import load_database, create_tables
 from dotenv import load_dotenv
 from flask import Flask, render_template
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import HTTPException
 
-load_dotenv()
-app = Flask(__name__)
-
-# Setup app config
-app.config["DB_ADDRESS"] = getenv("DB_ADDRESS")
-app.config["DB_PORT"] = int(getenv("DB_PORT"))
-app.config["DB_NAME"] = getenv("DB_NAME")
-app.config["DB_USERNAME"] = getenv("DB_USERNAME")
-app.config["DB_PASSWORD"] = getenv("DB_PASSWORD")
-
-app.config['SECRET_KEY'] = getenv("SECRET_KEY")
-
-# Setup sqlalchemy side of app config
-##app.config["SQLALCHEMY_DATABASE_URI"] = (f"mysql://"
-##                                         + app.config["DB_USERNAME"] + ":"
-##                                         + app.config["DB_PASSWORD"] + "@"
-##                                         + app.config["DB_ADDRESS"] + ":"
-##                                         + str(app.config["DB_PORT"]) + "/"
-##                                         + app.config["DB_NAME"])
-app.config["SQLALCHEMY_DATABASE_URI"] = ("sqlite:///:memory:")
-app.config['SQLALCHEMY_ECHO'] = getenv("SQLALCHEMY_ECHO") == "True"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = (
-    getenv("SQLALCHEMY_TRACK_MODIFICATIONS") == "True")
 
-load_database(app)
-from main.views import main_blueprint, map_blueprint, admin_blueprint, country_blueprint, search_blueprint, login_blueprint, register_blueprint
+def load_config() -> dict:
+    """Reads the app config from the environment and the .env file.
+
+    Returns:
+        A dictionary of config values.
+    """
+    load_dotenv()
+    config = {}
+
+    # Setup app config
+    config["DB_ADDRESS"] = getenv("DB_ADDRESS")
+    config["DB_PORT"] = int(getenv("DB_PORT"))
+    config["DB_NAME"] = getenv("DB_NAME")
+    config["DB_USERNAME"] = getenv("DB_USERNAME")
+    config["DB_PASSWORD"] = getenv("DB_PASSWORD")
+
+    config['SECRET_KEY'] = getenv("SECRET_KEY")
+
+    # Setup password hashing config
+    config["BCRYPT_ROUNDS"] = int(getenv("BCRYPT_ROUNDS", 12))
+    config["BCRYPT_WORKERS"] = int(getenv("BCRYPT_WORKERS", 0)) or None
+
+    # Setup engine config
+    config["DB_BACKEND"] = getenv("DB_BACKEND", "memory")
+    config["DB_SQLITE_PATH"] = getenv("DB_SQLITE_PATH", "destiknow.db")
+    config["DB_POOL_SIZE"] = int(getenv("DB_POOL_SIZE", 5))
+    config["DB_MAX_OVERFLOW"] = int(getenv("DB_MAX_OVERFLOW", 10))
+    config["DB_POOL_RECYCLE"] = int(getenv("DB_POOL_RECYCLE", 3600))
+    config["DB_POOL_PRE_PING"] = getenv("DB_POOL_PRE_PING", "True") == "True"
+    config["DB_STATEMENT_TIMEOUT"] = int(getenv("DB_STATEMENT_TIMEOUT", 0))
+    config["DB_SLOW_QUERY_MS"] = int(getenv("DB_SLOW_QUERY_MS", 100))
+    config["DB_QUERY_HEADERS"] = getenv("DB_QUERY_HEADERS") == "True"
+
+    # Seconds between checks for countries changed by other workers
+    config["CATALOGUE_CHECK_INTERVAL"] = float(
+        getenv("CATALOGUE_CHECK_INTERVAL", 5))
+    # Seconds a leaderboard is cached for, to pick up other workers' votes
+    config["LEADERBOARD_MAX_AGE"] = float(getenv("LEADERBOARD_MAX_AGE", 5))
+
+    # Setup vote queue config
+    config["VOTE_WRITE_BEHIND"] = getenv("VOTE_WRITE_BEHIND") == "True"
+    config["VOTE_FLUSH_INTERVAL"] = float(getenv("VOTE_FLUSH_INTERVAL", 1))
+    config["VOTE_FLUSH_BATCH"] = int(getenv("VOTE_FLUSH_BATCH", 500))
+
+    # Setup sqlalchemy side of app config
+    if config["DB_BACKEND"] == "mysql":
+        config["SQLALCHEMY_DATABASE_URI"] = (f"mysql://"
+                                             + config["DB_USERNAME"] + ":"
+                                             + config["DB_PASSWORD"] + "@"
+                                             + config["DB_ADDRESS"] + ":"
+                                             + str(config["DB_PORT"]) + "/"
+                                             + config["DB_NAME"])
+    elif config["DB_BACKEND"] == "sqlite":
+        config["SQLALCHEMY_DATABASE_URI"] = (
+            "sqlite:///" + path.abspath(config["DB_SQLITE_PATH"]))
+    else:
+        config["SQLALCHEMY_DATABASE_URI"] = ("sqlite:///:memory:")
+    config['SQLALCHEMY_ECHO'] = getenv("SQLALCHEMY_ECHO") == "True"
+    config['SQLALCHEMY_TRACK_MODIFICATIONS'] = (
+        getenv("SQLALCHEMY_TRACK_MODIFICATIONS") == "True")
+
+    return config
+
+
+def create_app(config: dict = None) -> Flask:
+    """Creates and sets up the flask app.
+
+    Parameters:
+        config - config values to use instead of those read from the
+            environment, missing values are read from the environment
+
+    Returns:
+        The flask app.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    load_database(app)
+
+    from database.models.user import configure_password_hashing
+    configure_password_hashing(app.config["BCRYPT_ROUNDS"],
+                               app.config["BCRYPT_WORKERS"])
+    from main.views import main_blueprint, map_blueprint, admin_blueprint, country_blueprint, search_blueprint, login_blueprint, register_blueprint
+
+    from session import login_manager
+    login_manager.init_app(app)
+
+    app.register_blueprint(main_blueprint)
+    app.register_blueprint(map_blueprint)
+    app.register_blueprint(admin_blueprint)
+    app.register_blueprint(country_blueprint)
+    app.register_blueprint(search_blueprint)
+    app.register_blueprint(login_blueprint)
+    app.register_blueprint(register_blueprint)
+
+    from api.views import api_blueprint
+    app.register_blueprint(api_blueprint)
+
+    from admin.views import bulk_blueprint
+    app.register_blueprint(bulk_blueprint)
+
+    from assets import init_assets
+    init_assets(app)
+    from main.page_cache import init_page_cache
+    init_page_cache(app)
+
+    app.cli.add_command(seed)
+    app.cli.add_command(recompute_metrics)
+    app.cli.add_command(rebuild_votes)
+    app.cli.add_command(import_data)
+    app.cli.add_command(export_data)
+    app.register_error_handler(HTTPException, render_error)
+
+    create_tables(app)
+    return app
+
+
+@click.command("seed")
+@with_appcontext
+@click.option("--directory", default=None,
+              help="Directory containing the csv files to load.")
+def seed(directory):
+    """Loads the bundled csv data into the database."""
+    from database.seed import seed_database, DATA_DIRECTORY
+    seed_database(directory or DATA_DIRECTORY)
+
+
+@click.command("recompute-metrics")
+@with_appcontext
+def recompute_metrics():
+    """Recomputes the total index and risk bands of every country."""
+    from database.models.country import recompute_derived_metrics
+    countries = recompute_derived_metrics()
+    print(f"Recomputed metrics for {countries} countries.")
+
+
+@click.command("rebuild-votes")
+@with_appcontext
+def rebuild_votes():
+    """Rebuilds the vote counters from the user_votes table."""
+    from database.models.uservotes import rebuild_vote_counts
+    countries = rebuild_vote_counts()
+    print(f"Rebuilt vote counters for {countries} countries.")
+
+
+@click.command("import-data")
+@with_appcontext
+@click.argument("table", type=click.Choice(["countries", "advice",
+                                            "country_advice"]))
+@click.argument("file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]),
+              default=None, help="Format of the file, defaults to its extension.")
+@click.option("--dry-run", is_flag=True,
+              help="Only count the rows that would change.")
+def import_data(table, file, file_format, dry_run):
+    """Inserts or updates the rows of TABLE from a csv or JSON lines FILE."""
+    from admin.bulk import import_rows, read_rows
+    file_format = file_format or path.splitext(file.name)[1].lstrip(".")
+    try:
+        counts = import_rows(table, read_rows(file, file_format),
+                             dry_run=dry_run)
+    except (ValueError, IntegrityError) as error:
+        raise click.ClickException(str(error).splitlines()[0])
+    if dry_run:
+        print(f"Would insert {counts['inserted']} and update "
+              f"{counts['updated']} rows, {counts['unchanged']} unchanged.")
+    else:
+        print(f"Inserted {counts['inserted']} and updated "
+              f"{counts['updated']} rows, {counts['unchanged']} unchanged.")
+
+
+@click.command("export-data")
+@with_appcontext
+@click.argument("table", type=click.Choice(["countries", "advice",
+                                            "country_advice"]))
+@click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]),
+              default="csv", show_default=True, help="Format to write.")
+@click.option("--output", type=click.File("w", encoding="utf-8"), default="-",
+              help="File to write to, defaults to standard output.")
+def export_data(table, file_format, output):
+    """Writes every row of TABLE as csv or JSON lines."""
+    from admin.bulk import export_rows
+    for chunk in export_rows(table, file_format):
+        output.write(chunk)
 
 
-from session import login_manager
-login_manager.init_app(app)
-
-app.register_blueprint(main_blueprint)
-app.register_blueprint(map_blueprint)
-app.register_blueprint(admin_blueprint)
-app.register_blueprint(country_blueprint)
-app.register_blueprint(search_blueprint)
-app.register_blueprint(login_blueprint)
-app.register_blueprint(register_blueprint)
-
-create_tables(app)
-
 # Error Handling
-@app.errorhandler(HTTPException)
 def render_error(error):
     error = str(error)
     errno = error[:3]
@@ -61,58 +217,12 @@ def render_error(error):
 
 
 if __name__ == "__main__":
-    from database.models.advice import Advice
-    from database.models.country import Country
-    from database.models.countryadvice import CountryAdvice
-    from database.models.user import User
-    import csv
+    from database.models.user import User, add_user
+    from database.seed import seed_database
 
+    app = create_app()
     with app.app_context():
-        
-        db = get_database()
-
-
-        # Do this for each model.
-        with open("advice.csv") as file:
-            reader = csv.reader(file)
-            header = next(reader)
-
-            for row in reader:
-                details = dict(zip(header, row))
-                item = Advice(**details)
-
-                db.session.add(item)
-                # db.session.commit() # Add it here to commit after every addition
-            db.session.commit()
-
-        # Do this for each model.
-        with open("country_advice.csv") as file:
-            reader = csv.reader(file)
-            header = next(reader)
-
-            for row in reader:
-                details = dict(zip(header, row))
-                item = CountryAdvice(**details)
-
-                db.session.add(item)
-                # db.session.commit() # Add it here to commit after every addition
-            db.session.commit()
-
-        # Do this for each model.
-        with open("countries.csv") as file:
-            reader = csv.reader(file)
-            header = next(reader)
-
-            for row in reader:
-                details = dict(zip(header, row))
-                item = Country(**details)
-
-                db.session.add(item)
-                # db.session.commit() # Add it here to commit after every addition
-            db.session.commit()
-
-        admin = User("admin", "password", "admin")
-        db.session.add(admin)
-        db.session.commit()
+        seed_database()
+        add_user(User("admin", "password", "admin"))
 
     app.run()
@@ -0,0 +1,204 @@
+"""Module for serving static assets and compressing responses.
+
+Every file in the static folder is given a fingerprinted url containing
+a hash of its contents, for example /assets/images/logo.3f2a9c01b4.png.
+Since the url changes whenever the file changes, assets are served with
+a far future Cache-Control header. Use asset_url() in templates to get
+the url of an asset.
+
+Text assets are precompressed, and images are converted to WebP for
+browsers that accept it when the optional Pillow package is installed.
+Dynamic text responses are compressed with gzip or brotli.
+
+Authors: Thomas,
+"""
+import mimetypes
+import os
+from hashlib import sha1
+from io import BytesIO
+from threading import Lock
+
+from flask import Blueprint, abort, current_app, make_response, request, url_for
+
+from compression import available_encodings, choose_encoding, compress, precompress
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+assets_blueprint = Blueprint('assets', __name__)
+
+# Module variables.
+ASSET_MAX_AGE = 31536000
+COMPRESS_MIN_SIZE = 512
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'application/json',
+    'application/javascript', 'image/svg+xml'))
+WEBP_TYPES = frozenset(('image/png', 'image/jpeg'))
+_manifest = {}
+_assets = {}
+_lock = Lock()
+
+
+def _fingerprint(filename: str, digest: str) -> str:
+    """Adds the digest to the filename before its extension."""
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{digest}{extension}"
+
+
+def build_manifest(static_folder: str) -> dict:
+    """Fingerprints every file in the static folder.
+
+    Parameters:
+        static_folder - the path of the static folder
+
+    Returns:
+        A dictionary of filenames, relative to the static folder, to
+        their fingerprinted names.
+    """
+    manifest = {}
+    for directory, _, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(directory, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as file:
+                digest = sha1(file.read()).hexdigest()[:10]
+            manifest[filename] = _fingerprint(filename, digest)
+    return manifest
+
+
+def manifest_version() -> str:
+    """Get a hash of the asset manifest, which changes whenever a file
+    in the static folder changes."""
+    return sha1(repr(sorted(_manifest.items())).encode('utf-8')).hexdigest()
+
+
+def asset_url(filename: str) -> str:
+    """Get the fingerprinted url for a file in the static folder.
+
+    Falls back to the normal static url for files that are not in the
+    manifest.
+    """
+    fingerprinted = _manifest.get(filename)
+    if fingerprinted is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.serve_asset', filename=fingerprinted)
+
+
+def _load_asset(fingerprinted: str) -> dict:
+    """Reads an asset and prepares its compressed variants.
+
+    Returns a dictionary with the mimetype and a dictionary of variants
+    keyed by (content encoding, mimetype), or None if there is no such
+    asset.
+    """
+    with _lock:
+        asset = _assets.get(fingerprinted)
+    if asset is not None:
+        return asset
+
+    filename = next((name for name, value in _manifest.items()
+                     if value == fingerprinted), None)
+    if filename is None:
+        return None
+
+    with open(os.path.join(current_app.static_folder, filename), 'rb') as file:
+        data = file.read()
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    variants = {}
+    if mimetype in COMPRESSIBLE_TYPES:
+        for encoding, body in precompress(data).items():
+            variants[(encoding, mimetype)] = body
+    else:
+        variants[('identity', mimetype)] = data
+
+    if Image is not None and mimetype in WEBP_TYPES:
+        buffer = BytesIO()
+        Image.open(BytesIO(data)).save(buffer, 'WEBP', quality=90, method=6)
+        if buffer.tell() < len(data):
+            variants[('identity', 'image/webp')] = buffer.getvalue()
+
+    asset = {'mimetype': mimetype, 'variants': variants}
+    with _lock:
+        _assets[fingerprinted] = asset
+    return asset
+
+
+def accepts_webp() -> bool:
+    """Check if the request explicitly lists image/webp in its Accept
+    header.
+
+    Wildcards such as */* and image/* are sent by clients that cannot
+    show WebP, so they are not enough.
+    """
+    return any(value == 'image/webp' and quality > 0
+               for value, quality in request.accept_mimetypes)
+
+
+@assets_blueprint.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """ Serve a fingerprinted asset with a far future cache lifetime. """
+    asset = _load_asset(filename)
+    if asset is None:
+        abort(404)
+
+    mimetype = asset['mimetype']
+    if ('identity', 'image/webp') in asset['variants'] and accepts_webp():
+        mimetype = 'image/webp'
+    encodings = [encoding for encoding, variant in asset['variants'] if variant == mimetype]
+    encoding = choose_encoding(request, encodings)
+
+    response = make_response(asset['variants'][(encoding, mimetype)])
+    response.mimetype = mimetype
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def compress_response(response):
+    """Compresses text responses when the client accepts it.
+
+    Any ETag is made weak, since the compressed body is a different
+    representation of the same page.
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding(request, available_encodings())
+    if encoding == 'identity':
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_assets(app):
+    """Sets up fingerprinted assets and response compression for the
+    app.
+
+    Parameters:
+        app - the flask app
+    """
+    global _manifest
+    _manifest = build_manifest(app.static_folder)
+    with _lock:
+        _assets.clear()
+    app.register_blueprint(assets_blueprint)
+    app.add_template_global(asset_url)
+    app.after_request(compress_response)
@@ -0,0 +1,67 @@
+"""Module for compressing response bodies.
+
+gzip is always available. Brotli is used when the optional brotli
+package is installed.
+
+Authors: Thomas,
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Module variables.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def available_encodings() -> list[str]:
+    """Get the content encodings that can be produced, best first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compresses data with the given content encoding.
+
+    Parameters:
+        data - the bytes to compress
+        encoding - br, gzip or identity
+        best - use the highest compression level, for data that is
+            compressed once and served many times
+
+    Returns the compressed bytes.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL,
+                             mtime=0)
+    return data
+
+
+def precompress(data: bytes) -> dict:
+    """Compresses data with every available encoding.
+
+    Returns a dictionary of content encoding to bytes, including the
+    uncompressed data under identity.
+    """
+    variants = {"identity": data}
+    for encoding in available_encodings():
+        variants[encoding] = compress(data, encoding, best=True)
+    return variants
+
+
+def choose_encoding(request, encodings) -> str:
+    """Picks the content encoding to respond with.
+
+    Parameters:
+        request - the flask request
+        encodings - the encodings that can be served
+
+    Returns the encoding preferred by the client, or identity.
+    """
+    return request.accept_encodings.best_match(
+        [encoding for encoding in encodings if encoding != "identity"],
+        default="identity")
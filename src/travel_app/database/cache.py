@@ -0,0 +1,66 @@
+"""This module contains helpers for keeping process-local copies of
+database rows so that hot lookups do not need a round trip to the
+database.
+
+Rows are stored as plain dictionaries of column values (snapshots)
+rather than ORM objects, since ORM objects are tied to the session
+that loaded them. A snapshot is turned back into a model instance
+belonging to the current session with restore().
+
+Author(s): Thomas,
+"""
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from database.database import _db
+
+
+def snapshot(row, model) -> dict:
+    """Copies the column values of a row into a dictionary.
+
+    Parameters:
+        row - a model instance or a result row containing every column
+            of the model
+        model - the model class the row belongs to
+
+    Returns:
+        A dictionary mapping column names to values.
+    """
+    return {column.key: getattr(row, column.key)
+            for column in model.__table__.columns}
+
+
+def restore(model, values: dict):
+    """Turns a snapshot back into a model instance in the current
+    session without querying the database.
+
+    Must be ran within app context.
+    If the session already holds an instance with the same primary
+    key, that instance is returned instead so that unsaved changes are
+    not overwritten. Only its expired attributes are filled in from
+    the snapshot.
+
+    Parameters:
+        model - the model class to create
+        values - the snapshot created with snapshot()
+
+    Returns:
+        A persistent model instance.
+    """
+    primary_key = tuple(values[column.key]
+                        for column in model.__table__.primary_key.columns)
+    existing = _db.session.identity_map.get(identity_key(model, primary_key))
+    if existing is not None:
+        for key in inspect(existing).expired_attributes & values.keys():
+            set_committed_value(existing, key, values[key])
+        return existing
+
+    # Bypass __init__ as some models do work on construction.
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    _db.session.add(instance)
+    return instance
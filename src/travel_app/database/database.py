@@ -3,28 +3,307 @@ operating on the database object
 
 Author(s): Thomas,
 """
+from contextlib import contextmanager
+from time import monotonic
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database.instrumentation import install_query_instrumentation
 
 # Module variables.
-_db = None
+# The models are declared against this instance, apps are attached to
+# it with load_database.
+_db = SQLAlchemy()
+
+# Pragmas applied to every connection of a file backed sqlite database.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+}
+
+
+def _engine_options(app) -> dict:
+    """Builds the sqlalchemy engine options from the DB_* values of the
+    app config.
+
+    Pool options are only used for databases that are not held in
+    memory, as in memory sqlite databases share a single connection.
+
+    Parameters:
+    app -- The flask session app holding the config.
+
+    Returns:
+        A dictionary of keyword arguments for create_engine.
+    """
+    config = app.config
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    uri = config.get("SQLALCHEMY_DATABASE_URI", "")
+
+    if uri.startswith("sqlite") and (":memory:" in uri or uri == "sqlite://"):
+        return options
+
+    options.setdefault("pool_pre_ping", config.get("DB_POOL_PRE_PING", True))
+    options.setdefault("pool_recycle", config.get("DB_POOL_RECYCLE", 3600))
+    if config.get("DB_POOL_SIZE") is not None:
+        options.setdefault("pool_size", config["DB_POOL_SIZE"])
+    if config.get("DB_MAX_OVERFLOW") is not None:
+        options.setdefault("max_overflow", config["DB_MAX_OVERFLOW"])
+    return options
+
+
+def _configure_engine(engine, timeout: int):
+    """Adds the connection listeners that apply the pragmas and the
+    statement timeout to the engine.
+
+    Parameters:
+    engine -- The sqlalchemy engine to configure.
+    timeout -- The statement timeout in milliseconds, 0 for none.
+    """
+    dialect = engine.dialect.name
+    in_memory = engine.url.database in (None, "", ":memory:")
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if dialect == "sqlite":
+            cursor = dbapi_connection.cursor()
+            # sqlite only enforces foreign keys, and so ON DELETE
+            # CASCADE, when asked to.
+            cursor.execute("PRAGMA foreign_keys=ON")
+            if not in_memory:
+                for pragma, value in SQLITE_PRAGMAS.items():
+                    cursor.execute(f"PRAGMA {pragma}={value}")
+            if timeout:
+                cursor.execute(f"PRAGMA busy_timeout={timeout}")
+            cursor.close()
+
+            # sqlite has no statement timeout, so interrupt statements
+            # that run past their deadline.
+            if timeout:
+                deadline = {"time": None}
+
+                def check_deadline():
+                    return (deadline["time"] is not None
+                            and monotonic() > deadline["time"])
+
+                dbapi_connection.set_progress_handler(check_deadline, 10000)
+                connection_record.info["statement_deadline"] = deadline
+
+        elif dialect == "mysql" and timeout:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION max_execution_time={int(timeout)}")
+            cursor.close()
+
+    if dialect == "sqlite" and timeout:
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_deadline(conn, cursor, statement, parameters, context,
+                           executemany):
+            deadline = conn.info.get("statement_deadline")
+            if deadline is not None:
+                deadline["time"] = monotonic() + timeout / 1000
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def stop_deadline(conn, cursor, statement, parameters, context,
+                          executemany):
+            deadline = conn.info.get("statement_deadline")
+            if deadline is not None:
+                deadline["time"] = None
 
 
 def load_database(app):
     """Loads the database connection for the app session into the _db
     variable.
 
+    The engine is configured from the following app config values:
+        DB_POOL_SIZE -- number of connections kept in the pool
+        DB_MAX_OVERFLOW -- extra connections allowed above the pool size
+        DB_POOL_RECYCLE -- seconds before a connection is replaced
+        DB_POOL_PRE_PING -- test connections before they are used
+        DB_STATEMENT_TIMEOUT -- milliseconds before a statement is
+            cancelled, 0 for no timeout
+        DB_SLOW_QUERY_MS -- statements taking longer are logged, 0 to
+            disable
+        DB_QUERY_HEADERS -- add the X-DB-Queries and X-DB-Time headers
+            to responses
+
+    Each app gets its own engine. No connections are opened until the
+    first query, so when the app is loaded before forking worker
+    processes each worker opens its own connections, as long as the
+    parent's connections are released with dispose_engines first.
+
     Parameters:
     app -- The flask session app that the database will apply to.
 
     Returns:
     	True if the database was successfully instantiated.
     """
-    global _db
-    assert _db == None, "Database instance already created."
-    _db = SQLAlchemy(app)
+    assert "sqlalchemy" not in app.extensions, (
+        "Database instance already created.")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = _engine_options(app)
+    _db.init_app(app)
+    with app.app_context():
+        _configure_engine(_db.engine,
+                          app.config.get("DB_STATEMENT_TIMEOUT", 0))
+        install_query_instrumentation(app, _db.engine)
     return True
 
 
+def dispose_engines(app, close: bool = True):
+    """Releases the pooled connections of the app's engines.
+
+    In memory sqlite databases are left alone, as their data only
+    lives as long as their connection.
+
+    Parameters:
+    app -- The flask session app holding the engines.
+    close -- False when called in a forked worker process, so that the
+        connections still used by the parent are not closed.
+    """
+    with app.app_context():
+        for engine in _db.engines.values():
+            if engine.url.database not in (None, "", ":memory:"):
+                engine.dispose(close=close)
+
+
+@contextmanager
+def unit_of_work():
+    """Groups model operations into a single transaction.
+
+    Must be ran within app context.
+    Model helpers called inside the with block flush their changes
+    instead of committing them, and everything is committed once when
+    the block ends. If an error leaves the block, every change made
+    inside it is rolled back. Errors raised by helpers should not be
+    caught inside the block, as the session cannot be used again until
+    it has been rolled back.
+
+    Units of work may be nested, inner units simply join the outermost
+    one.
+
+    Example:
+        with unit_of_work():
+            add_country(country)
+            add_country_advice(country, advice)
+
+    Yields:
+        The database session.
+    """
+    info = _db.session.info
+    depth = info.get("unit_of_work", 0)
+    if depth == 0:
+        info["on_commit"] = []
+    info["unit_of_work"] = depth + 1
+    try:
+        yield _db.session
+        if depth == 0:
+            _db.session.commit()
+    except BaseException:
+        if depth == 0:
+            _db.session.rollback()
+            info["on_commit"] = []
+        raise
+    finally:
+        info["unit_of_work"] = depth
+
+    if depth == 0:
+        callbacks, info["on_commit"] = info["on_commit"], []
+        for callback, args in callbacks:
+            callback(*args)
+
+
+def in_unit_of_work() -> bool:
+    """Get whether the current session is inside a unit of work.
+
+    Must be ran within app context.
+    """
+    return _db.session.info.get("unit_of_work", 0) > 0
+
+
+def commit():
+    """Commits the session, unless inside a unit of work.
+
+    Must be ran within app context.
+    Inside a unit of work the changes are only flushed, so that errors
+    such as IntegrityError are still raised by the helper that caused
+    them. They are committed when the unit ends.
+    """
+    if in_unit_of_work():
+        _db.session.flush()
+    else:
+        _db.session.commit()
+
+
+def rollback():
+    """Rolls back the session, unless inside a unit of work.
+
+    Must be ran within app context.
+    Inside a unit of work the whole unit is rolled back when the error
+    leaves it.
+    """
+    if not in_unit_of_work():
+        _db.session.rollback()
+
+
+def on_commit(callback, *args):
+    """Calls callback once the current changes have been committed.
+
+    Must be ran within app context.
+    Use this for work that must not happen before the data is saved,
+    such as clearing a cache. Inside a unit of work callback is called
+    after the unit commits. Outside one it is called after the next
+    commit of the session if the session has unsaved changes, and
+    straight away otherwise. It is never called if the changes are
+    rolled back.
+
+    Parameters:
+    callback -- The function to call.
+    args -- The arguments to pass to callback.
+    """
+    session = _db.session
+    if in_unit_of_work():
+        session.info["on_commit"].append((callback, args))
+    elif session.new or session.dirty or session.deleted:
+        session.info.setdefault("after_commit", []).append((callback, args))
+    else:
+        callback(*args)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    """Calls the callbacks waiting for the session to commit."""
+    for callback, args in session.info.pop("after_commit", []):
+        callback(*args)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_after_commit(session, transaction):
+    """Forgets the waiting callbacks when a transaction ends without
+    committing."""
+    if transaction.parent is None:
+        session.info.pop("after_commit", None)
+
+
+def insert_or_ignore(table):
+    """Creates an insert statement for the table that does nothing for
+    rows whose primary key, or other unique value, already exists.
+
+    Must be ran within app context.
+    """
+    dialect = _db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    return _db.insert(table)
+
+
 def get_database():
     """Get the database for the session.
 
@@ -51,16 +330,21 @@ def create_tables(app):
     """Creates all the tables in the database based on the imported
     models.
 
-    This does not overwrite existing tables in the database.
+    This does not overwrite existing tables in the database. The row
+    of the country generation table is added if it is missing.
 
     Returns:
     	True if the operation was successful.
     """
-    from database.models.country import Country
+    from database.models.country import Country, CountryGeneration
     from database.models.user import User
-    from database.models.uservotes import UserVote
+    from database.models.uservotes import UserVote, CountryVoteCount
     from database.models.advice import Advice
     from database.models.countryadvice import CountryAdvice
     with app.app_context():
     	_db.create_all()
+    	# The generation row is only updated from then on.
+    	_db.session.execute(insert_or_ignore(CountryGeneration.__table__)
+    	                    .values(id=1, generation=0))
+    	_db.session.commit()
     return True
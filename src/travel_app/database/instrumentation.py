@@ -0,0 +1,68 @@
+"""This module counts the sql statements run by the app and how long
+they take.
+
+The totals are kept per app context, so each request has its own
+count. Statements slower than DB_SLOW_QUERY_MS are logged, and the
+totals are added to responses as the X-DB-Queries and X-DB-Time
+headers when DB_QUERY_HEADERS is enabled.
+
+Author(s): Thomas,
+"""
+from time import perf_counter
+
+from flask import g, has_app_context
+from sqlalchemy import event
+
+
+def get_query_stats() -> tuple[int, float]:
+    """Get the number of statements run and the time spent running
+    them in the current app context.
+
+    Returns:
+        A tuple of (statement count, time in milliseconds).
+    """
+    if not has_app_context():
+        return 0, 0.0
+    return g.get("db_queries", 0), g.get("db_time_ms", 0.0)
+
+
+def install_query_instrumentation(app, engine):
+    """Adds the listeners that time every statement run by the engine.
+
+    Parameters:
+    app -- The flask app to log to and add headers for.
+    engine -- The sqlalchemy engine to instrument.
+    """
+    slow_ms = app.config.get("DB_SLOW_QUERY_MS", 0)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context,
+                    executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context,
+                   executemany):
+        elapsed = (perf_counter() - conn.info["query_start"].pop()) * 1000
+        if has_app_context():
+            g.db_queries = g.get("db_queries", 0) + 1
+            g.db_time_ms = g.get("db_time_ms", 0.0) + elapsed
+
+        if slow_ms and elapsed >= slow_ms:
+            app.logger.warning("Slow query (%.1fms): %s", elapsed,
+                               " ".join(statement.split()))
+
+    @event.listens_for(engine, "handle_error")
+    def discard_timer(context):
+        starts = context.connection.info.get("query_start") if (
+            context.connection is not None) else None
+        if starts:
+            starts.pop()
+
+    @app.after_request
+    def add_query_headers(response):
+        if app.config.get("DB_QUERY_HEADERS", False):
+            queries, time_ms = get_query_stats()
+            response.headers["X-DB-Queries"] = str(queries)
+            response.headers["X-DB-Time"] = f"{time_ms:.2f}"
+        return response
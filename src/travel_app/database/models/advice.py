@@ -8,7 +8,9 @@ Advise can be for any of the following:
 Author(s): Thomas,
 """
 
-from database.database import _db
+from sqlalchemy.exc import IntegrityError
+
+from database.database import _db, commit, rollback, on_commit
 
 
 class Advice(_db.Model):
@@ -19,12 +21,17 @@ class Advice(_db.Model):
     topic -- the topic name for the advice
     description -- description of the topic
     link -- link to a helpful video
+    version -- Incremented on every update, used by other processes to
+        detect edited advice
     """
     __tablename__ = "advice"
     id = _db.Column(_db.Integer, primary_key=True, autoincrement=True)
-    topic = _db.Column(_db.String(64), nullable=False)
+    topic = _db.Column(_db.String(64), nullable=False, unique=True)
     description = _db.Column(_db.String(512), nullable=False)
-    link = _db.Column(_db.String(256), nullable=True)    
+    link = _db.Column(_db.String(256), nullable=True)
+    version = _db.Column(_db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 def add_advice(advice: Advice):
@@ -35,10 +42,16 @@ def add_advice(advice: Advice):
 
     Parameters:
         advice - The Advice object to add.
+
+    Errors:
+        raises RuntimeError if the topic already exists.
     """
-    assert get_advice_by_topic(advice.topic) == None, "Advice already exists"
     _db.session.add(advice)
-    _db.session.commit()
+    try:
+        commit()
+    except IntegrityError:
+        rollback()
+        raise RuntimeError("Advice already exists")
 
 
 def remove_advice(advice: Advice):
@@ -47,12 +60,18 @@ def remove_advice(advice: Advice):
     Must be ran within app context.
     This function does nothing if the advice does not exist.
 
+    The database removes the advice from every country it was linked
+    to.
+
     Parameters:
         advice - The Advice object to remove.
     """
     if get_advice_by_topic(advice.topic):
         _db.session.delete(advice)
-        _db.session.commit()
+        commit()
+
+        from database.models.countryadvice import advice_changed
+        on_commit(advice_changed)
 
 
 def get_advice_by_topic(topic: str) -> Advice:
@@ -3,9 +3,46 @@ table.
 
 Author(s): Thomas,
 """
-from flask import Flask
+from bisect import bisect_right
+from threading import Lock
+from time import monotonic
 
-from database.database import _db
+from flask import Flask, current_app
+from sqlalchemy.orm.exc import StaleDataError
+
+from database.database import _db, commit, rollback, on_commit
+from database.cache import snapshot, restore
+
+# Lower bounds of risk bands 1 to 4. Values below 0.2 are in band 0.
+RISK_BANDS = (0.2, 0.4, 0.6, 0.8)
+INDEX_COLUMNS = ("crime_index", "disaster_risk", "corruption_index", "health")
+
+
+def risk_band(value: float) -> int:
+    """Get the risk band (0 to 4) that an index value falls in."""
+    return bisect_right(RISK_BANDS, value or 0.0)
+
+
+def derive_metrics(values: dict) -> dict:
+    """Computes the total index and the risk bands for a country.
+
+    Parameters:
+        values - dictionary containing the index columns of a country.
+            Missing or None values count as 0.
+
+    Returns:
+        A dictionary of the derived column names to their values.
+    """
+    indexes = {column: values.get(column) or 0.0 for column in INDEX_COLUMNS}
+    total_index = round(sum(indexes.values()) / len(indexes), 4)
+    return {
+        "total_index": total_index,
+        "total_band": risk_band(total_index),
+        "crime_band": risk_band(indexes["crime_index"]),
+        "disaster_band": risk_band(indexes["disaster_risk"]),
+        "corruption_band": risk_band(indexes["corruption_index"]),
+        "health_band": risk_band(indexes["health"]),
+    }
 
 
 class Country(_db.Model):
@@ -24,16 +61,39 @@ class Country(_db.Model):
     corrpution_index -- How corrupt a country is (higher means more)
     health -- The level of healthcare in the country (higher means
         better)
+    total_index -- The mean of the four indexes above
+    total_band, crime_band, disaster_band, corruption_band,
+    health_band -- The risk band (0 to 4) of each index
+    version -- Incremented on every update, used to detect edits made
+        by someone else since the country was loaded
+
+    The total index and the bands are derived from the other indexes
+    whenever the country is inserted or updated.
     """
     __tablename__ = "countries"
     id = _db.Column(_db.Integer, primary_key=True, autoincrement=True)
-    name = _db.Column(_db.String(64), nullable=False)
+    name = _db.Column(_db.String(64), nullable=False, index=True)
     description = _db.Column(_db.String(2048), nullable=False)
     travel_advice = _db.Column(_db.String(256), nullable=False)
     crime_index = _db.Column(_db.Float, default=0.0)
     disaster_risk = _db.Column(_db.Float, default=0.0)
     corruption_index = _db.Column(_db.Float, default=0.0)
     health = _db.Column(_db.Float, default=0.0)
+    total_index = _db.Column(_db.Float, default=0.0, index=True)
+    total_band = _db.Column(_db.Integer, default=0, index=True)
+    crime_band = _db.Column(_db.Integer, default=0)
+    disaster_band = _db.Column(_db.Integer, default=0)
+    corruption_band = _db.Column(_db.Integer, default=0)
+    health_band = _db.Column(_db.Integer, default=0)
+    version = _db.Column(_db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {"version_id_col": version}
+
+    def update_derived_metrics(self):
+        """Recompute the total index and risk bands from the indexes"""
+        indexes = {column: getattr(self, column) for column in INDEX_COLUMNS}
+        for key, value in derive_metrics(indexes).items():
+            setattr(self, key, value)
 
     def __eq__(self, other):
         assert isinstance(other, Country)
@@ -46,6 +106,150 @@ class Country(_db.Model):
         return f"Country <{self.name}>"
 
 
+class CountryGeneration(_db.Model):
+    """Model class for the generation of the countries table.
+
+    The table holds a single row. Its generation is incremented in the
+    same transaction as every change made to the countries by the
+    model helpers, so other processes can tell the countries changed
+    even when the change leaves the count, the highest id and the
+    versions as they were, such as removing a country and adding one
+    with the same id.
+
+    Fields:
+    id -- The id of the row, always 1
+    generation -- Incremented on every change to the countries
+    """
+    __tablename__ = "country_generation"
+    id = _db.Column(_db.Integer, primary_key=True)
+    generation = _db.Column(_db.Integer, nullable=False, default=0)
+
+
+@_db.event.listens_for(Country, "before_insert")
+@_db.event.listens_for(Country, "before_update")
+def _update_derived_metrics(mapper, connection, country):
+    country.update_derived_metrics()
+
+
+# Module variables for the country catalogue cache.
+_cache_lock = Lock()
+_cache_by_name = None
+_cache_by_id = None
+_catalogue_version = 0
+_cache_signature = None
+_checked_at = 0.0
+
+
+def _normalize_name(name: str) -> str:
+    """Normalizes a country name for use as a cache key."""
+    return name.strip().lower()
+
+
+def countries_changed():
+    """Increments the generation of the countries table.
+
+    Must be ran within app context.
+    Must be called in the same transaction as the change to the
+    countries. The increment is not committed. The row is added by
+    create_tables.
+    """
+    _db.session.execute(
+        _db.update(CountryGeneration).where(CountryGeneration.id == 1)
+        .values(generation=CountryGeneration.generation + 1))
+
+
+def _table_signature() -> tuple:
+    """Get values that change whenever a country is added, removed or
+    edited.
+
+    Must be ran within app context.
+    """
+    generation = (_db.select(CountryGeneration.generation)
+                  .where(CountryGeneration.id == 1).scalar_subquery())
+    return tuple(_db.session.execute(_db.select(
+        _db.func.count(), _db.func.max(Country.id),
+        _db.func.sum(Country.version), generation)).one())
+
+
+def _check_catalogue():
+    """Invalidates the cache if the countries were changed by another
+    process, such as another worker.
+
+    Must be ran within app context.
+    The database is checked at most once every CATALOGUE_CHECK_INTERVAL
+    seconds of the app config. An interval of 0 disables the check.
+    """
+    global _checked_at
+
+    interval = current_app.config.get("CATALOGUE_CHECK_INTERVAL", 0)
+    if not interval or _cache_signature is None:
+        return
+    now = monotonic()
+    if now - _checked_at < interval:
+        return
+    _checked_at = now
+    if _table_signature() != _cache_signature:
+        invalidate_country_cache()
+
+
+def _load_catalogue() -> tuple[dict, dict]:
+    """Loads the country catalogue cache if it is not already loaded.
+
+    Must be ran within app context.
+
+    Returns:
+        The name and id lookup dictionaries of the cache.
+    """
+    global _cache_by_name
+    global _cache_by_id
+    global _cache_signature
+
+    _check_catalogue()
+    with _cache_lock:
+        if _cache_by_name is None:
+            if current_app.config.get("CATALOGUE_CHECK_INTERVAL", 0):
+                _cache_signature = _table_signature()
+            by_name = {}
+            by_id = {}
+            rows = _db.session.execute(
+                _db.select(*Country.__table__.columns).order_by(Country.id))
+            for row in rows:
+                values = snapshot(row, Country)
+                by_name.setdefault(_normalize_name(values["name"]), values)
+                by_id[values["id"]] = values
+            _cache_by_id = by_id
+            _cache_by_name = by_name
+        return _cache_by_name, _cache_by_id
+
+
+def invalidate_country_cache():
+    """Clears the country catalogue cache.
+
+    Must be called whenever a country is added, removed or edited. The
+    cache is reloaded the next time a country is looked up.
+    """
+    global _cache_by_name
+    global _cache_by_id
+    global _catalogue_version
+    global _cache_signature
+
+    with _cache_lock:
+        _cache_by_name = None
+        _cache_by_id = None
+        _cache_signature = None
+        _catalogue_version += 1
+
+
+def get_catalogue_version() -> int:
+    """Get a number that changes every time the country catalogue
+    cache is invalidated.
+
+    Must be ran within app context.
+    """
+    _check_catalogue()
+    return _catalogue_version
+
+
 def all_country_names() -> list[str]:
     """Fetch all the country names from the database.
 
@@ -53,24 +257,83 @@ def all_country_names() -> list[str]:
 
     Returns a list of strings containing every name.
     """
-    results = Country.query.all()
-    if results:
-        results = [country.name for country in Country.query.all()]
-    return results
+    by_name, by_id = _load_catalogue()
+    return [values["name"] for values in by_id.values()]
+
+
+def get_catalogue() -> list[dict]:
+    """Fetch the column values of every country from the catalogue
+    cache.
+
+    Must be ran within app context.
+    The returned dictionaries are shared with the cache and must not
+    be modified.
+
+    Returns a list of dictionaries ordered by country id.
+    """
+    by_name, by_id = _load_catalogue()
+    return list(by_id.values())
 
 
 def get_country_by_name(name: str) -> Country:
     """Fetch the country from the database with the given name.
 
     Must be ran within app context.
+    The name is not case sensitive. Lookups are served from the
+    country catalogue cache, which holds every country, so names that
+    are not found do not query the database. Countries written to the
+    database by other processes are found once the cache is reloaded,
+    at most CATALOGUE_CHECK_INTERVAL seconds later.
 
     Parameters:
         name - string representing the name of the country
 
     Returns the country object if one was found, otherwise None.
     """
-    result = Country.query.filter_by(name=name).first()
-    return result
+    if not isinstance(name, str):
+        return None
+
+    by_name, by_id = _load_catalogue()
+    values = by_name.get(_normalize_name(name))
+    if values is None:
+        return None
+    return restore(Country, values)
+
+
+def get_country_ids_by_name(names) -> list[int]:
+    """Fetch the ids of the countries with the given names.
+
+    Must be ran within app context.
+    The names are not case sensitive, like get_country_by_name. Names
+    are looked up in the country catalogue cache and names that are
+    not found are left out.
+
+    Parameters:
+        names - iterable of country names
+
+    Returns a list of ids.
+    """
+    by_name, by_id = _load_catalogue()
+    found = [by_name.get(_normalize_name(name)) for name in names]
+    return [values["id"] for values in found if values is not None]
+
+
+def get_country_by_id(country_id: int) -> Country:
+    """Fetch the country from the database with the given id.
+
+    Must be ran within app context.
+    Lookups are served from the country catalogue cache where possible.
+
+    Parameters:
+        country_id - the id of the country
+
+    Returns the country object if one was found, otherwise None.
+    """
+    by_name, by_id = _load_catalogue()
+    values = by_id.get(country_id)
+    if values is not None:
+        return restore(Country, values)
+    return _db.session.get(Country, country_id)
 
 
 def get_all_countries() -> set:
@@ -87,29 +350,65 @@ def remove_country(country: Country):
 
     Must be ran within app context.
     Checks country is in the database before attempting removal.
-    Also deletes all user votes and country advice alongside it.
+    The database deletes the user votes, vote counters and country
+    advice of the country alongside it, all in one transaction.
 
     Parameters:
         country - the country to remove
     """
     # Check country in db before continuing.
-    in_db = Country.query.filter_by(id=country.id) != None
-    if not in_db:
+    country = _db.session.get(Country, country.id, populate_existing=True)
+    if country is None:
         return
 
-    # Remove all user votes.
-    from database.models.uservotes import get_all_votes, remove_vote
-    for vote in get_all_votes(country):
-        remove_vote(vote)
+    _db.session.delete(country)
+    countries_changed()
+    commit()
+    on_commit(invalidate_country_cache)
+
+    from database.models.countryadvice import advice_changed
+    from database.models.uservotes import votes_changed
+    on_commit(advice_changed)
+    on_commit(votes_changed)
 
-    # Remove all country advice.
-    from database.models.countryadvice import get_advice, remove_country_advice
-    for advice in get_advice(country):
-        remove_country_advice(country, advice)
 
-    # Remove country.
-    _db.session.delete(country)
-    _db.session.commit()
+def edit_country(country_id: int, version: int, values: dict) -> Country:
+    """Edits a country if nobody else has edited it since it was
+    loaded.
+
+    Must be ran within app context.
+    The country is read from the database rather than the catalogue
+    cache so that its version is current.
+
+    Parameters:
+        country_id - the id of the country to edit
+        version - the version of the country the edit was based on
+        values - dictionary of column names to their new values
+
+    Returns:
+        The edited country, or None if the country does not exist.
+
+    Errors:
+        RuntimeError - the country has been changed since it was
+            loaded at the given version
+    """
+    country = _db.session.get(Country, country_id, populate_existing=True)
+    if country is None:
+        return None
+    if country.version != version:
+        raise RuntimeError("Country has been changed by someone else")
+
+    for key, value in values.items():
+        setattr(country, key, value)
+    try:
+        countries_changed()
+        commit()
+    except StaleDataError:
+        # Another edit was committed between loading and saving.
+        rollback()
+        raise RuntimeError("Country has been changed by someone else")
+    on_commit(invalidate_country_cache)
+    return country
 
 
 def add_country(country: Country):
@@ -124,5 +423,55 @@ def add_country(country: Country):
         country - the country to add
     """
     _db.session.add(country)
-    _db.session.commit()
+    countries_changed()
+    commit()
+    on_commit(invalidate_country_cache)
+
 
+def get_countries_by_risk(descending: bool = True, band: int = None,
+                          limit: int = None) -> list[Country]:
+    """Fetch countries ordered by their total index.
+
+    Must be ran within app context.
+    The ordering and filtering are done by the database.
+
+    Parameters:
+        descending - True to list the riskiest countries first
+        band - only include countries in this total risk band
+        limit - the maximum number of countries to return
+
+    Returns:
+        A list of countries.
+    """
+    query = Country.query
+    if band is not None:
+        query = query.filter(Country.total_band == band)
+    order = Country.total_index.desc() if descending else Country.total_index
+    query = query.order_by(order, Country.name)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def recompute_derived_metrics() -> int:
+    """Recomputes the total index and risk bands of every country.
+
+    Must be ran within app context.
+    Use this to fill in the derived columns for countries added
+    without the ORM.
+
+    Returns:
+        The number of countries updated.
+    """
+    rows = _db.session.execute(_db.select(
+        Country.id, Country.version,
+        *[getattr(Country, column) for column in INDEX_COLUMNS]))
+    # The version is checked and incremented like any other update.
+    updates = [dict(derive_metrics(row._mapping), id=row.id,
+                    version=row.version) for row in rows]
+    if updates:
+        _db.session.execute(_db.update(Country), updates)
+        countries_changed()
+    commit()
+    on_commit(invalidate_country_cache)
+    return len(updates)
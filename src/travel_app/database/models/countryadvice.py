@@ -3,11 +3,19 @@ relationship between countries and advice for the country.
 
 Author(s): Thomas,
 """
+from time import monotonic
 
-from database.database import _db
+from flask import current_app
+
+from database.database import _db, commit, on_commit
 from database.models.country import Country
 from database.models.advice import Advice
 
+# Module variables.
+_advice_version = 0
+_advice_signature = None
+_advice_checked_at = 0.0
+
 
 class CountryAdvice(_db.Model):
     """Model class for determining a relationship betweeen a country
@@ -18,15 +26,71 @@ class CountryAdvice(_db.Model):
     advice_id -- the advice for the country
     """
     __tablename__ = "country_advice"
-    country_id = _db.Column(_db.Integer, _db.ForeignKey("countries.id"),
+    country_id = _db.Column(_db.Integer,
+                            _db.ForeignKey("countries.id", ondelete="CASCADE"),
                             primary_key=True)
-    advice_id = _db.Column(_db.Integer, _db.ForeignKey("advice.id"),
+    advice_id = _db.Column(_db.Integer,
+                           _db.ForeignKey("advice.id", ondelete="CASCADE"),
                            primary_key=True)
 
+    # The database deletes the links of a removed country or advice.
+    advice = _db.relationship(Advice, lazy="joined", innerjoin=True,
+                              backref=_db.backref("country_links",
+                                                  cascade="all, delete",
+                                                  passive_deletes=True))
+    country = _db.relationship(Country, backref=_db.backref(
+        "advice_links", cascade="all, delete", passive_deletes=True))
+
     def __repr__(self):
         return f"CountryAdvice <{self.country_id}, {self.advice_id}>"
 
       
+def _table_signature() -> tuple:
+    """Get values that change whenever advice or a country advice
+    relationship is added, removed or edited.
+
+    Must be ran within app context.
+    """
+    advice = _db.session.execute(_db.select(
+        _db.func.count(), _db.func.max(Advice.id),
+        _db.func.sum(Advice.version))).one()
+    links = _db.session.execute(_db.select(
+        _db.func.count(), _db.func.sum(CountryAdvice.country_id),
+        _db.func.sum(CountryAdvice.advice_id),
+        _db.func.sum(CountryAdvice.country_id * CountryAdvice.advice_id))
+        ).one()
+    return tuple(advice) + tuple(links)
+
+
+def get_advice_version() -> int:
+    """Get a number that changes every time advice or a country advice
+    relationship is added, removed or edited.
+
+    Must be ran within app context.
+    Changes made by other processes, such as other workers, are found
+    by checking the tables at most once every CATALOGUE_CHECK_INTERVAL
+    seconds of the app config. An interval of 0 disables the check.
+    """
+    global _advice_signature
+    global _advice_checked_at
+
+    interval = current_app.config.get("CATALOGUE_CHECK_INTERVAL", 0)
+    now = monotonic()
+    if interval and now - _advice_checked_at >= interval:
+        _advice_checked_at = now
+        signature = _table_signature()
+        if _advice_signature is not None and signature != _advice_signature:
+            advice_changed()
+        _advice_signature = signature
+    return _advice_version
+
+
+def advice_changed():
+    """Records that the country advice relationships have changed."""
+    global _advice_version
+    _advice_version += 1
+
+
 def get_advice(country: Country) -> list[Advice]:
     """Fetches all the advice for the country.
 
@@ -39,11 +103,36 @@ def get_advice(country: Country) -> list[Advice]:
         A list of Advice objects related to the country
     """
     assert isinstance(country, Country)
-    advice_ids = [advice.advice_id for advice in CountryAdvice.query.filter_by(
-        country_id=country.id).all()]
-    advice = [Advice.query.filter_by(id=advice_id).one()
-              for advice_id in advice_ids]
-    return advice    
+    return get_advice_for_countries([country])[country]
+
+
+def get_advice_for_countries(countries) -> dict[Country, list[Advice]]:
+    """Fetches all the advice for many countries in a single query.
+
+    Must be ran within app context.
+
+    Parameters:
+        countries - An iterable of the countries to get advice for
+
+    Returns:
+        A dictionary mapping each country to a list of its Advice
+        objects.
+    """
+    countries = list(countries)
+    for country in countries:
+        assert isinstance(country, Country)
+
+    results = {country: [] for country in countries}
+    by_id = {country.id: results[country] for country in countries}
+    if not by_id:
+        return results
+
+    links = CountryAdvice.query.filter(
+        CountryAdvice.country_id.in_(by_id.keys())).order_by(
+            CountryAdvice.country_id, CountryAdvice.advice_id)
+    for link in links:
+        by_id[link.country_id].append(link.advice)
+    return results
 
 
 def add_country_advice(country: Country, advice: Advice):
@@ -66,7 +155,8 @@ def add_country_advice(country: Country, advice: Advice):
         country_id=country.id,
         advice_id=advice.id)
     _db.session.add(country_advice)
-    _db.session.commit()
+    commit()
+    on_commit(advice_changed)
 
 
 def remove_country_advice(country: Country, advice: Advice):
@@ -86,5 +176,5 @@ def remove_country_advice(country: Country, advice: Advice):
         advice_id=advice.id).one_or_none()
     if country_advice:
         _db.session.delete(country_advice)
-        _db.session.commit()
-
+        commit()
+        on_commit(advice_changed)
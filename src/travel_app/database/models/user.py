@@ -2,11 +2,124 @@
 
 Author(s): Thomas,
 """
-from database.database import _db
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from threading import BoundedSemaphore, Lock
+from time import monotonic, perf_counter
+
+from database.cache import snapshot, restore
+from database.database import _db, commit, rollback, on_commit
 from flask_login import UserMixin
+from sqlalchemy.exc import IntegrityError
 
 from bcrypt import hashpw, gensalt, checkpw
 
+# Module variables for password hashing.
+_rounds = 12
+_executor = None
+_slots = None
+_wait_timeout = 30
+_metrics_lock = Lock()
+_metrics = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+# Module variables for the user cache.
+USER_CACHE_TTL = 30
+USER_CACHE_SIZE = 1024
+_user_cache = OrderedDict()
+_user_cache_lock = Lock()
+
+
+def configure_password_hashing(rounds: int = 12, workers: int = None,
+                               queue_size: int = None, timeout: int = 30):
+    """Sets up how passwords are hashed and checked.
+
+    Hashing runs on a bounded pool of worker threads so that a burst of
+    logins cannot use more than workers cores. Callers wait for a free
+    place in the queue for up to timeout seconds.
+
+    Parameters:
+        rounds - the bcrypt work factor for new passwords (4 to 31)
+        workers - number of hashing threads, defaults to the number of
+            cpus
+        queue_size - number of hashes that may wait for a thread,
+            defaults to 4 times workers
+        timeout - seconds to wait for a place in the queue
+    """
+    global _rounds
+    global _executor
+    global _slots
+    global _wait_timeout
+
+    assert 4 <= rounds <= 31, "bcrypt rounds must be between 4 and 31"
+    workers = workers or cpu_count() or 1
+    queue_size = workers * 4 if queue_size is None else queue_size
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _rounds = rounds
+    _executor = ThreadPoolExecutor(max_workers=workers,
+                                   thread_name_prefix="bcrypt")
+    _slots = BoundedSemaphore(workers + queue_size)
+    _wait_timeout = timeout
+
+
+def _run_hash(func, *args):
+    """Runs a bcrypt function on the hashing pool and records how long
+    it took.
+
+    Errors:
+        raises RuntimeError if the queue stays full for longer than the
+        configured timeout.
+    """
+    if _executor is None:
+        configure_password_hashing(_rounds)
+
+    def timed():
+        start = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = (perf_counter() - start) * 1000
+            with _metrics_lock:
+                _metrics["count"] += 1
+                _metrics["total_ms"] += elapsed
+                _metrics["max_ms"] = max(_metrics["max_ms"], elapsed)
+
+    if not _slots.acquire(timeout=_wait_timeout):
+        raise RuntimeError("Password hashing queue is full")
+    try:
+        return _executor.submit(timed).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password: str) -> bytes:
+    """Hashes the password with the configured bcrypt work factor."""
+    return _run_hash(hashpw, password.encode("utf-8"), gensalt(_rounds))
+
+
+def check_password(password: str, hashed) -> bool:
+    """Checks the password against a bcrypt hash."""
+    if not isinstance(hashed, bytes):
+        hashed = hashed.encode("utf-8")
+    return _run_hash(checkpw, password.encode("utf-8"), hashed)
+
+
+def get_hash_metrics() -> dict:
+    """Get the latency metrics for password hashing.
+
+    Returns:
+        A dictionary containing the number of hashes (count) and the
+        total, mean and maximum time taken in milliseconds.
+    """
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["mean_ms"] = (metrics["total_ms"] / metrics["count"]
+                          if metrics["count"] else 0.0)
+    return metrics
+
+
 class User(UserMixin, _db.Model):
     """Model class for user account details
 
@@ -18,19 +131,25 @@ class User(UserMixin, _db.Model):
     """
     __tablename__ = "users"
     id = _db.Column(_db.Integer, primary_key=True, autoincrement=True)
-    username = _db.Column(_db.String(32), nullable=False)
+    username = _db.Column(_db.String(32), nullable=False, unique=True)
     password = _db.Column(_db.String(64), nullable=False)
     role = _db.Column(_db.String(16), nullable=False)
 
     def __init__(self, username, password, role="guest"):
         self.username = username
-        self.password = hashpw(password.encode("utf-8"), salt=gensalt())
+        self.password = hash_password(password)
         self.role = role
         
     def set_role(self, role):
         """Set the role for the user"""
         assert role in ["guest", "admin"], "Unknown role"
-        self.role = role        
+        self.role = role
+        on_commit(invalidate_user, self.id)
+
+    def set_password(self, password):
+        """Set a new password for the user"""
+        self.password = hash_password(password)
+        on_commit(invalidate_user, self.id)
 
     def __repr__(self):
         return f"User <{self.username}, {self.role}>"
@@ -48,10 +167,12 @@ def add_user(user: User):
     Errors:
         raises RuntimeError if username already exists.
     """
-    if get_user_by_name(user.username) != None:
-        raise RuntimeError("User already exists")
     _db.session.add(user)
-    _db.session.commit()
+    try:
+        commit()
+    except IntegrityError:
+        rollback()
+        raise RuntimeError("User already exists")
 
 
 def remove_user(user: User):
@@ -59,13 +180,61 @@ def remove_user(user: User):
 
     Must be ran within app context.
     This function does nothing if the user does not exist already.
+    The user's votes are removed in the same transaction.
 
     Parameters:
         user - the User to remove
     """
     if User.query.filter_by(id=user.id).one_or_none() != None:
+        from database.models.uservotes import remove_user_votes, votes_changed
+        remove_user_votes(user.id)
         _db.session.delete(user)
-        _db.session.commit()
+        commit()
+        on_commit(invalidate_user, user.id)
+        on_commit(votes_changed)
+
+
+def invalidate_user(user_id: int):
+    """Removes the user from the user cache.
+
+    Must be called whenever a user is changed or removed.
+
+    Parameters:
+        user_id - the id of the user to remove
+    """
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def get_user_by_id(user_id: int):
+    """Fetch the user from the database with the given id.
+
+    Must be ran within app context.
+    Users are kept in a size bounded cache for USER_CACHE_TTL seconds
+    so repeated lookups of the same user do not query the database.
+
+    Parameters:
+        user_id - the id of the user
+
+    Returns the User object if one was found, otherwise None.
+    """
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry is not None and entry[0] > monotonic():
+            _user_cache.move_to_end(user_id)
+            return restore(User, entry[1])
+
+    user = _db.session.get(User, user_id)
+    if user is None:
+        return None
+
+    with _user_cache_lock:
+        _user_cache[user_id] = (monotonic() + USER_CACHE_TTL,
+                                snapshot(user, User))
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return user
 
 
 def get_user_by_name(username: str):
@@ -93,14 +262,15 @@ def validate_user(username: str, password: str):
         password - The password to check
 
     Returns:
-        True if the username and password are correct.
+        The User if the username and password are correct, otherwise
+        False.
     """
     user = get_user_by_name(username)
 
     if user == None:
         return False
 
-    check_against = (user.password if isinstance(user.password, bytes) else
-                     user.password.encode("utf-8"))
-    return checkpw(password.encode("utf-8"), check_against)
+    if check_password(password, user.password):
+        return user
+    return False
     
@@ -4,8 +4,12 @@ and down votes.
 Authors(s): Thomas,
 """
 from enum import Enum
+from threading import Lock
+from time import monotonic
 
-from database.database import _db
+from flask import current_app
+
+from database.database import _db, commit, insert_or_ignore, on_commit
 from database.models.country import Country
 from database.models.user import User
 
@@ -25,12 +29,195 @@ class UserVote(_db.Model):
     vote_id -- the id of the vote (1 for up vote, 2 for down vote)
     """
     __tablename__ = "user_votes"
-    user_id = _db.Column(_db.Integer, _db.ForeignKey("users.id"),
+    __table_args__ = (
+        _db.Index("ix_user_votes_country_id_vote_id", "country_id", "vote_id"),
+    )
+    user_id = _db.Column(_db.Integer,
+                         _db.ForeignKey("users.id", ondelete="CASCADE"),
                          primary_key=True)
-    country_id = _db.Column(_db.Integer, _db.ForeignKey("countries.id"),
+    country_id = _db.Column(_db.Integer,
+                            _db.ForeignKey("countries.id", ondelete="CASCADE"),
                             primary_key=True)
     vote_id = _db.Column(_db.Integer, nullable=False)
 
+    # The database deletes the votes of a removed user or country.
+    user = _db.relationship(User, backref=_db.backref(
+        "votes", cascade="all, delete", passive_deletes=True))
+    country = _db.relationship(Country, backref=_db.backref(
+        "votes", cascade="all, delete", passive_deletes=True))
+
+
+class CountryVoteCount(_db.Model):
+    """Vote counter table holding the number of up and down votes for
+    each country.
+
+    The counters are maintained by add_vote and remove_vote so that
+    reading them does not require counting the user_votes table.
+
+    Fields:
+    country_id -- the id of the country the counters belong to
+    upvotes -- the number of up votes for the country
+    downvotes -- the number of down votes for the country
+    """
+    __tablename__ = "country_vote_counts"
+    country_id = _db.Column(_db.Integer,
+                            _db.ForeignKey("countries.id", ondelete="CASCADE"),
+                            primary_key=True)
+    upvotes = _db.Column(_db.Integer, nullable=False, default=0)
+    downvotes = _db.Column(_db.Integer, nullable=False, default=0)
+
+    country = _db.relationship(Country, backref=_db.backref(
+        "vote_count", uselist=False, cascade="all, delete",
+        passive_deletes=True))
+
+    def __repr__(self):
+        return (f"CountryVoteCount <{self.country_id}, {self.upvotes}, "
+                f"{self.downvotes}>")
+
+
+# Module variables for the leaderboard cache.
+_leaderboard_lock = Lock()
+_leaderboards = {}
+_vote_version = 0
+
+
+def votes_changed():
+    """Clears the leaderboard cache.
+
+    Must be called whenever a vote is added or removed. The
+    leaderboards are rebuilt the next time they are requested.
+    """
+    global _vote_version
+
+    with _leaderboard_lock:
+        _leaderboards.clear()
+        _vote_version += 1
+
+
+def get_vote_version() -> int:
+    """Get a number that changes every time a vote is added or removed
+    by this process.
+    """
+    return _vote_version
+
+
+def _update_vote_count(country_id: int, vote_id: int, change: int):
+    """Adds change to the counter for the vote type of vote_id.
+
+    Must be ran within app context.
+    The update is added to the current transaction and is not
+    committed. The counter row is created when votes are added to a
+    country without one, with an insert that does nothing if another
+    request created the row first.
+
+    Parameters:
+        country_id - the id of the country to update
+        vote_id - the value of the VoteType that changed
+        change - the amount to add to the counter
+    """
+    column = (CountryVoteCount.upvotes
+              if vote_id == VoteType.UPVOTE.value
+              else CountryVoteCount.downvotes)
+    if change > 0:
+        _db.session.execute(
+            insert_or_ignore(CountryVoteCount.__table__).values(
+                country_id=country_id, upvotes=0, downvotes=0))
+    _db.session.execute(
+        _db.update(CountryVoteCount)
+        .where(CountryVoteCount.country_id == country_id)
+        .values({column: column + change}))
+
+
+def cast_vote(user_id: int, country_id: int, vote_type: VoteType) -> bool:
+    """Records the user's vote for the country if they have not voted
+    for it yet.
+
+    Must be ran within app context.
+    The vote is inserted with a single statement that does nothing if
+    the user has already voted, so it is safe to call concurrently.
+    The vote counters are updated in the same transaction.
+
+    Parameters:
+        user_id - the id of the user voting
+        country_id - the id of the country being voted for
+        vote_type - the VoteType of the vote
+
+    Returns:
+        True if the vote was recorded, False if the user had already
+        voted for the country.
+    """
+    assert isinstance(vote_type, VoteType), "Expected VoteType for vote_type"
+    result = _db.session.execute(
+        insert_or_ignore(UserVote.__table__).values(
+            user_id=user_id, country_id=country_id,
+            vote_id=vote_type.value))
+    changed = result.rowcount == 1
+    if changed:
+        _update_vote_count(country_id, vote_type.value, 1)
+    commit()
+    if changed:
+        on_commit(votes_changed)
+    return changed
+
+
+def clear_vote(user_id: int, country_id: int) -> bool:
+    """Removes the user's vote for the country.
+
+    Must be ran within app context.
+    The vote counters are updated in the same transaction.
+
+    Parameters:
+        user_id - the id of the user who voted
+        country_id - the id of the country that was voted for
+
+    Returns:
+        True if a vote was removed, False if there was no vote.
+    """
+    condition = _db.and_(UserVote.user_id == user_id,
+                         UserVote.country_id == country_id)
+    if _db.session.get_bind().dialect.delete_returning:
+        vote_id = _db.session.execute(
+            _db.delete(UserVote.__table__).where(condition)
+            .returning(UserVote.vote_id)).scalar()
+    else:
+        vote_id = _db.session.execute(
+            _db.select(UserVote.vote_id).where(condition)).scalar()
+        if vote_id is not None:
+            result = _db.session.execute(
+                _db.delete(UserVote.__table__).where(condition))
+            # Another request may have removed the vote since the select,
+            # in which case it has already updated the counters.
+            if result.rowcount != 1:
+                vote_id = None
+
+    if vote_id is not None:
+        _update_vote_count(country_id, vote_id, -1)
+    commit()
+    if vote_id is not None:
+        on_commit(votes_changed)
+    return vote_id is not None
+
+
+def remove_user_votes(user_id: int):
+    """Removes every vote made by the user.
+
+    Must be ran within app context.
+    The vote counters of the countries voted for are updated. The
+    changes are added to the current transaction and are not
+    committed, so votes_changed must be called after the commit.
+
+    Parameters:
+        user_id - the id of the user whose votes to remove
+    """
+    totals = _db.session.execute(
+        _db.select(UserVote.country_id, UserVote.vote_id, _db.func.count())
+        .where(UserVote.user_id == user_id)
+        .group_by(UserVote.country_id, UserVote.vote_id)).all()
+    for country_id, vote_id, count in totals:
+        _update_vote_count(country_id, vote_id, -count)
+    _db.session.execute(_db.delete(UserVote.__table__)
+                        .where(UserVote.user_id == user_id))
+
 
 def add_vote(vote: UserVote):
     """Adds a UserVote to the database.
@@ -50,7 +237,9 @@ def add_vote(vote: UserVote):
             != None):
         raise RuntimeError("Vote already exists for this user and country")
     _db.session.add(vote)
-    _db.session.commit()
+    _update_vote_count(vote.country_id, vote.vote_id, 1)
+    commit()
+    on_commit(votes_changed)
 
 
 def remove_vote(vote: UserVote):
@@ -62,11 +251,13 @@ def remove_vote(vote: UserVote):
     Parameters:
         vote - the UserVote to remove
     """
-    if (get_user_vote(User.query.filter_by(id=vote.user_id).one(),
-                      Country.query.filter_by(id=vote.country_id).one())
-            != None):
+    existing = get_user_vote(User.query.filter_by(id=vote.user_id).one(),
+                             Country.query.filter_by(id=vote.country_id).one())
+    if existing != None:
         _db.session.delete(vote)
-        _db.session.commit()
+        _update_vote_count(existing.country_id, existing.vote_id, -1)
+        commit()
+        on_commit(votes_changed)
     
 
 def get_user_vote(user:User, country: Country) -> VoteType:
@@ -86,6 +277,25 @@ def get_user_vote(user:User, country: Country) -> VoteType:
         user_id=user.id, country_id=country.id).first()
 
 
+def get_vote_type(user_id: int, country_id: int) -> VoteType:
+    """Fetches the type of the user's vote for the given country.
+
+    Must be ran within app context.
+
+    Parameters:
+        user_id - the id of the user in question
+        country_id - the id of the country to search for
+
+    Returns:
+        The VoteType of the vote or None if no vote exists.
+    """
+    vote_id = _db.session.execute(
+        _db.select(UserVote.vote_id)
+        .where(UserVote.user_id == user_id,
+               UserVote.country_id == country_id)).scalar()
+    return VoteType(vote_id) if vote_id is not None else None
+
+
 def get_votes(country: Country, vote_type: VoteType) -> list[UserVote]:
     """Find all votes of vote_type for this country.
 
@@ -114,4 +324,144 @@ def get_all_votes(country: Country) -> list[UserVote]:
         A list containing all UserVote for the country.
     """
     return UserVote.query.filter_by(country_id=country.id).all()
-    
+
+
+def get_vote_counts(country: Country) -> tuple[int, int]:
+    """Fetch the number of up and down votes for this country.
+
+    Must be ran within app context.
+    Reads the maintained counters instead of counting votes.
+
+    Parameters:
+        country - The country to find the vote counts for.
+
+    Returns:
+        A tuple of (upvotes, downvotes).
+    """
+    counter = _db.session.get(CountryVoteCount, country.id)
+    if counter is None:
+        return 0, 0
+    return counter.upvotes, counter.downvotes
+
+
+def _summary(country_id: int, name: str, upvotes: int,
+             downvotes: int) -> dict:
+    """Creates the vote summary of a country from its counters."""
+    total = upvotes + downvotes
+    return {
+        "id": country_id,
+        "name": name,
+        "upvotes": upvotes,
+        "downvotes": downvotes,
+        "total": total,
+        "net": upvotes - downvotes,
+        "ratio": round(upvotes / total, 4) if total else None,
+    }
+
+
+def get_vote_summaries(country_ids: list[int]) -> dict:
+    """Fetch the vote summaries of several countries in one query.
+
+    Must be ran within app context.
+    Countries without votes have zero counts and a ratio of None.
+
+    Parameters:
+        country_ids - the ids of the countries to summarize
+
+    Returns:
+        A dictionary of country ids to dictionaries with the "upvotes",
+        "downvotes", "total" and "net" votes, and the "ratio" of
+        up votes to all votes.
+    """
+    rows = _db.session.execute(
+        _db.select(Country.id, Country.name,
+                   _db.func.coalesce(CountryVoteCount.upvotes, 0),
+                   _db.func.coalesce(CountryVoteCount.downvotes, 0))
+        .outerjoin(CountryVoteCount,
+                   CountryVoteCount.country_id == Country.id)
+        .where(Country.id.in_(country_ids)))
+    return dict((row[0], _summary(*row)) for row in rows)
+
+
+def _load_leaderboard(descending: bool, limit: int) -> list[dict]:
+    """Ranks the countries with votes by their net votes.
+
+    Must be ran within app context.
+    """
+    net = CountryVoteCount.upvotes - CountryVoteCount.downvotes
+    total = CountryVoteCount.upvotes + CountryVoteCount.downvotes
+    rows = _db.session.execute(
+        _db.select(Country.id, Country.name, CountryVoteCount.upvotes,
+                   CountryVoteCount.downvotes)
+        .join(Country, Country.id == CountryVoteCount.country_id)
+        .where(total > 0)
+        .order_by(net.desc() if descending else net,
+                  total.desc(), Country.name)
+        .limit(limit))
+    return [_summary(*row) for row in rows]
+
+
+def get_leaderboard(descending: bool = True, limit: int = 20) -> list[dict]:
+    """Fetch the countries with the most net up votes, or the most net
+    down votes.
+
+    Must be ran within app context.
+    The ranking is done by the database from the vote counters and is
+    cached until a vote is added or removed. Votes made by other
+    processes are picked up after LEADERBOARD_MAX_AGE seconds of the
+    app config.
+
+    Parameters:
+        descending - True for the most trusted countries first, False
+            for the most distrusted
+        limit - the maximum number of countries to return
+
+    Returns:
+        A list of vote summaries, as returned by get_vote_summaries,
+        with ties ranked by the total number of votes.
+    """
+    key = (descending, limit)
+    max_age = current_app.config.get("LEADERBOARD_MAX_AGE", 0)
+    now = monotonic()
+    cached = _leaderboards.get(key)
+    if cached is not None and (not max_age or now - cached[0] < max_age):
+        return cached[1]
+
+    version = _vote_version
+    leaderboard = _load_leaderboard(descending, limit)
+    with _leaderboard_lock:
+        # Do not cache a ranking that a vote changed while it was loaded.
+        if version == _vote_version:
+            _leaderboards[key] = (now, leaderboard)
+    return leaderboard
+
+
+def rebuild_vote_counts():
+    """Rebuilds every vote counter from the user_votes table.
+
+    Must be ran within app context.
+    Use this to repair the counters if votes were changed without
+    using add_vote and remove_vote.
+
+    Returns:
+        The number of countries that have votes.
+    """
+    upvote = _db.case((UserVote.vote_id == VoteType.UPVOTE.value, 1), else_=0)
+    downvote = _db.case((UserVote.vote_id == VoteType.DOWNVOTE.value, 1),
+                        else_=0)
+    totals = _db.session.execute(
+        _db.select(UserVote.country_id,
+                   _db.func.sum(upvote),
+                   _db.func.sum(downvote))
+        .group_by(UserVote.country_id)).all()
+
+    _db.session.execute(_db.delete(CountryVoteCount))
+    if totals:
+        _db.session.execute(
+            _db.insert(CountryVoteCount),
+            [{"country_id": country_id, "upvotes": upvotes,
+              "downvotes": downvotes}
+             for country_id, upvotes, downvotes in totals])
+    commit()
+    on_commit(votes_changed)
+    return len(totals)
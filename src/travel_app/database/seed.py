@@ -0,0 +1,127 @@
+"""This module loads the bundled csv data into the database.
+
+Each csv file is streamed in batches through bulk inserts, and every
+table is loaded in a single transaction. Tables are loaded in an order
+that respects their foreign keys.
+
+Author(s): Thomas,
+"""
+import csv
+from os import path
+from time import perf_counter
+
+from database.database import (_db, commit, insert_or_ignore, on_commit,
+                               unit_of_work)
+from database.models.advice import Advice
+from database.models.country import (Country, countries_changed,
+                                     invalidate_country_cache, derive_metrics)
+from database.models.countryadvice import CountryAdvice
+
+# Module variables.
+DATA_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+SEED_FILES = (
+    ("advice.csv", Advice),
+    ("countries.csv", Country),
+    ("country_advice.csv", CountryAdvice),
+)
+BATCH_SIZE = 1000
+
+
+def coerce_row(model, row: dict) -> dict:
+    """Converts the strings read from a csv row to the python types of
+    the model's columns.
+
+    Values that already have the right type, such as those read from
+    JSON, are left as they are. Empty strings become None.
+
+    Parameters:
+        model - the model class the row belongs to
+        row - dictionary of column names to strings
+
+    Returns:
+        A dictionary of column names to converted values.
+    """
+    values = {}
+    for column in model.__table__.columns:
+        if column.key not in row:
+            continue
+        value = row[column.key]
+        if value is None or value == "":
+            value = None
+        elif column.type.python_type in (int, float):
+            value = column.type.python_type(value)
+        values[column.key] = value
+
+    # Derived columns are normally filled in by the ORM.
+    if model is Country:
+        values.update(derive_metrics(values))
+    return values
+
+
+def seed_table(model, filename: str, batch_size: int = BATCH_SIZE) -> int:
+    """Inserts every row of a csv file into the table of model.
+
+    Must be ran within app context.
+    The header of the csv file must contain column names of the model.
+    Rows that are already in the table are skipped, so seeding again
+    does nothing. All rows are inserted in a single transaction, or as
+    part of the current unit of work.
+
+    Parameters:
+        model - the model class of the table to fill
+        filename - path to the csv file
+        batch_size - number of rows sent to the database at once
+
+    Returns:
+        The number of rows inserted.
+    """
+    statement = insert_or_ignore(model.__table__)
+    count = _db.select(_db.func.count()).select_from(model.__table__)
+    before = _db.session.execute(count).scalar()
+    with open(filename, newline="", encoding="utf-8") as file:
+        batch = []
+        for row in csv.DictReader(file):
+            batch.append(coerce_row(model, row))
+            if len(batch) >= batch_size:
+                _db.session.execute(statement, batch)
+                batch = []
+        if batch:
+            _db.session.execute(statement, batch)
+    total = _db.session.execute(count).scalar() - before
+    commit()
+    return total
+
+
+def seed_database(directory: str = DATA_DIRECTORY, report=print) -> dict:
+    """Loads all the bundled csv files into the database.
+
+    Must be ran within app context.
+    Rows that are already in the database are skipped, so it is safe
+    to seed more than once. Every table is loaded in one transaction,
+    so nothing is saved if any file fails to load.
+
+    Parameters:
+        directory - the directory containing the csv files
+        report - function called with a progress message for each
+            table, or None for no messages
+
+    Returns:
+        A dictionary mapping table names to the number of rows
+        inserted.
+    """
+    totals = {}
+    with unit_of_work():
+        for filename, model in SEED_FILES:
+            start = perf_counter()
+            rows = seed_table(model, path.join(directory, filename))
+            elapsed = perf_counter() - start
+            totals[model.__tablename__] = rows
+
+            if report:
+                rate = rows / elapsed if elapsed else float("inf")
+                report(f"Seeded {rows} rows into {model.__tablename__} in "
+                       f"{elapsed * 1000:.1f}ms ({rate:.0f} rows/sec)")
+        if totals.get(Country.__tablename__):
+            countries_changed()
+        on_commit(invalidate_country_cache)
+    return totals
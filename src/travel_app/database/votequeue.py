@@ -0,0 +1,204 @@
+"""This module queues votes so they can be written to the database in
+batches, instead of one transaction per vote click.
+
+Votes and vote resets are added to an in-process queue and the request
+returns straight away. Only the latest change to each user's vote for
+a country is kept, so a user clicking several times before a flush
+costs a single write. A background thread writes the queued changes in
+one transaction every VOTE_FLUSH_INTERVAL seconds, or sooner once
+VOTE_FLUSH_BATCH changes are waiting, and the queue is flushed when the
+process exits.
+
+The queue is used by the vote views when VOTE_WRITE_BEHIND is enabled.
+Queued votes are only in the memory of the process, so any votes
+waiting when a process is killed are lost.
+
+Author(s): Thomas,
+"""
+import atexit
+from threading import Event, Lock, Thread
+
+from flask import current_app
+
+from database.database import unit_of_work
+from database.models.uservotes import (VoteType, cast_vote, clear_vote,
+                                       get_vote_type)
+
+# Module variables.
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH = 500
+_lock = Lock()
+_flush_lock = Lock()
+_pending = {}
+_flushing = {}
+_wake = Event()
+_app = None
+_thread = None
+_exit_registered = False
+
+
+def _start(app):
+    """Starts the background flush thread if it is not running.
+
+    The thread is started again in a process forked from one that
+    already started it, such as a gunicorn worker.
+    """
+    global _app
+    global _thread
+    global _exit_registered
+
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _app = app
+        _thread = Thread(target=_run, name="vote-queue", daemon=True)
+        _thread.start()
+        if not _exit_registered:
+            atexit.register(flush_votes_on_exit)
+            _exit_registered = True
+
+
+def _run():
+    """Flushes the queue every interval until the process exits."""
+    while True:
+        _wake.wait(_app.config.get("VOTE_FLUSH_INTERVAL", FLUSH_INTERVAL))
+        _wake.clear()
+        try:
+            with _app.app_context():
+                flush_votes()
+        except Exception:
+            _app.logger.exception("Failed to flush the vote queue")
+
+
+def enqueue_vote(user_id: int, country_id: int, vote_type: VoteType):
+    """Queues a change to the user's vote for the country.
+
+    Must be ran within app context.
+    Replaces any change already queued for the same user and country.
+
+    Parameters:
+        user_id - the id of the user voting
+        country_id - the id of the country being voted for
+        vote_type - the VoteType the vote becomes, or None to remove
+            the vote
+    """
+    assert vote_type is None or isinstance(vote_type, VoteType), (
+        "Expected VoteType or None for vote_type")
+    app = current_app._get_current_object()
+    _start(app)
+    with _lock:
+        _pending[(user_id, country_id)] = vote_type
+        waiting = len(_pending)
+    if waiting >= app.config.get("VOTE_FLUSH_BATCH", FLUSH_BATCH):
+        _wake.set()
+
+
+def get_queued_vote(user_id: int, country_id: int) -> tuple[bool, VoteType]:
+    """Fetch the change queued for the user's vote for the country.
+
+    Returns:
+        A tuple of (queued, vote_type). queued is False if no change is
+        waiting, otherwise vote_type is the VoteType the vote becomes
+        or None if it is being removed.
+    """
+    key = (user_id, country_id)
+    with _lock:
+        # Changes being flushed are not in the database until the
+        # flush commits.
+        for changes in (_pending, _flushing):
+            if key in changes:
+                return True, changes[key]
+    return False, None
+
+
+def get_current_vote(user_id: int, country_id: int) -> VoteType:
+    """Fetch the user's vote for the country including queued changes.
+
+    Must be ran within app context.
+
+    Returns:
+        The VoteType of the vote, or None if there is no vote.
+    """
+    queued, vote_type = get_queued_vote(user_id, country_id)
+    if queued:
+        return vote_type
+    return get_vote_type(user_id, country_id)
+
+
+def _apply(user_id: int, country_id: int, vote_type: VoteType):
+    """Makes the user's vote for the country match vote_type.
+
+    Must be ran within app context.
+    """
+    clear_vote(user_id, country_id)
+    if vote_type is not None:
+        cast_vote(user_id, country_id, vote_type)
+
+
+def flush_votes() -> int:
+    """Writes every queued vote change to the database.
+
+    Must be ran within app context.
+    The changes are written in one transaction. If that fails, for
+    example because a user was removed while their vote was queued,
+    each change is written in its own transaction and the changes that
+    still fail are logged and dropped. Only one flush runs at a time,
+    a flush started during another waits for it to finish.
+
+    Returns:
+        The number of vote changes written.
+    """
+    with _flush_lock:
+        return _flush()
+
+
+def _flush() -> int:
+    """Writes every queued vote change to the database.
+
+    Must be ran within app context, holding _flush_lock.
+    """
+    global _pending
+    global _flushing
+
+    with _lock:
+        batch = _pending
+        _pending = {}
+        _flushing = batch
+    if not batch:
+        return 0
+
+    try:
+        try:
+            with unit_of_work():
+                for (user_id, country_id), vote_type in batch.items():
+                    _apply(user_id, country_id, vote_type)
+            return len(batch)
+        except Exception:
+            # Find the changes that cannot be written.
+            written = 0
+            for (user_id, country_id), vote_type in batch.items():
+                try:
+                    with unit_of_work():
+                        _apply(user_id, country_id, vote_type)
+                    written += 1
+                except Exception:
+                    current_app.logger.exception(
+                        "Dropped queued vote of user %s for country %s",
+                        user_id, country_id)
+            return written
+    finally:
+        with _lock:
+            _flushing = {}
+
+
+def flush_votes_on_exit():
+    """Writes the queued vote changes before the process exits.
+
+    A flush already being written by the background thread is waited
+    for, as the thread is stopped when the process exits.
+    """
+    if _app is not None and (_pending or _flushing):
+        with _app.app_context():
+            flush_votes()
@@ -0,0 +1,156 @@
+"""Module for full text search over country information.
+
+Keeps an in memory inverted index of each country's name, description,
+travel advice and the topics and descriptions of its linked advice.
+Results are ranked with BM25.
+
+The index follows the country catalogue and the country advice
+relationships. When either changes, only the countries whose text
+changed are re-indexed.
+
+Authors: Thomas,
+"""
+import re
+from collections import Counter
+from math import log
+from threading import Lock
+
+from database.models.country import get_catalogue, get_catalogue_version
+from database.models.countryadvice import CountryAdvice, get_advice_version
+from search_index import normalize
+
+# Module variables.
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the "
+    "there these this to was were will with".split())
+_lock = Lock()
+_version = None
+_documents = {}
+_postings = {}
+_total_length = 0
+
+_word = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word: str) -> str:
+    """Removes common English suffixes so that different forms of a
+    word match each other."""
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits the text into the terms used by the index."""
+    return [_stem(word) for word in _word.findall(normalize(text))
+            if word not in STOP_WORDS]
+
+
+def _remove_document(country_id: int):
+    """Removes a country from the index. Must hold _lock."""
+    global _total_length
+
+    document = _documents.pop(country_id, None)
+    if document is None:
+        return
+    for term in document["terms"]:
+        postings = _postings[term]
+        del postings[country_id]
+        if not postings:
+            del _postings[term]
+    _total_length -= document["length"]
+
+
+def _add_document(country_id: int, name: str, text: str):
+    """Adds a country to the index. Must hold _lock."""
+    global _total_length
+
+    terms = Counter(tokenize(text))
+    _documents[country_id] = {
+        "name": name,
+        "text": text,
+        "terms": terms,
+        "length": sum(terms.values()),
+    }
+    for term, count in terms.items():
+        _postings.setdefault(term, {})[country_id] = count
+    _total_length += _documents[country_id]["length"]
+
+
+def _refresh():
+    """Brings the index up to date with the database.
+
+    Must be ran within app context.
+    """
+    global _version
+
+    version = (get_catalogue_version(), get_advice_version())
+    if version == _version:
+        return
+
+    advice = {}
+    for link in CountryAdvice.query:
+        advice.setdefault(link.country_id, []).append(
+            f"{link.advice.topic} {link.advice.description}")
+
+    texts = {}
+    for country in get_catalogue():
+        texts[country["id"]] = (country["name"], " ".join([
+            country["name"], country["description"],
+            country["travel_advice"], *advice.get(country["id"], [])]))
+
+    with _lock:
+        for country_id in set(_documents) - set(texts):
+            _remove_document(country_id)
+        for country_id, (name, text) in texts.items():
+            document = _documents.get(country_id)
+            if document is None or document["text"] != text:
+                _remove_document(country_id)
+                _add_document(country_id, name, text)
+        _version = version
+
+
+def search(query: str, offset: int = 0, limit: int = 10):
+    """Searches the country information for the query.
+
+    Must be ran within app context.
+
+    Parameters:
+        query - the words to search for
+        offset - the number of results to skip
+        limit - the maximum number of results to return
+
+    Returns:
+        A tuple of the total number of matching countries and a list
+        of (country id, country name, score) tuples, best match first.
+    """
+    _refresh()
+    terms = set(tokenize(query))
+
+    with _lock:
+        count = len(_documents)
+        if not count or not terms:
+            return 0, []
+        average_length = _total_length / count
+
+        scores = {}
+        for term in terms:
+            postings = _postings.get(term)
+            if not postings:
+                continue
+            idf = log(1 + (count - len(postings) + 0.5)
+                      / (len(postings) + 0.5))
+            for country_id, frequency in postings.items():
+                length = _documents[country_id]["length"]
+                scores[country_id] = scores.get(country_id, 0.0) + idf * (
+                    frequency * (BM25_K1 + 1)
+                    / (frequency + BM25_K1 * (1 - BM25_B + BM25_B
+                                              * length / average_length)))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        results = [(country_id, _documents[country_id]["name"], score)
+                   for country_id, score in ranked[offset:offset + limit]]
+    return len(ranked), results
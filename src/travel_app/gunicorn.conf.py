@@ -0,0 +1,58 @@
+"""Gunicorn settings for serving the app in production.
+
+Every setting can be changed with the environment variables below, see
+the README for how to tune them.
+
+Authors: Thomas,
+"""
+from multiprocessing import cpu_count
+from os import getenv
+
+bind = getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Processes handle requests in parallel across cores, threads let each
+# process keep serving while requests wait on the database or bcrypt.
+# One worker per core, as password hashing keeps the cores busy.
+workers = int(getenv("GUNICORN_WORKERS", cpu_count()))
+threads = int(getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# Load the app once in the master process so the templates, static
+# manifest and python modules are shared between workers.
+preload_app = getenv("GUNICORN_PRELOAD", "True") == "True"
+
+timeout = int(getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(getenv("GUNICORN_KEEPALIVE", 5))
+
+# Restart workers now and then to limit the effect of memory leaks.
+max_requests = int(getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = getenv("GUNICORN_ERROR_LOG", "-")
+
+
+def post_fork(server, worker):
+    """Gives each worker its own database connections and password
+    hashing threads, rather than those of the master process.
+
+    Unless BCRYPT_WORKERS is set, the cores are shared out between the
+    workers' hashing threads.
+    """
+    from database.database import dispose_engines
+    from database.models.user import configure_password_hashing
+    from wsgi import app
+
+    dispose_engines(app, close=False)
+    configure_password_hashing(
+        app.config["BCRYPT_ROUNDS"],
+        app.config["BCRYPT_WORKERS"]
+        or max(1, cpu_count() // server.cfg.workers))
+
+
+def worker_exit(server, worker):
+    """Writes any queued votes before the worker stops."""
+    from database.votequeue import flush_votes_on_exit
+
+    flush_votes_on_exit()
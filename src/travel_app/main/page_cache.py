@@ -0,0 +1,116 @@
+"""Module for caching rendered pages.
+
+Pages are stored under a key made from everything the page depends on
+(for example the build version, the country id, the row version and
+the vote counts), so a page never has to be removed from the cache when
+the data changes. Old pages simply stop being used and are evicted when
+the cache is full.
+
+The build version is a hash of the templates and the asset manifest,
+so pages and their ETags change when a deploy changes how they are
+rendered.
+
+Each page is compressed once for each content encoding it is requested
+in, and the compressed bodies are cached alongside the page.
+
+Authors: Thomas,
+"""
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+
+from assets import manifest_version
+from compression import compress
+
+# Module variables.
+PAGE_CACHE_SIZE = 512
+_pages = OrderedDict()
+_lock = Lock()
+
+
+def build_version(app) -> str:
+    """Creates a hash of the app's templates and asset manifest.
+
+    Parameters:
+        app - the flask app, with its assets set up
+
+    Returns the hash as a string.
+    """
+    digest = sha1(manifest_version().encode("utf-8"))
+    loader = app.jinja_env.loader
+    for name in sorted(loader.list_templates()):
+        source = loader.get_source(app.jinja_env, name)[0]
+        digest.update(name.encode("utf-8"))
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def init_page_cache(app):
+    """Sets the BUILD_VERSION of the app config used in page keys.
+
+    A BUILD_VERSION already in the config, such as a release tag, is
+    kept.
+
+    Parameters:
+        app - the flask app
+    """
+    app.config.setdefault("BUILD_VERSION", build_version(app))
+
+
+def make_etag(key: tuple, encoding: str = "identity") -> str:
+    """Creates a strong ETag for the page with the given key.
+
+    Each content encoding has different bytes, so each gets its own
+    ETag.
+    """
+    etag = sha1(repr(key).encode("utf-8")).hexdigest()
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+def get_page(key: tuple, encoding: str = "identity"):
+    """Fetch a rendered page from the cache.
+
+    The page is compressed the first time it is fetched in a content
+    encoding, and the compressed body is cached with it.
+
+    Parameters:
+        key - tuple of the values the page depends on
+        encoding - the content encoding of the body, such as gzip
+
+    Returns the body of the page as bytes if it is cached, otherwise
+    None.
+    """
+    with _lock:
+        variants = _pages.get(key)
+        if variants is None:
+            return None
+        _pages.move_to_end(key)
+        body = variants.get(encoding)
+    if body is None:
+        body = compress(variants["identity"], encoding)
+        with _lock:
+            variants[encoding] = body
+    return body
+
+
+def store_page(key: tuple, page: str):
+    """Adds a rendered page to the cache.
+
+    The least recently used page is evicted if the cache holds more
+    than PAGE_CACHE_SIZE pages.
+
+    Parameters:
+        key - tuple of the values the page depends on
+        page - the rendered page
+    """
+    with _lock:
+        _pages[key] = {"identity": page.encode("utf-8")}
+        _pages.move_to_end(key)
+        while len(_pages) > PAGE_CACHE_SIZE:
+            _pages.popitem(last=False)
+
+
+def clear_pages():
+    """Removes every page from the cache."""
+    with _lock:
+        _pages.clear()
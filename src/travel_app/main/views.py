@@ -1,12 +1,18 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from users.forms import *
 from database.database import get_database
-from database.models.country import get_country_by_name
+from database.models.country import (get_country_by_name, get_country_by_id,
+                                     edit_country)
 from database.models import uservotes as uv
 from database.models import user as u
-from flask import Blueprint, render_template, abort, flash, redirect, url_for, request, get_flashed_messages
+from database import votequeue as vq
+from flask import Blueprint, current_app, render_template, abort, flash, redirect, url_for, request, get_flashed_messages, make_response, session, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from session import role_required
+from main.page_cache import get_page, store_page, make_etag
+from compression import available_encodings, choose_encoding
+import search_index
+import fulltext
 
 main_blueprint = Blueprint('main', __name__, template_folder='templates')
 map_blueprint = Blueprint('map', __name__, template_folder='templates')
@@ -16,9 +22,6 @@ search_blueprint = Blueprint('search', __name__, template_folder='templates')
 login_blueprint = Blueprint('login', __name__, template_folder='templates')
 register_blueprint = Blueprint('register', __name__, template_folder='templates')
 
-isSearch = True
-country = None
-
 @main_blueprint.route('/')
 def index():
     return render_template('main/homepage.html')
@@ -33,68 +36,93 @@ def map():
 @login_required
 @role_required('admin')
 def admin():
-    global isSearch
-    global country
-
+    """ Search for a country and edit its information.
+        The country being edited is identified by hidden fields in the edit form,
+        so any worker can handle each step. If someone else saved the country
+        after the form was loaded, the edit is refused and the form is shown again.
+    """
     search_form = SearchForm()
     country_form = CountryForm()
 
-    # Render the search form if in search mode.
-    if isSearch:
-        # Search for the country.
-        if search_form.validate_on_submit():
-            country = get_country_by_name(search_form.search.data.lower())
-
-            # If no country was found, render search bar.
-            if not country:
-                return render_template(
-                    'main/admin.html',
-                    search_form=search_form,
-                    country_form=None
-                )
-
-            isSearch = False
-            country_form.name.data = country.name
-            country_form.description.data = country.description
-            country_form.travel_advice.data = country.travel_advice
-            country_form.crime_index.data = country.crime_index
-            country_form.disaster_risk.data = country.disaster_risk
-            country_form.corruption_index.data = country.corruption_index
-            country_form.health.data = country.health
-
+    # Save the edited country.
+    if 'country_id' in request.form:
+        if not country_form.validate_on_submit():
             return render_template(
                 "main/admin.html",
                 search_form=None,
                 country_form=country_form)
+
+        try:
+            country = edit_country(
+                int(country_form.country_id.data),
+                int(country_form.version.data),
+                {
+                    'name': country_form.name.data,
+                    'description': country_form.description.data,
+                    'travel_advice': country_form.travel_advice.data,
+                    'crime_index': country_form.crime_index.data,
+                    'disaster_risk': country_form.disaster_risk.data,
+                    'corruption_index': country_form.corruption_index.data,
+                    'health': country_form.health.data,
+                })
+        except RuntimeError:
+            # Keep the admin's changes, but base them on the latest version
+            # so submitting again overwrites the other edit.
+            latest = get_country_by_id(int(country_form.country_id.data))
+            if latest is not None:
+                get_database().session.refresh(latest)
+                country_form.version.data = latest.version
+                flash(f'{latest.name} was changed by someone else while you were editing. '
+                      'Submit again to overwrite their changes.', 'warning')
+                return render_template(
+                    "main/admin.html",
+                    search_form=None,
+                    country_form=country_form)
+            country = None
+
+        if country is None:
+            flash('The country no longer exists.', 'error')
         else:
+            flash(f'Saved changes to {country.name}.', 'success')
+        return render_template(
+            "main/admin.html",
+            search_form=SearchForm(formdata=None),
+            country_form=None)
+
+    # Search for the country.
+    if search_form.validate_on_submit():
+        country = get_country_by_name(search_index.find(search_form.search.data) or search_form.search.data)
+
+        # If no country was found, render search bar.
+        if not country:
             return render_template(
                 'main/admin.html',
                 search_form=search_form,
-                country_form=None)
+                country_form=None
+            )
 
-    # If in edit mode.
-    else:
-        if country_form.validate_on_submit():
-            country.name = country_form.name.data,
-            country.description = country_form.description.data,
-            country.travel_advice = country_form.travel_advice.data,
-            country.crime_index = country_form.crime_index.data,
-            country.disaster_risk = country_form.disaster_risk.data,
-            country.corruption_index = country_form.corruption_index.data,
-            country.health = country_form.health.data
-            get_database().session.merge(country)
-            get_database().session.commit()
-            isSearch = True
+        # The cached copy may be older than the database, so reload it
+        # before taking its version.
+        get_database().session.refresh(country)
+        country_form.country_id.data = country.id
+        country_form.version.data = country.version
+        country_form.name.data = country.name
+        country_form.description.data = country.description
+        country_form.travel_advice.data = country.travel_advice
+        country_form.crime_index.data = country.crime_index
+        country_form.disaster_risk.data = country.disaster_risk
+        country_form.corruption_index.data = country.corruption_index
+        country_form.health.data = country.health
 
-            return render_template(
-                "main/admin.html",
-                search_form=search_form,
-                country_form=None)
-        else:
-            return render_template(
-                "main/admin.html",
-                search_form=None,
-                country_form=country_form)
+        return render_template(
+            "main/admin.html",
+            search_form=None,
+            country_form=country_form)
+
+    return render_template(
+        'main/admin.html',
+        search_form=search_form,
+        country_form=None)
 
                 
 @admin_blueprint.route('/country')
@@ -110,25 +138,90 @@ def search():
     """
     form = SearchForm()
     if form.validate_on_submit():
-        country = get_country_by_name(form.search.data.lower())
+        country = get_country_by_name(search_index.find(form.search.data) or form.search.data)
         if country is not None:
             return redirect(f"/country/{country.name}")
-        flash(f'Country "{form.search.data}" not found. Please try again.', 'warning')
+        suggestions = search_index.suggest(form.search.data, limit=3)
+        if suggestions:
+            flash(f'Country "{form.search.data}" not found. Did you mean {", ".join(suggestions)}?', 'warning')
+        else:
+            flash(f'Country "{form.search.data}" not found. Please try again.', 'warning')
     return render_template('main/search.html', form=form)
 
 
+@country_blueprint.route('/search/suggest')
+def suggest():
+    """ Typeahead for the search bar.
+        Returns the country names starting with the query parameter q, and the closest
+        names allowing for typos, as JSON.
+    """
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify(query=query,
+                   completions=search_index.complete(query, limit),
+                   suggestions=search_index.suggest(query, limit))
+
+
+@country_blueprint.route('/search/text')
+def search_text():
+    """ Full text search over the country information and advice.
+        Returns a page of countries ranked by relevance to the query parameter q as
+        JSON. Use the page and per_page parameters to page through the results.
+    """
+    query = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    total, results = fulltext.search(query, (page - 1) * per_page, per_page)
+    return jsonify(query=query,
+                   page=page,
+                   per_page=per_page,
+                   total=total,
+                   results=[{'id': country_id, 'name': name, 'score': round(score, 4)}
+                            for country_id, name, score in results])
+
+
 @country_blueprint.route('/country/<country_name>')
 def show_country(country_name):
+    """ Show the information page for a country.
+        The rendered page is cached under a key of everything it depends on, which
+        is also used as the ETag so unchanged pages can be answered with a 304.
+        Cached pages are served compressed from the cache, rather than compressed
+        again on every request. Pages with flashed messages are always rendered
+        and never cached.
+    """
     country = get_country_by_name(country_name)
     if country:
-        upvotes = len(uv.get_votes(country, uv.VoteType.UPVOTE))
-        downvotes = len(uv.get_votes(country, uv.VoteType.DOWNVOTE))
-        total_index = round((country.corruption_index + country.crime_index + country.health + country.disaster_risk) / 4, 4)
-        return render_template('main/country.html',
-                               **vars(country),
-                               upvotes=upvotes,
-                               downvotes=downvotes,
-                               total_index= total_index)
+        upvotes, downvotes = uv.get_vote_counts(country)
+        # The row version is shared by every worker, unlike the catalogue version.
+        # The build version changes when a deploy changes templates or assets.
+        key = (current_app.config['BUILD_VERSION'], country.id, country.version,
+               upvotes, downvotes, current_user.is_authenticated)
+        if '_flashes' in session:
+            return render_template('main/country.html',
+                                   **vars(country),
+                                   upvotes=upvotes,
+                                   downvotes=downvotes)
+
+        encoding = choose_encoding(request, available_encodings())
+        etag = make_etag(key, encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            body = get_page(key, encoding)
+            if body is None:
+                store_page(key, render_template('main/country.html',
+                                                **vars(country),
+                                                upvotes=upvotes,
+                                                downvotes=downvotes))
+                body = get_page(key, encoding)
+            response = make_response(body)
+            if encoding != 'identity':
+                response.content_encoding = encoding
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.update(('Cookie', 'Accept-Encoding'))
+        return response
     abort(404)
 
 
@@ -138,8 +231,9 @@ def login():
     if form.validate_on_submit():
         username = form.username.data
         password = form.password.data
-        if u.validate_user(username, password):
-            login_user(u.get_user_by_name(username))
+        user = u.validate_user(username, password)
+        if user:
+            login_user(user)
             flash(f'Logged in successfully.', 'success')
             return redirect(url_for('main.index'))
         else:
@@ -177,6 +271,25 @@ def logout():
     return redirect(url_for('main.index'))
 
 
+def change_vote(country, vote_type):
+    """ Set or remove (vote_type None) the current user's vote for the country.
+        Returns False if the user has already voted, or has no vote to remove.
+        With VOTE_WRITE_BEHIND the change is queued and written in the background.
+    """
+    if not current_app.config.get('VOTE_WRITE_BEHIND'):
+        if vote_type is None:
+            return uv.clear_vote(current_user.id, country.id)
+        return uv.cast_vote(current_user.id, country.id, vote_type)
+
+    current = vq.get_current_vote(current_user.id, country.id)
+    if vote_type is None and current is None:
+        return False
+    if vote_type is not None and current is not None:
+        return False
+    vq.enqueue_vote(current_user.id, country.id, vote_type)
+    return True
+
+
 @main_blueprint.route('/upvote', methods=['GET', 'POST'])
 @login_required
 def upvote():
@@ -184,13 +297,7 @@ def upvote():
     print(country_name)
     country = get_country_by_name(country_name)
     if country:
-        user = u.get_user_by_name(current_user.username)
-        if uv.get_user_vote(user, country) == None:
-            new_vote = uv.UserVote()
-            new_vote.country_id = country.id
-            new_vote.user_id = current_user.id
-            new_vote.vote_id = uv.VoteType.UPVOTE.value
-            uv.add_vote(new_vote)
+        if change_vote(country, uv.VoteType.UPVOTE):
             flash(f"You have upvoted {country_name.capitalize()}'s information.", 'success')
             return redirect("/country/%s" % country_name)
         else:
@@ -207,13 +314,7 @@ def downvote():
     print(country_name)
     country = get_country_by_name(country_name)
     if country:
-        user = u.get_user_by_name(current_user.username)
-        if uv.get_user_vote(user, country) == None:
-            new_vote = uv.UserVote()
-            new_vote.country_id = country.id
-            new_vote.user_id = current_user.id
-            new_vote.vote_id = uv.VoteType.DOWNVOTE.value
-            uv.add_vote(new_vote)
+        if change_vote(country, uv.VoteType.DOWNVOTE):
             flash(f"You have downvoted {country_name.capitalize()}'s information.", 'success')
             return redirect("/country/%s" % country_name)
         else:
@@ -230,10 +331,7 @@ def reset_vote():
     print(country_name)
     country = get_country_by_name(country_name)
     if country:
-        user = u.get_user_by_name(current_user.username)
-        vote = uv.get_user_vote(user, country)
-        if vote != None:
-            uv.remove_vote(vote)
+        if change_vote(country, None):
             flash(f'You have removed your vote for {country_name.capitalize()}.', 'success')
             return redirect("/country/%s" % country_name)
         else:
@@ -0,0 +1,172 @@
+"""Module for searching country names.
+
+Keeps an in memory index of every country name that supports prefix
+completion and typo tolerant suggestions. Names are matched without
+case or accents, so "cote d'ivoire" finds "Côte d'Ivoire".
+
+The index follows the country catalogue. Whenever the catalogue
+version changes only the names that were added or removed are updated.
+
+Authors: Thomas,
+"""
+from bisect import bisect_left, insort
+from threading import Lock
+from unicodedata import combining, normalize as unicode_normalize
+
+from database.models.country import all_country_names, get_catalogue_version
+
+# Module variables.
+_lock = Lock()
+_version = None
+_names = {}
+_sorted = []
+_trigrams = {}
+
+
+def normalize(text: str) -> str:
+    """Removes accents, case and extra whitespace from the text."""
+    decomposed = unicode_normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def _trigrams_of(text: str) -> set:
+    """Get the set of three character sequences in the text."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Get the Levenshtein distance between a and b.
+
+    Stops early and returns limit + 1 once the distance is known to be
+    greater than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def add_name(name: str):
+    """Adds a country name to the index."""
+    key = normalize(name)
+    with _lock:
+        if key in _names:
+            return
+        _names[key] = name
+        insort(_sorted, key)
+        for trigram in _trigrams_of(key):
+            _trigrams.setdefault(trigram, set()).add(key)
+
+
+def remove_name(name: str):
+    """Removes a country name from the index."""
+    key = normalize(name)
+    with _lock:
+        if _names.pop(key, None) is None:
+            return
+        del _sorted[bisect_left(_sorted, key)]
+        for trigram in _trigrams_of(key):
+            _trigrams[trigram].discard(key)
+
+
+def _refresh():
+    """Brings the index up to date with the country catalogue.
+
+    Must be ran within app context.
+    """
+    global _version
+
+    version = get_catalogue_version()
+    if version == _version:
+        return
+    names = {normalize(name): name for name in all_country_names()}
+    for key in set(_names) - set(names):
+        remove_name(_names[key])
+    for key in set(names) - set(_names):
+        add_name(names[key])
+    _version = version
+
+
+def find(query: str):
+    """Find the country name matching the query, ignoring case and
+    accents.
+
+    Must be ran within app context.
+
+    Returns the country name, or None if there is no exact match.
+    """
+    _refresh()
+    return _names.get(normalize(query))
+
+
+def complete(prefix: str, limit: int = 10) -> list[str]:
+    """Find the country names starting with prefix.
+
+    Must be ran within app context.
+
+    Parameters:
+        prefix - the start of a country name
+        limit - the maximum number of names to return
+
+    Returns a list of country names in alphabetical order.
+    """
+    _refresh()
+    key = normalize(prefix)
+    if not key:
+        return []
+    results = []
+    with _lock:
+        for name in _sorted[bisect_left(_sorted, key):]:
+            if not name.startswith(key) or len(results) >= limit:
+                break
+            results.append(_names[name])
+    return results
+
+
+def suggest(query: str, limit: int = 5, max_distance: int = None) -> list[str]:
+    """Find the country names closest to the query, allowing for
+    typos.
+
+    Must be ran within app context.
+    Names sharing three letter sequences with the query are compared
+    by edit distance.
+
+    Parameters:
+        query - the text that was searched for
+        limit - the maximum number of names to return
+        max_distance - the largest edit distance allowed, defaults to
+            a third of the query length (at least 1)
+
+    Returns a list of country names, closest first.
+    """
+    _refresh()
+    key = normalize(query)
+    if not key:
+        return []
+    if max_distance is None:
+        max_distance = max(1, len(key) // 3)
+
+    with _lock:
+        counts = {}
+        for trigram in _trigrams_of(key):
+            for name in _trigrams.get(trigram, ()):
+                counts[name] = counts.get(name, 0) + 1
+
+        scored = []
+        for name in counts:
+            distance = _edit_distance(key, name, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -counts[name], name))
+        scored.sort()
+        return [_names[name] for _, _, name in scored[:limit]]
@@ -7,7 +7,7 @@ from functools import wraps
 from flask_login import current_user
 from flask_login import LoginManager
 from flask import abort, flash, redirect, url_for
-from database.models.user import User
+from database.models.user import get_user_by_id
 
 
 def role_required(*roles):
@@ -44,4 +44,4 @@ login_manager.login_view = "login.login"
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    return get_user_by_id(int(user_id))
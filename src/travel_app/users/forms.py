@@ -6,6 +6,7 @@ from flask_wtf import FlaskForm
 from werkzeug.routing import ValidationError
 from wtforms import *
 from wtforms.validators import *
+from flask_wtf.file import FileField, FileRequired
 
 
 password_criteria = (
@@ -85,7 +86,13 @@ class SearchForm(FlaskForm):
     submit = SubmitField()
 
 class CountryForm(FlaskForm):
-    """Country form for editting country information."""
+    """Country form for editting country information.
+
+    The id and version of the country being edited are carried in
+    hidden fields, so the edit does not depend on server side state.
+    """
+    country_id = HiddenField(validators=[DataRequired()])
+    version = HiddenField(validators=[DataRequired()])
     name = StringField(validators=[DataRequired()])
     description = TextAreaField(validators=[DataRequired()])
     travel_advice = TextAreaField(validators=[DataRequired()])
@@ -94,3 +101,13 @@ class CountryForm(FlaskForm):
     corruption_index = FloatField(validators=[DataRequired()])
     health = FloatField(validators=[DataRequired()])
     submit = SubmitField()
+
+
+class BulkImportForm(FlaskForm):
+    """Form for uploading a csv or JSON lines file of a whole table."""
+    table = SelectField(choices=[("countries", "Countries"),
+                                 ("advice", "Advice"),
+                                 ("country_advice", "Country advice")])
+    file = FileField(validators=[FileRequired()])
+    dry_run = BooleanField()
+    submit = SubmitField()
@@ -0,0 +1,10 @@
+"""Production entry point for the app.
+
+Run from this directory with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Authors: Thomas,
+"""
+from app import create_app
+
+app = create_app()
@@ -64,6 +64,40 @@ def test_add_adivce_existing():
         raise AssertionError("Added 2 advice with the same topic")
 
 
+def test_add_advice_existing_error():
+    """Test to determine if the add_advice function raises RuntimeError
+    for a duplicate topic and leaves the session usable.
+    """
+    with app.app_context():
+        advice = Advice(topic="test", description="test description")
+        add_advice(advice)
+        try:
+            add_advice(Advice(topic="test", description="duplicate"))
+            raise AssertionError("Added 2 advice with the same topic")
+        except RuntimeError:
+            pass
+        assert get_advice_by_topic("test").description == "test description", (
+            "Changed the existing advice")
+        remove_advice(get_advice_by_topic("test"))
+
+
+def test_advice_topic_unique():
+    """Test to determine if the database itself refuses two advice with
+    the same topic.
+    """
+    from sqlalchemy.exc import IntegrityError
+    with app.app_context():
+        db.session.add(Advice(topic="test_unique", description="first"))
+        db.session.add(Advice(topic="test_unique", description="second"))
+        try:
+            db.session.commit()
+            raise AssertionError("Database accepted a duplicate topic")
+        except IntegrityError:
+            db.session.rollback()
+        assert get_advice_by_topic("test_unique") == None, (
+            "Saved part of the duplicate advice")
+
+
 def test_add_advice_wrong():
     """Test to determine if the add_advice function adds advice that is
     of the wrong type.
@@ -0,0 +1,206 @@
+"""Test module for the JSON API.
+
+Author(s): Thomas,
+"""
+import gzip
+import json
+
+from app import create_app
+from database.database import get_database
+
+api_app = create_app({"SECRET_KEY": "test", "CATALOGUE_CHECK_INTERVAL": 0,
+                      "SQLALCHEMY_ECHO": False})
+db = get_database()
+
+# Load modules after database loading
+from database.models.country import (Country, add_country, edit_country,
+                                     get_country_by_name,
+                                     invalidate_country_cache)
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    print("Setting up api_test module...")
+
+    # The caches are shared with the apps of other test modules.
+    invalidate_country_cache()
+    with api_app.app_context():
+        for i, value in enumerate((0.1, 0.3, 0.5, 0.7, 0.9)):
+            add_country(Country(name=f"api_country{i}",
+                                description="Country for api test",
+                                travel_advice="None", crime_index=value,
+                                disaster_risk=value, corruption_index=value,
+                                health=value))
+    print("api_test module setup complete.")
+
+
+def teardown_module():
+    """Clears the caches filled by the tests."""
+    invalidate_country_cache()
+
+
+def test_map_data():
+    """A test to determine if the map payload lists every country."""
+    response = api_app.test_client().get("/api/v1/map")
+    assert response.status_code == 200, "Failed to get the map"
+    payload = response.get_json()
+    assert payload["fields"] == ["id", "name", "total_index", "total_band"], (
+        "Wrong fields")
+    names = [country[1] for country in payload["countries"]]
+    assert names == [f"api_country{i}" for i in range(5)], "Wrong countries"
+
+
+def test_map_data_etags():
+    """A test to determine if each encoding of the map has its own ETag
+    and the same content."""
+    client = api_app.test_client()
+    identity = client.get("/api/v1/map", headers={"Accept-Encoding": ""})
+    compressed = client.get("/api/v1/map", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip", "Not compressed"
+    assert json.loads(gzip.decompress(compressed.data)) == identity.get_json(), (
+        "Wrong compressed content")
+
+    identity_etag, identity_weak = identity.get_etag()
+    gzip_etag, gzip_weak = compressed.get_etag()
+    assert identity_etag != gzip_etag, "Encodings share an ETag"
+    assert not identity_weak and not gzip_weak, "ETags are weak"
+
+
+def test_map_data_not_modified():
+    """A test to determine if the map is answered with 304 only for the
+    ETag of the requested encoding."""
+    client = api_app.test_client()
+    headers = {"Accept-Encoding": "gzip"}
+    etag, _ = client.get("/api/v1/map", headers=headers).get_etag()
+
+    response = client.get("/api/v1/map", headers=dict(
+        headers, **{"If-None-Match": f'"{etag}"'}))
+    assert response.status_code == 304, "Failed to answer with 304"
+    response = client.get("/api/v1/map", headers={
+        "Accept-Encoding": "", "If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200, "Answered another encoding with 304"
+
+
+def test_map_data_changed():
+    """A test to determine if the map is rebuilt when a country is
+    added."""
+    client = api_app.test_client()
+    etag, _ = client.get("/api/v1/map").get_etag()
+    with api_app.app_context():
+        add_country(Country(name="api_country_new", description="New",
+                            travel_advice="None", crime_index=0.5,
+                            disaster_risk=0.5, corruption_index=0.5,
+                            health=0.5))
+    response = client.get("/api/v1/map", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200, "Answered a changed map with 304"
+    assert "api_country_new" in [country[1] for country in
+                                 response.get_json()["countries"]], (
+        "Missing the new country")
+
+
+def test_list_countries_fields():
+    """A test to determine if only the requested fields are returned,
+    always including the id."""
+    response = api_app.test_client().get(
+        "/api/v1/countries?fields=name,crime_index,votes,advice")
+    assert response.status_code == 200, "Failed to list countries"
+    country = response.get_json()["data"][0]
+    assert set(country) == {"id", "name", "crime_index", "votes", "advice"}, (
+        "Wrong fields")
+    assert country["votes"]["upvotes"] == 0, "Wrong votes"
+    assert country["advice"] == [], "Wrong advice"
+
+
+def test_list_countries_names():
+    """A test to determine if several countries can be fetched by name
+    in one request."""
+    response = api_app.test_client().get(
+        "/api/v1/countries?names=API_Country1, api_country3&fields=name")
+    names = [country["name"] for country in response.get_json()["data"]]
+    assert names == ["api_country1", "api_country3"], "Wrong countries"
+
+
+def test_list_countries_range():
+    """A test to determine if countries are filtered by index ranges."""
+    response = api_app.test_client().get(
+        "/api/v1/countries?crime_index_min=0.3&crime_index_max=0.7"
+        "&names=api_country0,api_country1,api_country2,api_country3,api_country4")
+    values = [country["crime_index"] for country in response.get_json()["data"]]
+    assert values == [0.3, 0.5, 0.7], "Wrong countries in range"
+
+
+def test_list_countries_pages():
+    """A test to determine if following the next cursor visits every
+    country once and ends on the last page."""
+    client = api_app.test_client()
+    with api_app.app_context():
+        expected = db.session.execute(
+            db.select(Country.id).order_by(Country.id)).scalars().all()
+
+    ids = []
+    url = "/api/v1/countries?limit=2&fields=id"
+    while True:
+        page = client.get(url).get_json()
+        assert len(page["data"]) <= 2, "Page is larger than the limit"
+        ids += [country["id"] for country in page["data"]]
+        if page["next"] is None:
+            break
+        assert page["next"] == ids[-1], "Cursor is not the last id"
+        url = f"/api/v1/countries?limit=2&fields=id&after={page['next']}"
+    assert ids == expected, "Pages skipped or repeated countries"
+
+    last = client.get(f"/api/v1/countries?after={expected[-1]}").get_json()
+    assert last == {"data": [], "next": None}, "Wrong page after the last"
+
+
+def test_list_countries_errors():
+    """A test to determine if bad parameters are answered with JSON
+    errors."""
+    client = api_app.test_client()
+    for url in ("/api/v1/countries?fields=password",
+                "/api/v1/countries?limit=0",
+                "/api/v1/countries?limit=201"):
+        response = client.get(url)
+        assert response.status_code == 400, f"Accepted {url}"
+        error = response.get_json()
+        assert error["error"] == "Bad Request" and error["message"], (
+            f"Wrong error body for {url}")
+    assert "password" in client.get(
+        "/api/v1/countries?fields=password").get_json()["message"], (
+        "Failed to name the unknown field")
+
+
+def test_show_country():
+    """A test to determine if a single country is fetched by name, and
+    unknown countries give a JSON 404."""
+    client = api_app.test_client()
+    response = client.get("/api/v1/countries/API_COUNTRY2?fields=name")
+    assert response.status_code == 200, "Failed to find the country"
+    assert response.get_json()["data"]["name"] == "api_country2", (
+        "Found the wrong country")
+
+    response = client.get("/api/v1/countries/no_such_country")
+    assert response.status_code == 404, "Found a country that doesn't exist"
+    assert response.get_json()["error"] == "Not Found", "Wrong error body"
+
+
+def test_names_case_insensitive():
+    """A test to determine if countries stored with capital letters are
+    found by name in any case."""
+    client = api_app.test_client()
+    with api_app.app_context():
+        country = get_country_by_name("api_country4")
+        edit_country(country.id, country.version, {"name": "API_Country4"})
+    try:
+        response = client.get("/api/v1/countries/api_country4?fields=name")
+        assert response.status_code == 200, "Failed to find the country"
+        assert response.get_json()["data"]["name"] == "API_Country4", (
+            "Found the wrong country")
+        response = client.get(
+            "/api/v1/countries?names=api_COUNTRY4,api_country0&fields=name")
+        names = [country["name"] for country in response.get_json()["data"]]
+        assert names == ["api_country0", "API_Country4"], "Wrong countries"
+    finally:
+        with api_app.app_context():
+            country = get_country_by_name("api_country4")
+            edit_country(country.id, country.version, {"name": "api_country4"})
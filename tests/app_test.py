@@ -0,0 +1,38 @@
+"""Test module for the app factory.
+
+Author(s): Thomas,
+"""
+from app import create_app
+from database.database import dispose_engines
+
+factory_app = create_app({"SECRET_KEY": "test", "CATALOGUE_CHECK_INTERVAL": 0})
+
+
+def test_create_app_config():
+    """A test to determine if the create_app function uses the given
+    config over the environment."""
+    assert factory_app.config["SECRET_KEY"] == "test", "Ignored given config"
+    assert factory_app.config["CATALOGUE_CHECK_INTERVAL"] == 0, (
+        "Ignored given config")
+
+
+def test_create_app_routes():
+    """A test to determine if the app created by create_app serves
+    pages."""
+    response = factory_app.test_client().get("/")
+    assert response.status_code == 200, "Failed to serve the homepage"
+
+
+def test_create_app_commands():
+    """A test to determine if the cli commands are added to the app."""
+    for command in ("seed", "recompute-metrics", "rebuild-votes"):
+        assert command in factory_app.cli.commands, f"Missing {command} command"
+
+
+def test_dispose_engines_memory():
+    """A test to determine if the dispose_engines function keeps in
+    memory databases."""
+    from database.models.advice import Advice
+    with factory_app.app_context():
+        dispose_engines(factory_app)
+        assert Advice.query.count() == 0, "Lost the in memory database"
@@ -0,0 +1,130 @@
+"""Test module for the static asset pipeline and response compression.
+
+Author(s): Thomas,
+"""
+import gzip
+from os import path
+
+from flask import Flask, render_template_string
+
+import assets
+from assets import *
+
+static_folder = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                          "src", "travel_app", "static")
+app = Flask(__name__, static_folder=static_folder)
+init_assets(app)
+
+
+@app.route("/page")
+def page():
+    response = app.response_class("travel " * 200, mimetype="text/html")
+    response.set_etag("page")
+    return response
+
+
+@app.route("/small")
+def small():
+    return "travel"
+
+
+def test_asset_url_fingerprinted():
+    """A test to determine if asset_url adds a content hash to the
+    filename.
+    """
+    with app.test_request_context():
+        url = asset_url("css/base.css")
+    assert url.startswith("/assets/css/base."), "Failed to fingerprint url"
+    assert url.endswith(".css"), "Lost the file extension"
+
+
+def test_asset_url_unknown():
+    """A test to determine if asset_url falls back to the static url for
+    files that are not in the manifest.
+    """
+    with app.test_request_context():
+        url = asset_url("no_such_file.css")
+    assert url == "/static/no_such_file.css", "Failed to fall back"
+
+
+def test_asset_url_template():
+    """A test to determine if asset_url can be used in templates."""
+    with app.test_request_context():
+        html = render_template_string("{{ asset_url('images/logo.png') }}")
+    assert html.startswith("/assets/images/logo."), "Not a template global"
+
+
+def test_serve_asset():
+    """A test to determine if fingerprinted assets are served with a far
+    future cache lifetime.
+    """
+    client = app.test_client()
+    with app.test_request_context():
+        url = asset_url("images/logo.png")
+    response = client.get(url)
+    assert response.status_code == 200, "Failed to serve asset"
+    assert "immutable" in response.headers["Cache-Control"], "Not cached"
+    assert "max-age=31536000" in response.headers["Cache-Control"], "Wrong max-age"
+
+
+def test_serve_asset_gzip():
+    """A test to determine if text assets are served precompressed."""
+    client = app.test_client()
+    with app.test_request_context():
+        url = asset_url("css/base.css")
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip", "Not compressed"
+    with open(path.join(static_folder, "css", "base.css"), "rb") as file:
+        assert gzip.decompress(response.data) == file.read(), "Wrong content"
+
+
+def test_serve_asset_webp():
+    """A test to determine if WebP images are only sent to clients that
+    list image/webp in their Accept header.
+    """
+    client = app.test_client()
+    with app.test_request_context():
+        url = asset_url("images/logo.png")
+    client.get(url)
+    # Add a WebP variant so the test does not need Pillow.
+    variants = assets._assets[url[len("/assets/"):]]["variants"]
+    variants[("identity", "image/webp")] = b"webp"
+
+    for accept, mimetype in (("*/*", "image/png"),
+                             ("image/*", "image/png"),
+                             ("image/webp,*/*;q=0.8", "image/webp"),
+                             ("image/webp;q=0,*/*", "image/png")):
+        response = client.get(url, headers={"Accept": accept})
+        assert response.mimetype == mimetype, f"Wrong image for {accept}"
+    assert "Accept" in response.headers["Vary"], "Missing Vary"
+
+
+def test_serve_asset_wrong_hash():
+    """A test to determine if an outdated fingerprint is not found."""
+    response = app.test_client().get("/assets/css/base.0000000000.css")
+    assert response.status_code == 404, "Served an unknown fingerprint"
+
+
+def test_compress_response():
+    """A test to determine if dynamic responses are compressed and their
+    ETag made weak.
+    """
+    response = app.test_client().get("/page", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip", "Not compressed"
+    assert gzip.decompress(response.data) == b"travel " * 200, "Wrong content"
+    assert response.headers["ETag"].startswith("W/"), "ETag is not weak"
+    assert "Accept-Encoding" in response.headers["Vary"], "Missing Vary"
+
+
+def test_compress_response_not_accepted():
+    """A test to determine if responses are not compressed when the
+    client does not accept it.
+    """
+    response = app.test_client().get("/page")
+    assert "Content-Encoding" not in response.headers, "Compressed anyway"
+
+
+def test_compress_response_small():
+    """A test to determine if small responses are not compressed."""
+    response = app.test_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers, "Compressed small body"
@@ -0,0 +1,134 @@
+"""Test module for the bulk import and export of tables.
+
+Author(s): Thomas,
+"""
+import json
+from io import StringIO
+from random import randint
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load modules after database loading
+from admin.bulk import *
+from database.models.advice import get_advice_by_topic, remove_advice
+
+
+# Test data
+topic = None
+advice_id = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global topic
+    global advice_id
+
+    print("Setting up bulk_test module...")
+
+    with app.app_context():
+        topic = f"test_bulk{randint(1000, 9999)}"
+        advice_id = randint(100000, 999999)
+        rows = StringIO("id,topic,description,link\n"
+                        f"{advice_id},{topic},Bulk test,\n")
+        import_rows("advice", read_rows(rows, "csv"))
+    print("bulk_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    print("Tearing down bulk_test module...")
+
+    with app.app_context():
+        remove_advice(get_advice_by_topic(topic))
+    print("Teardown successful.")
+
+
+def test_import_rows_inserts():
+    """A test to determine if the import_rows function inserts new
+    rows."""
+    with app.app_context():
+        advice = get_advice_by_topic(topic)
+        assert advice != None, "Failed to insert the row"
+        assert advice.id == advice_id, "Failed to keep the id"
+        assert advice.link == None, "Failed to convert empty values"
+
+
+def test_import_rows_diff():
+    """A test to determine if the import_rows function only updates
+    changed rows."""
+    row = {"id": advice_id, "topic": topic, "description": "Bulk test",
+           "link": None}
+    with app.app_context():
+        counts = import_rows("advice", [(1, row)])
+        assert counts == {"inserted": 0, "updated": 0, "unchanged": 1}, (
+            "Updated an unchanged row")
+
+        counts = import_rows("advice", [(1, dict(row, description="Changed"))])
+        assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}, (
+            "Failed to find the changed row")
+        assert get_advice_by_topic(topic).description == "Changed", (
+            "Failed to update the row")
+
+
+def test_import_rows_dry_run():
+    """A test to determine if a dry run counts changes without saving
+    them."""
+    row = {"id": advice_id, "topic": topic, "description": "Dry run",
+           "link": None}
+    with app.app_context():
+        counts = import_rows("advice", [(1, row)], dry_run=True)
+        assert counts["updated"] == 1, "Failed to count the change"
+        assert get_advice_by_topic(topic).description != "Dry run", (
+            "Saved a dry run")
+
+
+def test_import_rows_invalid():
+    """A test to determine if an invalid row stops the whole import."""
+    rows = [(1, {"id": advice_id, "topic": topic, "description": "Invalid",
+                 "link": None}),
+            (2, {"id": advice_id + 1, "topic": f"{topic}_2"})]
+    with app.app_context():
+        try:
+            import_rows("advice", rows, batch_size=1)
+            assert False, "Imported an invalid row"
+        except ValueError as error:
+            assert "Line 2" in str(error), "Failed to give the line number"
+        assert get_advice_by_topic(topic).description != "Invalid", (
+            "Saved part of an invalid import")
+
+
+def test_import_rows_unknown_table():
+    """A test to determine if unknown tables are refused."""
+    with app.app_context():
+        try:
+            import_rows("users", [])
+            assert False, "Imported into an unknown table"
+        except ValueError:
+            pass
+
+
+def test_export_rows_csv():
+    """A test to determine if the export_rows function writes the table
+    in the format of the bundled csv files."""
+    with app.app_context():
+        text = "".join(export_rows("advice", "csv", batch_size=2))
+    lines = text.splitlines()
+    assert lines[0] == "id,topic,description,link", "Incorrect header"
+    assert f"{advice_id},{topic},Changed," in lines, "Missing test row"
+
+
+def test_export_rows_jsonl():
+    """A test to determine if exported JSON lines can be imported
+    again without changes."""
+    with app.app_context():
+        text = "".join(export_rows("advice", "jsonl"))
+        rows = [json.loads(line) for line in text.splitlines()]
+        assert {"id": advice_id, "topic": topic, "description": "Changed",
+                "link": None} in rows, "Missing test row"
+
+        counts = import_rows("advice", read_rows(StringIO(text), "jsonl"))
+        assert counts["inserted"] == counts["updated"] == 0, (
+            "Export does not match the table")
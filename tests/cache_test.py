@@ -0,0 +1,116 @@
+"""Test module for the row snapshots and the country catalogue cache.
+
+Author(s): Thomas,
+"""
+from random import randint
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load modules after database loading
+from database.cache import *
+from database.instrumentation import get_query_stats
+from database.models.country import (Country, add_country, edit_country,
+                                     get_catalogue_version, get_country_by_id,
+                                     get_country_by_name, remove_country)
+
+
+# Test data
+country_name = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global country_name
+
+    print("Setting up cache_test module...")
+
+    with app.app_context():
+        country_name = f"test_cache{randint(1000, 9999)}"
+        add_country(Country(name=country_name,
+                            description="Country for cache test",
+                            travel_advice="None", crime_index=0.2,
+                            disaster_risk=0.2, corruption_index=0.2,
+                            health=0.2))
+    print("cache_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    print("Tearing down cache_test module...")
+
+    with app.app_context():
+        remove_country(get_country_by_name(country_name))
+    print("Teardown successful.")
+
+
+def test_snapshot_restore():
+    """A test to determine if a snapshot is restored into the session
+    without querying the database, and changes to it can be saved."""
+    with app.app_context():
+        values = snapshot(Country.query.filter_by(name=country_name).one(),
+                          Country)
+    assert values["name"] == country_name, "Wrong snapshot values"
+
+    with app.app_context():
+        country = restore(Country, values)
+        queries, _ = get_query_stats()
+        assert queries == 0, "Restoring queried the database"
+        assert country in db.session, "Restored country is not in the session"
+        assert country.description == "Country for cache test", (
+            "Wrong restored values")
+
+        country.travel_advice = "Restored"
+        db.session.commit()
+    with app.app_context():
+        assert Country.query.filter_by(name=country_name).one().travel_advice \
+            == "Restored", "Failed to save the restored country"
+
+
+def test_restore_existing():
+    """A test to determine if restoring a row already in the session
+    returns the instance in the session."""
+    with app.app_context():
+        country = Country.query.filter_by(name=country_name).one()
+        values = dict(snapshot(country, Country), description="Old")
+        country.description = "Unsaved"
+        assert restore(Country, values) is country, "Created a second instance"
+        assert country.description == "Unsaved", "Overwrote unsaved changes"
+        db.session.rollback()
+
+
+def test_catalogue_cached():
+    """A test to determine if country lookups are served from the
+    catalogue cache."""
+    with app.app_context():
+        country_id = get_country_by_name(country_name).id
+    with app.app_context():
+        country = get_country_by_name(country_name.upper())
+        same = get_country_by_id(country_id)
+        queries, _ = get_query_stats()
+        assert country.name == country_name, "Found the wrong country"
+        assert same is country, "Found the country twice"
+        assert queries == 0, "Cached lookup queried the database"
+
+
+def test_catalogue_invalidated():
+    """A test to determine if the cache is refreshed when countries are
+    added, edited and removed through the model helpers."""
+    name = f"test_cache{randint(1000, 9999)}_new"
+    with app.app_context():
+        version = get_catalogue_version()
+        get_country_by_name(country_name)
+        add_country(Country(name=name, description="New", travel_advice="None"))
+        assert get_country_by_name(name) is not None, "Missing added country"
+
+        country = get_country_by_name(country_name)
+        edit_country(country.id, country.version, {"description": "Edited"})
+    with app.app_context():
+        assert get_country_by_name(country_name).description == "Edited", (
+            "Cache kept the old description")
+
+        remove_country(get_country_by_name(name))
+        assert get_country_by_name(name) is None, "Found removed country"
+        assert get_catalogue_version() > version, "Version did not change"
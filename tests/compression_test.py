@@ -0,0 +1,49 @@
+"""Test module for compressing response bodies.
+
+Author(s): Thomas,
+"""
+import gzip
+
+from flask import Flask, request
+
+from compression import *
+
+app = Flask(__name__)
+
+
+def test_compress_gzip():
+    """A test to determine if gzip compressed data can be decompressed
+    and is the same every time."""
+    data = b"travel " * 100
+    compressed = compress(data, "gzip")
+    assert gzip.decompress(compressed) == data, "Wrong content"
+    assert compress(data, "gzip") == compressed, "Output is not repeatable"
+    assert len(compressed) < len(data), "Failed to compress"
+
+
+def test_compress_identity():
+    """A test to determine if identity leaves the data alone."""
+    assert compress(b"travel", "identity") == b"travel", "Changed the data"
+
+
+def test_precompress():
+    """A test to determine if precompress creates every available
+    encoding."""
+    variants = precompress(b"travel " * 100)
+    assert variants["identity"] == b"travel " * 100, "Wrong identity variant"
+    for encoding in available_encodings():
+        assert encoding in variants, f"Missing {encoding} variant"
+
+
+def test_choose_encoding():
+    """A test to determine if the encoding preferred by the client is
+    chosen, falling back to identity."""
+    encodings = ["identity", "gzip"]
+    for header, expected in (("gzip", "gzip"),
+                             ("gzip;q=0", "identity"),
+                             ("br", "identity"),
+                             ("", "identity")):
+        with app.test_request_context(headers={"Accept-Encoding": header}):
+            assert choose_encoding(request, encodings) == expected, (
+                f"Wrong encoding for {header!r}")
+
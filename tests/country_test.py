@@ -0,0 +1,250 @@
+"""Test module for the country model.
+
+Author(s): Thomas,
+"""
+from random import randint
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load model after database loading
+from database.instrumentation import get_query_stats
+from database.models.country import *
+from database.models.country import _table_signature
+
+
+# Test data
+test_country = None
+country_name = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global test_country
+    global country_name
+
+    print("Setting up country_test module...")
+
+    with app.app_context():
+        country_name = f"test_country{randint(1000, 9999)}"
+        add_country(Country(
+            name=country_name,
+            description="Country for country test",
+            travel_advice="None",
+            crime_index=0.9,
+            disaster_risk=0.5,
+            corruption_index=0.3,
+            health=0.1))
+        test_country = get_country_by_name(country_name)
+    print("country_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    global test_country
+
+    print("Tearing down country_test module...")
+
+    with app.app_context():
+        remove_country(get_country_by_name(country_name))
+    test_country = None
+    print("Teardown successful.")
+
+
+def test_risk_band():
+    """A test to determine if the risk_band function puts values in
+    the same bands as the country page."""
+    assert [risk_band(value) for value in
+            (None, -1, 0, 0.19, 0.2, 0.39, 0.4, 0.6, 0.79, 0.8, 1)] == [
+                0, 0, 0, 0, 1, 1, 2, 3, 3, 4, 4], "Incorrect risk bands"
+
+
+def test_derived_metrics_on_insert():
+    """A test to determine if the total index and bands are computed
+    when a country is added."""
+    with app.app_context():
+        country = get_country_by_name(country_name)
+        assert country.total_index == 0.45, "Incorrect total index"
+        assert (country.total_band, country.crime_band, country.disaster_band,
+                country.corruption_band, country.health_band) == (
+                    2, 4, 2, 1, 0), "Incorrect risk bands"
+
+
+def test_derived_metrics_on_update():
+    """A test to determine if the total index and bands are computed
+    when a country is changed."""
+    with app.app_context():
+        country = get_country_by_name(country_name)
+        country.health = 0.9
+        db.session.commit()
+        invalidate_country_cache()
+        total_index = get_country_by_name(country_name).total_index
+        health_band = get_country_by_name(country_name).health_band
+
+        country.health = 0.1
+        db.session.commit()
+        invalidate_country_cache()
+    assert total_index == 0.65, "Failed to update the total index"
+    assert health_band == 4, "Failed to update the risk band"
+
+
+def test_get_countries_by_risk():
+    """A test to determine if the get_countries_by_risk function
+    orders and filters countries by risk."""
+    with app.app_context():
+        countries = get_countries_by_risk()
+        totals = [country.total_index for country in countries]
+        in_band = get_countries_by_risk(band=2)
+        assert totals == sorted(totals, reverse=True), "Incorrect order"
+        assert country_name in [country.name for country in in_band], (
+            "Failed to find country in its band")
+        assert all(country.total_band == 2 for country in in_band), (
+            "Found country in the wrong band")
+
+
+def test_get_country_by_name_none():
+    """A test to determine if the get_country_by_name function returns
+    None for countries that do not exist."""
+    with app.app_context():
+        assert get_country_by_name("no_such_country") == None, (
+            "Found country that doesn't exist")
+        assert get_country_by_name(None) == None, "Found country for None"
+
+
+def test_get_country_by_name_other_process():
+    """A test to determine if countries written to the database by
+    another process are found regardless of case once the catalogue is
+    checked."""
+    name = f"Test_Other{randint(1000, 9999)}"
+    app.config["CATALOGUE_CHECK_INTERVAL"] = 1e-9
+    try:
+        with app.app_context():
+            invalidate_country_cache()
+            assert get_country_by_name(name) == None, "Found a new country"
+            db.session.execute(db.insert(Country.__table__).values(
+                name=name, description="Other", travel_advice="None"))
+            db.session.commit()
+            for lookup in (name, name.lower(), f" {name.upper()} "):
+                country = get_country_by_name(lookup)
+                assert country is not None and country.name == name, (
+                    f"Failed to find the country as {lookup!r}")
+            remove_country(get_country_by_name(name))
+    finally:
+        app.config.pop("CATALOGUE_CHECK_INTERVAL")
+
+
+def test_get_country_by_name_missing_no_query():
+    """A test to determine if looking up a name that does not exist is
+    answered from the catalogue without querying the database."""
+    with app.app_context():
+        get_country_by_name(country_name)
+    with app.app_context():
+        assert get_country_by_name("No_Such_Country") == None, (
+            "Found country that doesn't exist")
+        assert get_query_stats()[0] == 0, "Queried the database"
+
+
+def test_country_indexes():
+    """A test to determine if the lookup columns are indexed and unique
+    where they should be."""
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        indexes = {index["name"]: index for index in
+                   inspector.get_indexes("countries")
+                   + inspector.get_indexes("user_votes")}
+        assert any(index["column_names"] == ["name"] for index in
+                   inspector.get_indexes("countries")), (
+            "Missing index on countries.name")
+        assert indexes["ix_user_votes_country_id_vote_id"]["column_names"] == [
+            "country_id", "vote_id"], "Missing index on user_votes"
+        for table, column in (("users", "username"), ("advice", "topic")):
+            unique = [constraint["column_names"] for constraint in
+                      inspector.get_unique_constraints(table)]
+            unique += [index["column_names"] for index in
+                       inspector.get_indexes(table) if index["unique"]]
+            assert [column] in unique, f"{table}.{column} is not unique"
+
+
+def test_get_country_by_id():
+    """A test to determine if the get_country_by_id function finds the
+    test country."""
+    with app.app_context():
+        assert get_country_by_id(test_country.id).name == country_name, (
+            "Failed to find the country by id")
+
+
+def test_edit_country():
+    """A test to determine if the edit_country function saves the
+    changes and increments the version."""
+    with app.app_context():
+        country = get_country_by_name(country_name)
+        version = country.version
+        edit_country(country.id, version, {"description": "Edited"})
+        edited = get_country_by_name(country_name)
+        assert edited.description == "Edited", "Failed to save the edit"
+        assert edited.version == version + 1, "Failed to increment version"
+
+
+def test_edit_country_conflict():
+    """A test to determine if the edit_country function refuses edits
+    based on an old version."""
+    with app.app_context():
+        country = get_country_by_name(country_name)
+        version = country.version
+        edit_country(country.id, version, {"travel_advice": "First"})
+        try:
+            edit_country(country.id, version, {"travel_advice": "Second"})
+            assert False, "Saved an edit based on an old version"
+        except RuntimeError:
+            pass
+        assert get_country_by_name(country_name).travel_advice == "First", (
+            "Overwrote the newer edit")
+
+
+def test_version_stale():
+    """A test to determine if saving a country fails when its version
+    was changed in the database after it was loaded."""
+    with app.app_context():
+        country = get_country_by_name(country_name)
+        db.session.execute(db.update(Country).where(Country.id == country.id)
+                           .values(version=Country.version + 1)
+                           .execution_options(synchronize_session=False))
+        try:
+            country.description = "Stale"
+            db.session.commit()
+            assert False, "Saved a stale country"
+        except StaleDataError:
+            db.session.rollback()
+        invalidate_country_cache()
+        assert get_country_by_name(country_name).description != "Stale", (
+            "Saved a stale country")
+
+
+def test_edit_country_none():
+    """A test to determine if the edit_country function returns None
+    for countries that do not exist."""
+    with app.app_context():
+        assert edit_country(-1, 1, {"name": "None"}) == None, (
+            "Edited a country that doesn't exist")
+
+
+def test_table_signature_reinsert():
+    """A test to determine if removing the country with the highest id
+    and adding one with the same id changes the table signature."""
+    with app.app_context():
+        country = Country(name=f"test_reinsert{randint(1000, 9999)}",
+                          description="Reinsert", travel_advice="None")
+        add_country(country)
+        country_id = country.id
+        before = _table_signature()
+
+        remove_country(country)
+        add_country(Country(id=country_id, name=country.name,
+                            description="Reinsert", travel_advice="None"))
+        after = _table_signature()
+        remove_country(get_country_by_id(country_id))
+    assert before != after, "Signature did not change"
@@ -187,3 +187,25 @@ def test_get_advice_wrong():
         remove_country_advice(test_country, test_advice)
         raise AssertionError("get_advice function accepted incorrect "
                              + "parameters")
+
+
+def test_get_advice_for_countries():
+    """A test to determine if the get_advice_for_countries function
+    returns the advice for every country given.
+    """
+    with app.app_context():
+        remove_country_advice(test_country, test_advice)
+        add_country_advice(test_country, test_advice)
+        result = get_advice_for_countries([test_country])
+        remove_country_advice(test_country, test_advice)
+        assert [advice.id for advice in result[test_country]] == [
+            test_advice.id], "Should have found the test advice"
+
+
+def test_get_advice_for_countries_empty():
+    """A test to determine if the get_advice_for_countries function
+    works when given no countries.
+    """
+    with app.app_context():
+        assert get_advice_for_countries([]) == {}, (
+            "Found advice without any countries")
@@ -0,0 +1,151 @@
+"""Test module for the database transaction helpers.
+
+Author(s): Thomas,
+"""
+from random import randint
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load modules after database loading
+from database.database import *
+from database.models.advice import Advice, add_advice, get_advice_by_topic, remove_advice
+
+
+def test_sqlite_file_pragmas():
+    """A test to determine if new connections to a file backed sqlite
+    database get the pragmas and the busy timeout."""
+    import tempfile
+    from os import path
+    from app import create_app
+    with tempfile.TemporaryDirectory() as directory:
+        file_app = create_app({
+            "SECRET_KEY": "test", "SQLALCHEMY_ECHO": False,
+            "BCRYPT_ROUNDS": 4, "DB_STATEMENT_TIMEOUT": 2500,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + path.join(directory,
+                                                               "test.db")})
+        with file_app.app_context():
+            with db.engine.connect() as connection:
+                def pragma(name):
+                    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+                assert pragma("foreign_keys") == 1, "Foreign keys are off"
+                assert pragma("journal_mode") == "wal", "Not in WAL mode"
+                assert pragma("busy_timeout") == 2500, "Wrong busy timeout"
+                assert pragma("synchronous") == 1, "Not synchronous NORMAL"
+            assert db.engine.pool.size() == file_app.config["DB_POOL_SIZE"], (
+                "Ignored the pool size")
+            dispose_engines(file_app)
+
+
+def test_sqlite_memory_pragmas():
+    """A test to determine if in memory sqlite databases enforce
+    foreign keys without the file only pragmas."""
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.exec_driver_sql(
+                "PRAGMA foreign_keys").scalar() == 1, "Foreign keys are off"
+            assert connection.exec_driver_sql(
+                "PRAGMA journal_mode").scalar() == "memory", (
+                    "Changed the journal mode")
+
+
+def test_unit_of_work_commits_once():
+    """A test to determine if the helpers called inside a unit of work
+    are committed together."""
+    topics = [f"test_unit{randint(1000, 9999)}_{i}" for i in range(3)]
+    commits = []
+    with app.app_context():
+        db.event.listen(db.session(), "after_commit", commits.append)
+        with unit_of_work():
+            for topic in topics:
+                add_advice(Advice(topic=topic, description="Unit of work"))
+            assert in_unit_of_work(), "Not inside the unit of work"
+        assert not in_unit_of_work(), "Still inside the unit of work"
+        assert len(commits) == 1, f"Committed {len(commits)} times"
+
+        for topic in topics:
+            assert get_advice_by_topic(topic) != None, "Failed to add advice"
+            remove_advice(get_advice_by_topic(topic))
+
+
+def test_unit_of_work_rollback():
+    """A test to determine if nothing is saved when an error leaves a
+    unit of work."""
+    topic = f"test_unit{randint(1000, 9999)}"
+    with app.app_context():
+        try:
+            with unit_of_work():
+                add_advice(Advice(topic=topic, description="Unit of work"))
+                add_advice(Advice(topic=topic, description="Duplicate"))
+            assert False, "Added duplicate advice"
+        except RuntimeError:
+            pass
+        assert get_advice_by_topic(topic) == None, "Saved part of the unit"
+
+
+def test_unit_of_work_nested():
+    """A test to determine if nested units of work join the outer
+    unit."""
+    topic = f"test_unit{randint(1000, 9999)}"
+    with app.app_context():
+        try:
+            with unit_of_work():
+                with unit_of_work():
+                    add_advice(Advice(topic=topic, description="Nested"))
+                assert in_unit_of_work(), "Left the outer unit of work"
+                raise ValueError("Stop")
+        except ValueError:
+            pass
+        assert get_advice_by_topic(topic) == None, "Committed the inner unit"
+
+
+def test_on_commit_deferred():
+    """A test to determine if on_commit callbacks wait for the unit of
+    work to commit, and are dropped when it rolls back."""
+    calls = []
+    with app.app_context():
+        with unit_of_work():
+            on_commit(calls.append, "committed")
+            assert calls == [], "Called before the commit"
+        assert calls == ["committed"], "Not called after the commit"
+
+        try:
+            with unit_of_work():
+                on_commit(calls.append, "rolled back")
+                raise ValueError("Stop")
+        except ValueError:
+            pass
+        assert calls == ["committed"], "Called after a rollback"
+
+
+def test_on_commit_immediate():
+    """A test to determine if on_commit callbacks run straight away
+    outside a unit of work."""
+    calls = []
+    with app.app_context():
+        on_commit(calls.append, 1)
+    assert calls == [1], "Failed to call the callback"
+
+
+def test_on_commit_pending_changes():
+    """A test to determine if on_commit callbacks wait for unsaved
+    changes outside a unit of work to be committed, and are dropped
+    when they are rolled back."""
+    calls = []
+    topic = f"test_unit{randint(1000, 9999)}"
+    with app.app_context():
+        db.session.add(Advice(topic=topic, description="Pending"))
+        on_commit(calls.append, "committed")
+        assert calls == [], "Called before the commit"
+        db.session.commit()
+        assert calls == ["committed"], "Not called after the commit"
+
+        get_advice_by_topic(topic).description = "Rolled back"
+        on_commit(calls.append, "rolled back")
+        db.session.rollback()
+        db.session.commit()
+        assert calls == ["committed"], "Called after a rollback"
+        remove_advice(get_advice_by_topic(topic))
@@ -0,0 +1,139 @@
+"""Test module for the full text search index.
+
+Author(s): Thomas,
+"""
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load module after database loading
+from database.models.advice import Advice, add_advice, remove_advice
+from database.models.country import (Country, add_country, remove_country,
+                                     get_country_by_name)
+from database.models.countryadvice import (add_country_advice,
+                                           remove_country_advice)
+from fulltext import *
+
+
+# Test data
+test_advice = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global test_advice
+
+    print("Setting up fulltext_test module...")
+
+    with app.app_context():
+        add_country(Country(
+            name="fulltext_one",
+            description="Pickpocketing is common in the quuxville markets.",
+            travel_advice="None"))
+        add_country(Country(
+            name="fulltext_two",
+            description="Pickpockets and quuxville pickpocketing gangs "
+                        + "operate in quuxville.",
+            travel_advice="None"))
+        test_advice = Advice(
+            topic="zyxfever",
+            description="How to avoid zyxfever",
+            link="./")
+        add_advice(test_advice)
+        test_advice = Advice.query.filter_by(topic="zyxfever").one()
+    print("fulltext_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    print("Tearing down fulltext_test module...")
+
+    with app.app_context():
+        remove_country(get_country_by_name("fulltext_one"))
+        remove_country(get_country_by_name("fulltext_two"))
+        remove_advice(Advice.query.filter_by(topic="zyxfever").one())
+    print("Teardown successful.")
+
+
+def test_tokenize():
+    """A test to determine if the tokenize function removes stop words
+    and word endings."""
+    assert tokenize("The Pickpockets are pickpocketing!") == [
+        "pickpocket", "pickpocket"], "Incorrect tokens"
+
+
+def test_search_ranking():
+    """A test to determine if the search function ranks countries that
+    mention the query more often first."""
+    with app.app_context():
+        total, results = search("quuxville")
+        assert total == 2, "Found the wrong number of countries"
+        assert [name for _, name, _ in results] == [
+            "fulltext_two", "fulltext_one"], "Incorrect ranking"
+
+
+def test_search_paging():
+    """A test to determine if the search function pages through the
+    results."""
+    with app.app_context():
+        total, results = search("quuxville", offset=1, limit=1)
+        assert total == 2, "Paging changed the total"
+        assert [name for _, name, _ in results] == ["fulltext_one"], (
+            "Incorrect page")
+
+
+def test_search_advice():
+    """A test to determine if the search function finds countries by
+    the advice linked to them."""
+    with app.app_context():
+        country = get_country_by_name("fulltext_one")
+        before, _ = search("zyxfever")
+        add_country_advice(country, test_advice)
+        after, results = search("zyxfever")
+        remove_country_advice(country, test_advice)
+        removed, _ = search("zyxfever")
+    assert before == 0 and removed == 0, "Found advice that isn't linked"
+    assert after == 1 and results[0][1] == "fulltext_one", (
+        "Failed to find linked advice")
+
+
+def test_search_no_terms():
+    """A test to determine if the search function works for queries
+    without any terms."""
+    with app.app_context():
+        assert search("the and") == (0, []), "Found results for stop words"
+
+
+def test_search_advice_other_process():
+    """A test to determine if the index picks up advice edited and
+    linked by another process."""
+    from time import sleep
+    from database.models.countryadvice import CountryAdvice
+    app.config["CATALOGUE_CHECK_INTERVAL"] = 0.01
+    try:
+        with app.app_context():
+            country = get_country_by_name("fulltext_two")
+            before, _ = search("zyxfever")
+            # Change the tables without the model helpers, like another
+            # worker would.
+            db.session.execute(db.insert(CountryAdvice.__table__).values(
+                country_id=country.id, advice_id=test_advice.id))
+            db.session.commit()
+            sleep(0.02)
+            linked, _ = search("zyxfever")
+
+            db.session.execute(db.update(Advice.__table__)
+                               .where(Advice.id == test_advice.id)
+                               .values(description="How to avoid plughfever",
+                                       version=Advice.version + 1))
+            db.session.commit()
+            sleep(0.02)
+            edited, results = search("plughfever")
+            remove_country_advice(country, test_advice)
+    finally:
+        app.config.pop("CATALOGUE_CHECK_INTERVAL")
+    assert before == 0, "Found advice that isn't linked"
+    assert linked == 1, "Failed to find the linked advice"
+    assert edited == 1 and results[0][1] == "fulltext_two", (
+        "Failed to find the edited advice")
@@ -0,0 +1,124 @@
+"""Test module for the query instrumentation.
+
+Author(s): Thomas,
+"""
+import logging
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load module after database loading
+from database.instrumentation import *
+
+
+def test_get_query_stats_counts():
+    """A test to determine if the get_query_stats function counts the
+    statements run in the app context.
+    """
+    with app.app_context():
+        before, _ = get_query_stats()
+        db.session.execute(db.text("SELECT 1"))
+        db.session.execute(db.text("SELECT 2"))
+        after, time_ms = get_query_stats()
+    assert after - before == 2, "Failed to count statements"
+    assert time_ms > 0, "Failed to time statements"
+
+
+def test_get_query_stats_new_context():
+    """A test to determine if each app context starts counting from
+    zero.
+    """
+    with app.app_context():
+        db.session.execute(db.text("SELECT 1"))
+    with app.app_context():
+        assert get_query_stats() == (0, 0.0), "Counted another context"
+
+
+def test_get_query_stats_no_context():
+    """A test to determine if the get_query_stats function works
+    outside of an app context.
+    """
+    assert get_query_stats() == (0, 0.0), "Found statements without context"
+
+
+def test_get_query_stats_failed_statement():
+    """A test to determine if failed statements do not break the
+    timing of later statements.
+    """
+    with app.app_context():
+        try:
+            db.session.execute(db.text("SELECT * FROM no_such_table"))
+        except:
+            db.session.rollback()
+        db.session.execute(db.text("SELECT 1"))
+        assert get_query_stats()[0] == 1, "Counted the failed statement"
+
+
+def create_instrumented_app(config: dict):
+    """Creates an app with an instrumented engine, and a route that runs
+    two statements."""
+    instrumented = Flask(__name__)
+    instrumented.config.update(config)
+    engine = create_engine("sqlite://")
+    install_query_instrumentation(instrumented, engine)
+
+    @instrumented.route("/query")
+    def query():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+        return "done"
+    return instrumented
+
+
+def test_query_headers():
+    """A test to determine if DB_QUERY_HEADERS adds the statement count
+    and time to responses, and only when enabled."""
+    response = create_instrumented_app({"DB_QUERY_HEADERS": True}
+                                       ).test_client().get("/query")
+    assert response.headers["X-DB-Queries"] == "2", "Wrong statement count"
+    assert float(response.headers["X-DB-Time"]) > 0, "Wrong statement time"
+
+    response = create_instrumented_app({"DB_QUERY_HEADERS": False}
+                                       ).test_client().get("/query")
+    assert "X-DB-Queries" not in response.headers, "Added disabled headers"
+    assert "X-DB-Time" not in response.headers, "Added disabled headers"
+
+
+class ListHandler(logging.Handler):
+    """Logging handler that keeps the messages it is given."""
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def get_slow_queries(slow_ms: float) -> list[str]:
+    """Get the slow query messages logged by a request to an app with
+    the given DB_SLOW_QUERY_MS."""
+    instrumented = create_instrumented_app({"DB_SLOW_QUERY_MS": slow_ms})
+    handler = ListHandler()
+    instrumented.logger.addHandler(handler)
+    try:
+        instrumented.test_client().get("/query")
+    finally:
+        instrumented.logger.removeHandler(handler)
+    return [message for message in handler.messages
+            if message.startswith("Slow query")]
+
+
+def test_slow_query_logged():
+    """A test to determine if statements slower than DB_SLOW_QUERY_MS
+    are logged, and faster ones are not."""
+    slow = get_slow_queries(1e-6)
+    assert len(slow) == 2, f"Logged {len(slow)} slow queries"
+    assert slow[0].endswith("SELECT 1"), "Failed to log the statement"
+    assert get_slow_queries(60000) == [], "Logged fast queries"
+    assert get_slow_queries(0) == [], "Logged with slow query logging off"
@@ -0,0 +1,167 @@
+"""Test module for the cached country pages.
+
+Author(s): Thomas,
+"""
+import gzip
+
+from app import create_app
+from database.database import get_database
+
+page_app = create_app({"SECRET_KEY": "test", "CATALOGUE_CHECK_INTERVAL": 0,
+                       "WTF_CSRF_ENABLED": False, "BCRYPT_ROUNDS": 4,
+                       "SQLALCHEMY_ECHO": False})
+db = get_database()
+
+# Load modules after database loading
+import assets
+from main import page_cache
+from main.page_cache import *
+from database.models.country import (Country, add_country, edit_country,
+                                     invalidate_country_cache)
+from database.models.uservotes import VoteType, cast_vote
+from database.models.user import User, add_user
+
+
+# Test data
+country_id = None
+user_id = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global country_id
+    global user_id
+
+    print("Setting up page_cache_test module...")
+
+    # The caches are shared with the apps of other test modules.
+    invalidate_country_cache()
+    clear_pages()
+    with page_app.app_context():
+        country = Country(name="page_country", description="Page test",
+                          travel_advice="None", crime_index=0.1,
+                          disaster_risk=0.1, corruption_index=0.1, health=0.1)
+        add_country(country)
+        user = User(username="page_user", password="password", role="guest")
+        add_user(user)
+        country_id = country.id
+        user_id = user.id
+    print("page_cache_test module setup complete.")
+
+
+def teardown_module():
+    """Clears the caches filled by the tests."""
+    invalidate_country_cache()
+    clear_pages()
+
+
+def test_show_country_cached():
+    """A test to determine if a rendered country page is cached and
+    served again."""
+    client = page_app.test_client()
+    first = client.get("/country/page_country")
+    assert first.status_code == 200, "Failed to show the country"
+    pages = [variants["identity"] for variants in page_cache._pages.values()]
+    assert first.get_data() in pages, "Failed to cache the page"
+
+    second = client.get("/country/page_country")
+    assert second.get_data() == first.get_data(), "Served a different page"
+    assert [variants["identity"] for variants in
+            page_cache._pages.values()] == pages, "Rendered the page again"
+    assert second.get_etag() == first.get_etag(), "Changed the ETag"
+
+
+def test_show_country_compressed():
+    """A test to determine if a cached page is compressed once and the
+    compressed page is served again with its own ETag."""
+    client = page_app.test_client()
+    identity = client.get("/country/page_country")
+    headers = {"Accept-Encoding": "gzip"}
+    first = client.get("/country/page_country", headers=headers)
+    assert first.headers["Content-Encoding"] == "gzip", "Not compressed"
+    assert gzip.decompress(first.get_data()) == identity.get_data(), (
+        "Wrong compressed content")
+    assert first.get_etag()[0] != identity.get_etag()[0], (
+        "Encodings share an ETag")
+
+    variants = next((variants for variants in page_cache._pages.values()
+                     if variants.get("gzip") == first.get_data()), None)
+    assert variants is not None, "Failed to cache the compressed page"
+    body = variants["gzip"]
+    second = client.get("/country/page_country", headers=headers)
+    assert second.get_data() == body, "Served a different page"
+    assert variants["gzip"] is body, "Compressed the page again"
+
+    response = client.get("/country/page_country", headers=dict(
+        headers, **{"If-None-Match": f'"{first.get_etag()[0]}"'}))
+    assert response.status_code == 304, "Failed to answer with 304"
+
+
+def test_show_country_not_modified():
+    """A test to determine if a request with the current ETag is
+    answered with 304."""
+    client = page_app.test_client()
+    etag, _ = client.get("/country/page_country").get_etag()
+    response = client.get("/country/page_country",
+                          headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304, "Failed to answer with 304"
+    assert response.get_data() == b"", "Sent a body with the 304"
+
+
+def test_show_country_edit():
+    """A test to determine if editing the country changes the ETag and
+    the cached page, without relying on this process's catalogue
+    version."""
+    client = page_app.test_client()
+    etag, _ = client.get("/country/page_country").get_etag()
+    with page_app.app_context():
+        version = db.session.get(Country, country_id).version
+        edit_country(country_id, version, {"description": "Edited page"})
+
+    response = client.get("/country/page_country",
+                          headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200, "Answered an edited page with 304"
+    assert b"Edited page" in response.get_data(), "Served the old page"
+
+
+def test_show_country_vote():
+    """A test to determine if a vote changes the ETag and the cached
+    page."""
+    client = page_app.test_client()
+    etag, _ = client.get("/country/page_country").get_etag()
+    with page_app.app_context():
+        cast_vote(user_id, country_id, VoteType.UPVOTE)
+
+    response = client.get("/country/page_country",
+                          headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200, "Answered a voted page with 304"
+    assert b"Up Votes: 1" in response.get_data(), "Served the old page"
+
+
+def test_show_country_build_version():
+    """A test to determine if a new build changes the ETag and renders
+    the page again."""
+    client = page_app.test_client()
+    etag, _ = client.get("/country/page_country").get_etag()
+    build = page_app.config["BUILD_VERSION"]
+    page_app.config["BUILD_VERSION"] = "new build"
+    try:
+        response = client.get("/country/page_country",
+                              headers={"If-None-Match": f'"{etag}"'})
+    finally:
+        page_app.config["BUILD_VERSION"] = build
+    assert response.status_code == 200, "Answered a new build with 304"
+    assert response.get_etag()[0] != etag, "Kept the ETag of the old build"
+
+
+def test_build_version():
+    """A test to determine if the build version changes when a static
+    file changes."""
+    build = build_version(page_app)
+    assert build == page_app.config["BUILD_VERSION"], "Wrong build version"
+    manifest = dict(assets._manifest)
+    assets._manifest["css/base.css"] = "css/base.0123456789.css"
+    try:
+        assert build_version(page_app) != build, "Ignored the changed asset"
+    finally:
+        assets._manifest = manifest
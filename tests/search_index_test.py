@@ -0,0 +1,104 @@
+"""Test module for the country name search index.
+
+Author(s): Thomas,
+"""
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load module after database loading
+from database.models.country import Country, add_country, remove_country
+from search_index import *
+
+
+# Test data
+test_countries = []
+names = ["côte d'ivoire", "united kingdom", "united states", "uganda"]
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    print("Setting up search_index_test module...")
+
+    with app.app_context():
+        for name in names:
+            add_country(Country(
+                name=name,
+                description="Country for search index test",
+                travel_advice="None"))
+            test_countries.append(name)
+    print("search_index_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    print("Tearing down search_index_test module...")
+
+    with app.app_context():
+        for name in test_countries:
+            remove_country(Country.query.filter_by(name=name).one())
+    test_countries.clear()
+    print("Teardown successful.")
+
+
+def test_normalize():
+    """A test to determine if the normalize function removes case,
+    accents and extra whitespace."""
+    assert normalize("  Côte   D'Ivoire ") == "cote d'ivoire", (
+        "Failed to normalize text")
+
+
+def test_find():
+    """A test to determine if the find function ignores case and
+    accents."""
+    with app.app_context():
+        assert find("COTE D'IVOIRE") == "côte d'ivoire", "Failed to find name"
+        assert find("united") == None, "Found name for a prefix"
+
+
+def test_complete():
+    """A test to determine if the complete function returns the names
+    starting with a prefix in order."""
+    with app.app_context():
+        assert complete("unit") == ["united kingdom", "united states"], (
+            "Incorrect completions")
+        assert complete("unit", limit=1) == ["united kingdom"], (
+            "Ignored the limit")
+        assert complete("") == [], "Completed an empty prefix"
+
+
+def test_suggest():
+    """A test to determine if the suggest function finds names with
+    typos."""
+    with app.app_context():
+        assert suggest("ugnada")[0] == "uganda", "Failed to suggest name"
+        assert suggest("untied kingdom")[0] == "united kingdom", (
+            "Failed to suggest name")
+        assert suggest("zzzzzz") == [], "Suggested unrelated names"
+
+
+def test_index_follows_catalogue():
+    """A test to determine if the index is updated when countries are
+    added and removed."""
+    with app.app_context():
+        add_country(Country(
+            name="united arab emirates",
+            description="Country for search index test",
+            travel_advice="None"))
+        added = complete("united a")
+        remove_country(Country.query.filter_by(
+            name="united arab emirates").one())
+        removed = complete("united a")
+    assert added == ["united arab emirates"], "Failed to add new country"
+    assert removed == [], "Failed to remove country"
+
+
+def test_suggest_view_limit():
+    """A test to determine if the suggest view keeps the limit between
+    1 and 50."""
+    from main.views import suggest as suggest_view
+    for limit, expected in (("-3", 1), ("0", 1), ("2", 2), ("500", 3)):
+        with app.test_request_context(f"/search/suggest?q=u&limit={limit}"):
+            completions = suggest_view().get_json()["completions"]
+        assert len(completions) == expected, f"Wrong results for {limit}"
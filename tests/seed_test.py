@@ -0,0 +1,65 @@
+"""Test module for seeding the database from the bundled csv files.
+
+Author(s): Thomas,
+"""
+import csv
+from os import path
+
+from app import create_app
+from database.database import get_database
+
+seed_app = create_app({"SECRET_KEY": "test", "CATALOGUE_CHECK_INTERVAL": 0,
+                       "BCRYPT_ROUNDS": 4, "SQLALCHEMY_ECHO": False})
+db = get_database()
+
+# Load modules after database loading
+from database.seed import *
+from database.models.country import (get_country_by_name,
+                                     invalidate_country_cache)
+
+
+def teardown_module():
+    """Clears the caches filled by the tests."""
+    invalidate_country_cache()
+
+
+def _csv_rows(filename: str) -> int:
+    """Counts the rows of a bundled csv file."""
+    with open(path.join(DATA_DIRECTORY, filename), newline="",
+              encoding="utf-8") as file:
+        return sum(1 for _ in csv.DictReader(file))
+
+
+def _table_rows() -> dict:
+    """Counts the rows of every seeded table."""
+    return {model.__tablename__: db.session.execute(
+        db.select(db.func.count()).select_from(model.__table__)).scalar()
+        for _, model in SEED_FILES}
+
+
+def test_seed_database():
+    """A test to determine if seeding an empty database loads every row
+    of the csv files, and seeding again changes nothing."""
+    expected = {model.__tablename__: _csv_rows(filename)
+                for filename, model in SEED_FILES}
+    with seed_app.app_context():
+        assert set(_table_rows().values()) == {0}, "Database is not empty"
+
+        totals = seed_database(report=None)
+        assert totals == expected, "Wrong number of rows inserted"
+        assert _table_rows() == expected, "Wrong number of rows saved"
+
+        totals = seed_database(report=None)
+        assert set(totals.values()) == {0}, "Inserted rows again"
+        assert _table_rows() == expected, "Seeding again changed the tables"
+
+
+def test_seed_database_values():
+    """A test to determine if seeded countries have their derived
+    metrics."""
+    with seed_app.app_context():
+        country = get_country_by_name("Afghanistan")
+        assert country is not None, "Failed to find a seeded country"
+        assert country.crime_index == 0.76, "Wrong index value"
+        assert country.total_index == round(
+            (0.76 + 0.5 + 0.76 + 0.81) / 4, 4), "Wrong total index"
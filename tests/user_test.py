@@ -116,6 +116,22 @@ def test_add_existing():
                              + " username")
 
 
+def test_username_unique():
+    """Tests wether the database itself refuses two users with the same
+    username.
+    """
+    from sqlalchemy.exc import IntegrityError
+    with app.app_context():
+        db.session.add(User(username=username, password=password,
+                            role="guest"))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return
+        raise AssertionError("Database accepted a duplicate username")
+
+
 def test_remove_existing():
     """Tests wether the remove_user function successfully removes a
     user from the database.
@@ -204,3 +220,102 @@ def test_validate_user_wrong():
         except:
             return
         raise AssertionError("validate user should have failed")
+
+
+def test_validate_user_returns_user():
+    """A test to determine if the validation function returns the
+    user that was validated.
+    """
+    with app.app_context():
+        assert validate_user(username, password).id == test_user.id, (
+            "Failed to return the validated user")
+
+
+def test_get_hash_metrics():
+    """A test to determine if password hashing is recorded in the
+    hash metrics.
+    """
+    before = get_hash_metrics()["count"]
+    check_password(password, test_user.password)
+    metrics = get_hash_metrics()
+    assert metrics["count"] == before + 1, "Failed to record hash"
+    assert metrics["max_ms"] >= metrics["mean_ms"] > 0, (
+        "Recorded invalid hash latency")
+
+
+def test_configure_password_hashing_wrong():
+    """A test to determine if the configure_password_hashing function
+    rejects an invalid work factor.
+    """
+    try:
+        configure_password_hashing(rounds=2)
+    except:
+        return
+    raise AssertionError("Accepted invalid bcrypt rounds")
+
+
+def test_get_user_by_id_cached():
+    """A test to determine if the get_user_by_id function serves
+    repeated lookups from the user cache.
+    """
+    from database.instrumentation import get_query_stats
+    with app.app_context():
+        get_user_by_id(test_user.id)
+    with app.app_context():
+        user = get_user_by_id(test_user.id)
+        queries, _ = get_query_stats()
+        assert user.username == username, "Found the wrong user"
+        assert queries == 0, "Cached user lookup queried the database"
+
+
+def test_get_user_by_id_none():
+    """A test to determine if the get_user_by_id function returns none
+    when the id is not in the database.
+    """
+    with app.app_context():
+        assert get_user_by_id(999999) == None, "Found user that doesn't exist"
+
+
+def test_set_role_invalidates():
+    """A test to determine if changing the role of a user is seen by
+    the next get_user_by_id lookup.
+    """
+    with app.app_context():
+        user = get_user_by_id(test_user.id)
+        user.set_role("admin")
+        db.session.commit()
+    with app.app_context():
+        role = get_user_by_id(test_user.id).role
+        get_user_by_id(test_user.id).set_role("guest")
+        db.session.commit()
+    assert role == "admin", "Cached user kept the old role"
+
+
+def test_set_role_invalidates_on_commit():
+    """A test to determine if a lookup made before a role change is
+    committed does not keep the old role cached, and a rolled back
+    change keeps the cache.
+    """
+    with app.app_context():
+        user = get_user_by_id(test_user.id)
+        user.set_role("admin")
+        # Another request caches the user before the change is saved.
+        with app.app_context():
+            assert get_user_by_id(test_user.id).role == "guest", (
+                "Saw the unsaved role")
+        db.session.commit()
+    with app.app_context():
+        role = get_user_by_id(test_user.id).role
+        get_user_by_id(test_user.id).set_role("guest")
+        db.session.commit()
+    assert role == "admin", "Cached user kept the old role"
+
+    with app.app_context():
+        get_user_by_id(test_user.id).set_role("admin")
+        db.session.rollback()
+    with app.app_context():
+        from database.instrumentation import get_query_stats
+        assert get_user_by_id(test_user.id).role == "guest", (
+            "Saved the rolled back role")
+        queries, _ = get_query_stats()
+        assert queries == 0, "Rolled back change cleared the cache"
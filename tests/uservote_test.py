@@ -312,3 +312,298 @@ def test_get_all_votes():
     with app.app_context():
         assert len(get_all_votes(test_country)) == 0, ("Found votes for country"
                                                        + " that don't exist")
+
+
+def test_get_vote_counts():
+    """A test to see if the get_vote_counts function follows votes
+    being added and removed.
+    """
+    with app.app_context():
+        vote = UserVote(
+                user_id=test_user.id,
+                country_id=test_country.id,
+                vote_id=VoteType.DOWNVOTE.value
+                )
+        add_vote(vote)
+        added = get_vote_counts(test_country)
+        remove_vote(vote)
+        removed = get_vote_counts(test_country)
+        assert added == (0, 1), "Failed to count the added vote"
+        assert removed == (0, 0), "Failed to count the removed vote"
+
+
+def test_rebuild_vote_counts():
+    """A test to see if the rebuild_vote_counts function repairs the
+    counters after votes were changed directly.
+    """
+    with app.app_context():
+        vote = UserVote(
+                user_id=test_user.id,
+                country_id=test_country.id,
+                vote_id=VoteType.UPVOTE.value
+                )
+        db.session.add(vote)
+        db.session.commit()
+
+        before = get_vote_counts(test_country)
+        rebuild_vote_counts()
+        after = get_vote_counts(test_country)
+        remove_vote(vote)
+        assert before == (0, 0), "Counters changed without add_vote"
+        assert after == (1, 0), "Failed to rebuild the counters"
+
+
+def test_cast_vote():
+    """A test to see if the cast_vote function records a vote once
+    and ignores a second vote for the same country.
+    """
+    with app.app_context():
+        first = cast_vote(test_user.id, test_country.id, VoteType.UPVOTE)
+        second = cast_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        vote_id = get_user_vote(test_user, test_country).vote_id
+        counts = get_vote_counts(test_country)
+        clear_vote(test_user.id, test_country.id)
+        assert first and not second, "Failed to ignore the second vote"
+        assert vote_id == VoteType.UPVOTE.value, "Recorded wrong vote"
+        assert counts == (1, 0), "Failed to count the vote"
+
+
+def test_cast_vote_counter_race():
+    """A test to see if the cast_vote function counts the first vote for
+    a country when another request creates the counter row at the same
+    time.
+    """
+    created = []
+
+    def create_first(conn, cursor, statement, parameters, context,
+                     executemany):
+        if (statement.startswith("INSERT") and not created
+                and "INTO country_vote_counts" in statement):
+            created.append(statement)
+            cursor.execute("INSERT INTO country_vote_counts (country_id, "
+                           "upvotes, downvotes) VALUES (?, 0, 0)",
+                           (test_country.id,))
+
+    with app.app_context():
+        db.session.execute(db.delete(CountryVoteCount).where(
+            CountryVoteCount.country_id == test_country.id))
+        db.session.commit()
+        db.event.listen(db.engine, "before_cursor_execute", create_first)
+        try:
+            cast_vote(test_user.id, test_country.id, VoteType.UPVOTE)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", create_first)
+        counts = get_vote_counts(test_country)
+        clear_vote(test_user.id, test_country.id)
+        assert created, "Failed to create the counter first"
+        assert counts == (1, 0), "Failed to count the vote"
+
+
+def test_clear_vote_no_counter():
+    """A test to see if removing a vote from a country without a counter
+    row does not create a negative counter.
+    """
+    with app.app_context():
+        db.session.add(UserVote(user_id=test_user.id,
+                                country_id=test_country.id,
+                                vote_id=VoteType.UPVOTE.value))
+        db.session.execute(db.delete(CountryVoteCount).where(
+            CountryVoteCount.country_id == test_country.id))
+        db.session.commit()
+        clear_vote(test_user.id, test_country.id)
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Created a negative counter")
+
+
+def test_cast_vote_wrong():
+    """A test to see if the cast_vote function fails when given an
+    invalid vote type.
+    """
+    with app.app_context():
+        try:
+            cast_vote(test_user.id, test_country.id, 1)
+        except:
+            return
+        clear_vote(test_user.id, test_country.id)
+        raise AssertionError("cast_vote accepted an invalid vote type")
+
+
+def test_clear_vote():
+    """A test to see if the clear_vote function removes a vote and
+    reports when there was no vote.
+    """
+    with app.app_context():
+        cast_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        removed = clear_vote(test_user.id, test_country.id)
+        removed_again = clear_vote(test_user.id, test_country.id)
+        assert removed and not removed_again, "Failed to clear the vote"
+        assert get_user_vote(test_user, test_country) == None, (
+            "Vote still exists")
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Failed to update the counters")
+
+
+def test_clear_vote_concurrent():
+    """A test to see if the clear_vote function leaves the counters
+    alone when the vote is removed by someone else between finding and
+    deleting it, on databases without DELETE ... RETURNING.
+    """
+    removed_first = []
+
+    def remove_first(conn, cursor, statement, parameters, context,
+                     executemany):
+        if statement.startswith("DELETE FROM user_votes") and not removed_first:
+            removed_first.append(statement)
+            cursor.execute(statement, parameters)
+
+    with app.app_context():
+        cast_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        dialect = db.engine.dialect
+        delete_returning = dialect.delete_returning
+        dialect.delete_returning = False
+        db.event.listen(db.engine, "before_cursor_execute", remove_first)
+        try:
+            removed = clear_vote(test_user.id, test_country.id)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", remove_first)
+            dialect.delete_returning = delete_returning
+        counts = get_vote_counts(test_country)
+        rebuild_vote_counts()
+        assert removed_first, "Failed to remove the vote first"
+        assert not removed, "Reported removing a vote removed by someone else"
+        assert counts == (0, 1), "Updated the counters twice"
+
+
+def test_remove_user_votes():
+    """A test to see if removing a user removes their votes and
+    updates the vote counters.
+    """
+    from database.models.user import add_user, remove_user
+    with app.app_context():
+        user = User(username=f"test_voter{randint(1000, 9999)}",
+                    password="password", role="guest")
+        add_user(user)
+        cast_vote(user.id, test_country.id, VoteType.UPVOTE)
+        assert get_vote_counts(test_country) == (1, 0), "Failed to vote"
+
+        remove_user(user)
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Failed to update the counters")
+        assert db.session.execute(db.select(UserVote).where(
+            UserVote.user_id == user.id)).first() == None, (
+                "Vote still exists")
+
+
+def test_remove_country_cascade():
+    """A test to see if removing a country removes its votes, vote
+    counters and advice in a single transaction.
+    """
+    from database.instrumentation import get_query_stats
+    from database.models.advice import (Advice, add_advice, remove_advice,
+                                        get_advice_by_topic)
+    from database.models.country import add_country, remove_country
+    from database.models.countryadvice import CountryAdvice, add_country_advice
+    with app.app_context():
+        country = Country(name=f"test_country{randint(1000, 9999)}",
+                          description="Country for cascade test",
+                          travel_advice="None", crime_index=0,
+                          disaster_risk=0, corruption_index=0, health=0)
+        add_country(country)
+        advice = Advice(topic=f"test_topic{randint(1000, 9999)}",
+                        description="Advice for cascade test")
+        add_advice(advice)
+        add_country_advice(country, advice)
+        cast_vote(test_user.id, country.id, VoteType.DOWNVOTE)
+        country_id = country.id
+        topic = advice.topic
+
+    with app.app_context():
+        remove_country(Country(id=country_id))
+        # Finding, deleting and incrementing the country generation.
+        queries, _ = get_query_stats()
+        assert queries <= 3, f"Removing the country took {queries} queries"
+
+        for model in (UserVote, CountryVoteCount, CountryAdvice):
+            assert db.session.execute(db.select(model).where(
+                model.country_id == country_id)).first() == None, (
+                    f"Failed to remove {model.__tablename__} rows")
+        remove_advice(get_advice_by_topic(topic))
+
+
+def test_remove_country_none():
+    """A test to see if removing a country that is not in the database
+    does nothing.
+    """
+    from database.models.country import remove_country
+    with app.app_context():
+        remove_country(Country(id=-1))
+
+
+def test_get_vote_summaries():
+    """A test to see if the get_vote_summaries function finds the net
+    votes and ratio of each country.
+    """
+    from database.models.user import add_user, remove_user
+    with app.app_context():
+        voters = [User(username=f"test_voter{randint(1000, 9999)}_{i}",
+                       password="password", role="guest") for i in range(3)]
+        for voter, vote_type in zip(voters, (VoteType.UPVOTE, VoteType.UPVOTE,
+                                             VoteType.DOWNVOTE)):
+            add_user(voter)
+            cast_vote(voter.id, test_country.id, vote_type)
+
+        summary = get_vote_summaries([test_country.id, -1])
+        for voter in voters:
+            remove_user(voter)
+    assert list(summary) == [test_country.id], "Incorrect countries"
+    summary = summary[test_country.id]
+    assert (summary["upvotes"], summary["downvotes"]) == (2, 1), (
+        "Incorrect vote counts")
+    assert summary["net"] == 1, "Incorrect net votes"
+    assert summary["ratio"] == 0.6667, "Incorrect vote ratio"
+
+
+def test_get_leaderboard():
+    """A test to see if the leaderboards rank countries by their net
+    votes and are refreshed when a vote is made.
+    """
+    with app.app_context():
+        before = [summary["id"] for summary in get_leaderboard(limit=1000)]
+        assert test_country.id not in before, "Ranked a country without votes"
+
+        cast_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        trusted = get_leaderboard(limit=1000)
+        distrusted = get_leaderboard(descending=False, limit=1000)
+        clear_vote(test_user.id, test_country.id)
+        after = [summary["id"] for summary in get_leaderboard(limit=1000)]
+
+    ids = [summary["id"] for summary in trusted]
+    assert test_country.id in ids, "Leaderboard was not refreshed"
+    nets = [summary["net"] for summary in trusted]
+    assert nets == sorted(nets, reverse=True), "Incorrect trusted order"
+    nets = [summary["net"] for summary in distrusted]
+    assert nets == sorted(nets), "Incorrect distrusted order"
+    assert test_country.id not in after, "Leaderboard was not refreshed"
+
+
+def test_remove_country_leaderboard():
+    """A test to see if removing a country removes it from the cached
+    leaderboards.
+    """
+    from database.models.country import add_country, remove_country
+    with app.app_context():
+        country = Country(name=f"test_country{randint(1000, 9999)}",
+                          description="Country for leaderboard test",
+                          travel_advice="None", crime_index=0,
+                          disaster_risk=0, corruption_index=0, health=0)
+        add_country(country)
+        cast_vote(test_user.id, country.id, VoteType.UPVOTE)
+        country_id = country.id
+        assert country_id in [summary["id"] for summary in
+                              get_leaderboard(limit=1000)], (
+            "Failed to rank the country")
+
+        remove_country(Country(id=country_id))
+        assert country_id not in [summary["id"] for summary in
+                                  get_leaderboard(limit=1000)], (
+            "Leaderboard kept the removed country")
@@ -0,0 +1,230 @@
+"""Test module for the admin and vote views.
+
+Author(s): Thomas,
+"""
+import re
+
+from app import create_app
+from database.database import get_database
+
+views_app = create_app({"SECRET_KEY": "test", "CATALOGUE_CHECK_INTERVAL": 0,
+                        "WTF_CSRF_ENABLED": False, "BCRYPT_ROUNDS": 4,
+                        "SQLALCHEMY_ECHO": False, "VOTE_FLUSH_INTERVAL": 3600})
+db = get_database()
+
+# Load modules after database loading
+from database.models.country import (Country, add_country, edit_country,
+                                     get_country_by_name,
+                                     invalidate_country_cache, remove_country)
+from database.models.user import User, add_user, invalidate_user
+from database.models.uservotes import VoteType, get_vote_counts
+from database.votequeue import flush_votes, get_queued_vote
+from main.page_cache import clear_pages
+
+
+# Test data
+user_ids = []
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    print("Setting up views_test module...")
+
+    # The caches are shared with the apps of other test modules.
+    invalidate_country_cache()
+    clear_pages()
+    with views_app.app_context():
+        add_country(Country(name="view_country", description="View test",
+                            travel_advice="None", crime_index=0.1,
+                            disaster_risk=0.1, corruption_index=0.1,
+                            health=0.1))
+        for username, role in (("view_admin", "admin"),
+                               ("view_guest", "guest")):
+            user = User(username=username, password="password", role=role)
+            add_user(user)
+            user_ids.append(user.id)
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    print("views_test module setup complete.")
+
+
+def teardown_module():
+    """Clears the caches filled by the tests."""
+    invalidate_country_cache()
+    clear_pages()
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+def login(username: str):
+    """Creates a test client logged in as the user."""
+    client = views_app.test_client()
+    response = client.post("/login", data={"username": username,
+                                           "password": "password"})
+    assert response.status_code == 302, f"Failed to log in as {username}"
+    get_flashes(client)
+    return client
+
+
+def get_flashes(client) -> list[str]:
+    """Get and clear the messages flashed to the client."""
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop("_flashes", [])]
+
+
+def get_version(response) -> int:
+    """Get the version field of the country form in the response."""
+    match = re.search(r'name="version" type="hidden" value="(\d+)"',
+                      response.get_data(True))
+    assert match is not None, "Missing the version field"
+    return int(match.group(1))
+
+
+def edit_form(country_id: int, version: int, description: str) -> dict:
+    """Creates the data posted by the country form."""
+    return {"country_id": country_id, "version": version,
+            "name": "view_country", "description": description,
+            "travel_advice": "None", "crime_index": 0.1,
+            "disaster_risk": 0.1, "corruption_index": 0.1, "health": 0.1}
+
+
+def test_admin_requires_admin():
+    """A test to determine if only admins can open the admin page."""
+    response = login("view_guest").get("/admin")
+    assert response.status_code == 302, "Let a guest open the admin page"
+
+
+def test_admin_edit():
+    """A test to determine if a country is found by the admin search and
+    the edit is saved."""
+    client = login("view_admin")
+    response = client.post("/admin", data={"search": "View_Country"})
+    assert response.status_code == 200, "Failed to search"
+    with views_app.app_context():
+        country = get_country_by_name("view_country")
+        country_id, version = country.id, country.version
+    assert get_version(response) == version, "Wrong version in the form"
+
+    response = client.post("/admin", data=edit_form(country_id, version,
+                                                    "Admin edit"))
+    assert "Saved changes to view_country." in response.get_data(True), (
+        "Failed to save the edit")
+    with views_app.app_context():
+        assert get_country_by_name("view_country").description == (
+            "Admin edit"), "Saved the wrong description"
+
+
+def test_admin_edit_stale():
+    """A test to determine if an edit based on an old version is refused
+    and the form is given the latest version to submit again."""
+    client = login("view_admin")
+    version = get_version(client.post("/admin",
+                                      data={"search": "view_country"}))
+    with views_app.app_context():
+        country = get_country_by_name("view_country")
+        country_id = country.id
+        edit_country(country_id, version, {"description": "Other edit"})
+
+    response = client.post("/admin", data=edit_form(country_id, version,
+                                                    "Stale edit"))
+    assert "changed by someone else" in response.get_data(True), (
+        "Failed to warn about the other edit")
+    assert get_version(response) == version + 1, "Failed to refresh the version"
+    assert "Stale edit" in response.get_data(True), "Lost the admin's changes"
+    with views_app.app_context():
+        assert get_country_by_name("view_country").description == (
+            "Other edit"), "Overwrote the other edit"
+
+    response = client.post("/admin", data=edit_form(country_id, version + 1,
+                                                    "Stale edit"))
+    assert "Saved changes to view_country." in response.get_data(True), (
+        "Failed to save the resubmitted edit")
+
+
+def test_admin_edit_removed():
+    """A test to determine if editing a country removed while the form
+    was open is reported."""
+    client = login("view_admin")
+    with views_app.app_context():
+        country = Country(name="view_removed", description="Removed",
+                          travel_advice="None")
+        add_country(country)
+        country_id, version = country.id, country.version
+        remove_country(country)
+
+    response = client.post("/admin", data=edit_form(country_id, version,
+                                                    "Edit"))
+    assert "The country no longer exists." in response.get_data(True), (
+        "Failed to report the removed country")
+
+
+def test_vote_views():
+    """A test to determine if the vote views record, refuse and remove
+    votes."""
+    client = login("view_guest")
+    data = {"country_name": "view_country"}
+    with views_app.app_context():
+        country = get_country_by_name("view_country")
+
+    response = client.post("/upvote", data=data)
+    assert response.status_code == 302, "Failed to redirect"
+    assert response.location == "/country/view_country", "Wrong redirect"
+    assert get_flashes(client) == [
+        "You have upvoted View_country's information."], "Failed to vote"
+    client.post("/downvote", data=data)
+    assert get_flashes(client) == [
+        "You have already voted for View_country."], "Voted twice"
+    with views_app.app_context():
+        assert get_vote_counts(country) == (1, 0), "Failed to count the vote"
+
+    client.post("/vote/reset", data=data)
+    assert get_flashes(client) == [
+        "You have removed your vote for View_country."], "Failed to reset"
+    client.post("/vote/reset", data=data)
+    assert get_flashes(client) == [
+        "You have not voted for View_country."], "Reset a missing vote"
+    with views_app.app_context():
+        assert get_vote_counts(country) == (0, 0), "Failed to remove the vote"
+
+    response = client.post("/upvote", data={"country_name": "no_such_country"})
+    assert "404" in response.get_data(True), "Voted for a missing country"
+
+
+def test_vote_views_write_behind():
+    """A test to determine if votes are queued with VOTE_WRITE_BEHIND,
+    and the views account for the queued votes."""
+    client = login("view_guest")
+    data = {"country_name": "view_country"}
+    views_app.config["VOTE_WRITE_BEHIND"] = True
+    try:
+        with views_app.app_context():
+            country = get_country_by_name("view_country")
+            user_id = User.query.filter_by(username="view_guest").one().id
+
+        client.post("/downvote", data=data)
+        client.post("/upvote", data=data)
+        assert get_flashes(client) == [
+            "You have downvoted View_country's information.",
+            "You have already voted for View_country."], (
+                "Ignored the queued vote")
+        with views_app.app_context():
+            assert get_queued_vote(user_id, country.id) == (
+                True, VoteType.DOWNVOTE), "Failed to queue the vote"
+            assert get_vote_counts(country) == (0, 0), (
+                "Wrote the vote before flushing")
+            flush_votes()
+            assert get_vote_counts(country) == (0, 1), (
+                "Failed to write the vote")
+
+        client.post("/vote/reset", data=data)
+        client.post("/vote/reset", data=data)
+        assert get_flashes(client) == [
+            "You have removed your vote for View_country.",
+            "You have not voted for View_country."], (
+                "Ignored the queued reset")
+        with views_app.app_context():
+            flush_votes()
+            assert get_vote_counts(country) == (0, 0), (
+                "Failed to remove the vote")
+    finally:
+        views_app.config["VOTE_WRITE_BEHIND"] = False
@@ -0,0 +1,182 @@
+"""Test module for the vote queue.
+
+Author(s): Thomas,
+"""
+from random import randint
+from threading import Thread
+
+from database.database import get_database
+from conftest import app
+
+db = get_database()
+
+# Load modules after database loading
+from database import votequeue
+from database.votequeue import *
+from database.models.uservotes import UserVote, get_vote_counts
+from database.models.user import User, add_user, get_user_by_name, remove_user
+from database.models.country import (Country, add_country,
+                                     get_country_by_name, remove_country)
+
+
+# Test data
+test_user = None
+test_country = None
+
+
+def setup_module():
+    """Adds test data to the database before tests are run"""
+    global test_user
+    global test_country
+
+    print("Setting up votequeue_test module...")
+
+    # Only flush when the tests ask for it.
+    app.config["VOTE_FLUSH_INTERVAL"] = 3600
+    # The queue is shared with the apps of other test modules.
+    votequeue._app = app
+    with app.app_context():
+        username = f"test_user{randint(1000, 9999)}"
+        country_name = f"test_country{randint(1000, 9999)}"
+        add_user(User(username=username, password="password", role="guest"))
+        add_country(Country(name=country_name,
+                            description="Country for votequeue test",
+                            travel_advice="None", crime_index=0,
+                            disaster_risk=0, corruption_index=0, health=0))
+        test_user = get_user_by_name(username)
+        test_country = get_country_by_name(country_name)
+    print("votequeue_test module setup complete.")
+
+
+def teardown_module():
+    """Removes the test data from the database."""
+    print("Tearing down votequeue_test module...")
+
+    with app.app_context():
+        flush_votes()
+        remove_user(test_user)
+        remove_country(test_country)
+    print("Teardown successful.")
+
+
+def test_enqueue_vote_last_write_wins():
+    """A test to determine if only the latest queued change to a vote
+    is kept and written."""
+    with app.app_context():
+        enqueue_vote(test_user.id, test_country.id, VoteType.UPVOTE)
+        enqueue_vote(test_user.id, test_country.id, None)
+        enqueue_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        assert get_queued_vote(test_user.id, test_country.id) == (
+            True, VoteType.DOWNVOTE), "Failed to keep the latest change"
+        assert get_current_vote(test_user.id, test_country.id) == (
+            VoteType.DOWNVOTE), "Failed to include the queued change"
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Wrote the vote before flushing")
+
+        assert flush_votes() == 1, "Wrote more than one change"
+        assert get_queued_vote(test_user.id, test_country.id) == (
+            False, None), "Change still queued after flushing"
+        assert get_vote_counts(test_country) == (0, 1), (
+            "Failed to write the vote")
+
+
+def test_flush_votes_replaces_vote():
+    """A test to determine if a queued vote replaces the vote in the
+    database, and a queued reset removes it."""
+    with app.app_context():
+        enqueue_vote(test_user.id, test_country.id, VoteType.UPVOTE)
+        flush_votes()
+        assert get_current_vote(test_user.id, test_country.id) == (
+            VoteType.UPVOTE), "Failed to replace the vote"
+        assert get_vote_counts(test_country) == (1, 0), (
+            "Failed to update the counters")
+
+        enqueue_vote(test_user.id, test_country.id, None)
+        flush_votes()
+        assert get_current_vote(test_user.id, test_country.id) == None, (
+            "Failed to remove the vote")
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Failed to update the counters")
+
+
+def test_flush_votes_single_transaction():
+    """A test to determine if queued votes are written in one
+    transaction."""
+    commits = []
+    with app.app_context():
+        db.event.listen(db.session(), "after_commit", commits.append)
+        users = []
+        for i in range(3):
+            user = User(username=f"test_user{randint(1000, 9999)}_{i}",
+                        password="password", role="guest")
+            add_user(user)
+            users.append(user)
+            enqueue_vote(user.id, test_country.id, VoteType.UPVOTE)
+
+        commits.clear()
+        assert flush_votes() == 3, "Failed to write every vote"
+        assert len(commits) == 1, f"Committed {len(commits)} times"
+        assert get_vote_counts(test_country) == (3, 0), (
+            "Failed to write the votes")
+        for user in users:
+            remove_user(user)
+
+
+def test_flush_votes_drops_invalid():
+    """A test to determine if a vote that cannot be written does not
+    stop the other queued votes."""
+    with app.app_context():
+        enqueue_vote(-1, test_country.id, VoteType.UPVOTE)
+        enqueue_vote(test_user.id, test_country.id, VoteType.DOWNVOTE)
+        assert flush_votes() == 1, "Failed to drop the invalid vote"
+        assert get_vote_counts(test_country) == (0, 1), (
+            "Failed to write the valid vote")
+        assert db.session.execute(db.select(UserVote).where(
+            UserVote.user_id == -1)).first() == None, (
+                "Wrote the invalid vote")
+
+        enqueue_vote(test_user.id, test_country.id, None)
+        flush_votes()
+
+
+def test_flush_votes_on_exit_waits():
+    """A test to determine if flushing on exit waits for a flush being
+    written by the background thread, then writes the queued votes."""
+    with app.app_context():
+        enqueue_vote(test_user.id, test_country.id, VoteType.UPVOTE)
+        flush_votes()
+        enqueue_vote(test_user.id, test_country.id, None)
+
+    # Pretend the background thread is writing a batch.
+    votequeue._flush_lock.acquire()
+    exiting = Thread(target=flush_votes_on_exit)
+    try:
+        exiting.start()
+        exiting.join(0.2)
+        assert exiting.is_alive(), "Failed to wait for the flush"
+    finally:
+        votequeue._flush_lock.release()
+    exiting.join(5)
+    assert not exiting.is_alive(), "Failed to flush after waiting"
+    with app.app_context():
+        assert get_current_vote(test_user.id, test_country.id) == None, (
+            "Failed to write the queued vote")
+        assert get_vote_counts(test_country) == (0, 0), (
+            "Failed to update the counters")
+
+
+def test_flush_votes_on_exit_in_flight():
+    """A test to determine if flushing on exit waits for a flush being
+    written even when nothing else is queued."""
+    votequeue._flush_lock.acquire()
+    votequeue._flushing = {(test_user.id, test_country.id): VoteType.UPVOTE}
+    exiting = Thread(target=flush_votes_on_exit)
+    try:
+        exiting.start()
+        exiting.join(0.2)
+        assert exiting.is_alive(), "Failed to wait for the flush"
+    finally:
+        votequeue._flushing = {}
+        votequeue._flush_lock.release()
+    exiting.join(5)
+    assert not exiting.is_alive(), "Failed to finish after waiting"